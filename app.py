@@ -3,8 +3,10 @@
 Main entry point for the WeChat Group Chat Assistant application.
 """
 import os
+import signal
 import logging
 import asyncio
+import argparse
 from dotenv import load_dotenv
 
 # Load environment variables from .env file if it exists
@@ -33,31 +35,186 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 # Import services after logging is configured
-from app.services.wechaty_service import WechatyService
-from app.services.web_service import start_web_server
+from app.services.account_manager import AccountManager
+from app.services.analysis_service import MESSAGE_STORED, AnalysisService
+from app.services.stream_server import StreamServer
+from app.services.supervisor import ROLES, Supervisor
+from app.services.web_service import run_web_server, start_web_server
+from app.utils.live_stream import STREAM_EVENT, broker as stream_broker
+from app.utils.local_channel import LocalChannel
+from app.utils.metrics import register_metrics
+from app.utils.response_cache import use_versions
 
-async def main():
-    """Main async function to start the application."""
+async def main(account=None):
+    """
+    Main async function to start the application.
+    
+    Args:
+        account: Run only this WECHATY_ACCOUNTS entry (one process per account)
+    """
     logger.info("Starting WeChat Group Chat Assistant...")
 
-    # Initialize and start Wechaty service
-    wechaty_service = WechatyService()
+    # Initialize the Wechaty service of every account
+    accounts = AccountManager(only=account)
     
-    # Start the web server in a separate thread
-    web_thread = start_web_server()
+    # Start the web server in a separate thread (once per deployment)
+    stream_server = None
+    if accounts.primary_service:
+        web_thread = start_web_server()
+        stream_server = await start_stream_server()
     
     try:
-        # Start the Wechaty bot
-        await wechaty_service.start()
+        # Start the Wechaty bots
+        await accounts.start()
     except KeyboardInterrupt:
         logger.info("Keyboard interrupt received, shutting down...")
     except Exception as e:
         logger.error(f"Error in main application: {e}", exc_info=True)
     finally:
         # Perform cleanup
-        await wechaty_service.stop()
+        await accounts.stop()
+        if stream_server:
+            await stream_server.stop()
         logger.info("Application shutdown complete.")
 
+async def start_stream_server():
+    """
+    Start the live stream of stored messages on this event loop.
+    
+    Returns:
+        StreamServer, or None if it is disabled or could not listen
+    """
+    if not cfg.STREAM_ENABLED:
+        return None
+    server = StreamServer(
+        stream_broker, cfg.STREAM_HOST, cfg.STREAM_PORT,
+        max_clients=cfg.STREAM_MAX_CLIENTS,
+        buffer_size=cfg.STREAM_BUFFER_SIZE,
+        heartbeat=cfg.STREAM_HEARTBEAT,
+        write_timeout=cfg.STREAM_WRITE_TIMEOUT
+    )
+    try:
+        await server.start()
+    except OSError as e:
+        logger.error(f"Could not start the live stream: {e}")
+        return None
+    register_metrics('stream', server.metrics)
+    return server
+
+def cancel_on_sigterm():
+    """Shut down like on Ctrl+C when the supervisor asks this process to stop."""
+    task = asyncio.current_task()
+    loop = asyncio.get_running_loop()
+    
+    def shut_down():
+        # Further signals must not interrupt the shutdown itself
+        loop.add_signal_handler(signal.SIGTERM, lambda: None)
+        task.cancel()
+    
+    loop.add_signal_handler(signal.SIGTERM, shut_down)
+
+async def run_ingest(account=None):
+    """
+    Run the bots of a supervised deployment (--role ingest).
+    
+    Args:
+        account: Run only this WECHATY_ACCOUNTS entry
+    """
+    cancel_on_sigterm()
+    channel = LocalChannel(cfg.PROCESS_CHANNEL_FILE)
+    # Report writes to the web process's response cache
+    use_versions(channel)
+    accounts = AccountManager(only=account, channel=channel)
+    register_metrics('channel', lambda: {
+        'pending_analysis': channel.depth(MESSAGE_STORED), **channel.stats
+    })
+    tasks = [asyncio.ensure_future(
+        channel.publish_metrics_forever(f"ingest[{account}]" if account else 'ingest',
+                                        cfg.PROCESS_METRICS_INTERVAL)
+    )]
+    stream_server = await start_stream_server() if accounts.primary_service else None
+    if cfg.STREAM_ENABLED and accounts.primary_service:
+        # Summaries stored by the analysis process
+        tasks.append(asyncio.ensure_future(
+            channel.consume(STREAM_EVENT, stream_broker.publish_relayed, cfg.PROCESS_POLL_INTERVAL)
+        ))
+    try:
+        await accounts.start()
+    except asyncio.CancelledError:
+        logger.info("Ingestion process stopping...")
+    finally:
+        for task in tasks:
+            task.cancel()
+        await accounts.stop()
+        if stream_server:
+            await stream_server.stop()
+        channel.close()
+
+async def run_analysis():
+    """Run analysis and the periodic jobs of a supervised deployment (--role analysis)."""
+    cancel_on_sigterm()
+    channel = LocalChannel(cfg.PROCESS_CHANNEL_FILE)
+    use_versions(channel)
+    if cfg.STREAM_ENABLED:
+        # The ingestion process serves the live stream
+        stream_broker.relay_to(channel)
+    analysis = AnalysisService()
+    await analysis.start()
+    tasks = [
+        asyncio.ensure_future(channel.consume(MESSAGE_STORED, analysis.on_message_stored,
+                                              cfg.PROCESS_POLL_INTERVAL)),
+        asyncio.ensure_future(channel.publish_metrics_forever('analysis',
+                                                              cfg.PROCESS_METRICS_INTERVAL))
+    ]
+    try:
+        await asyncio.gather(*tasks)
+    except asyncio.CancelledError:
+        logger.info("Analysis process stopping...")
+    finally:
+        for task in tasks:
+            task.cancel()
+        await analysis.stop()
+        channel.close()
+
+async def supervise():
+    """Run ingestion, the web server and analysis as separate processes (--supervise)."""
+    cancel_on_sigterm()
+    channel = LocalChannel(cfg.PROCESS_CHANNEL_FILE)
+    supervisor = Supervisor()
+    register_metrics('supervisor', supervisor.metrics)
+    publisher = asyncio.ensure_future(
+        channel.publish_metrics_forever('supervisor', cfg.PROCESS_METRICS_INTERVAL)
+    )
+    try:
+        await supervisor.run()
+    except asyncio.CancelledError:
+        logger.info("Supervisor stopping...")
+    finally:
+        publisher.cancel()
+        await supervisor.stop()
+        channel.close()
+
 if __name__ == "__main__":
-    # Run the main async function
-    asyncio.run(main()) 
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="WeChat Group Chat Assistant")
+    parser.add_argument('--account', help="Run only this account from WECHATY_ACCOUNTS "
+                                          "(start one process per account)")
+    parser.add_argument('--supervise', action='store_true',
+                        help="Run ingestion, the web server and analysis as separate processes")
+    parser.add_argument('--role', choices=ROLES,
+                        help="Run one part of a supervised deployment (started by --supervise)")
+    args = parser.parse_args()
+    
+    try:
+        if args.supervise:
+            asyncio.run(supervise())
+        elif args.role == 'ingest':
+            asyncio.run(run_ingest(args.account))
+        elif args.role == 'analysis':
+            asyncio.run(run_analysis())
+        elif args.role == 'web':
+            run_web_server(LocalChannel(cfg.PROCESS_CHANNEL_FILE))
+        else:
+            # Run the main async function
+            asyncio.run(main(args.account))
+    except KeyboardInterrupt:
+        pass 
\ No newline at end of file
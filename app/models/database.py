@@ -2,9 +2,14 @@
 Database models for the WeChat Group Chat Assistant.
 """
 import datetime
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Index
+import logging
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Index, Boolean
+from sqlalchemy import inspect, text
+from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.ext.declarative import declarative_base
 
+logger = logging.getLogger(__name__)
+
 Base = declarative_base()
 
 class Room(Base):
@@ -14,6 +19,7 @@ class Room(Base):
     id = Column(Integer, primary_key=True)
     room_id = Column(String(255), unique=True, nullable=False, index=True)
     topic = Column(String(255), nullable=False)
+    member_count = Column(Integer, nullable=True)
     created_at = Column(DateTime, default=datetime.datetime.now)
     updated_at = Column(DateTime, default=datetime.datetime.now, onupdate=datetime.datetime.now)
     
@@ -33,6 +39,28 @@ class User(Base):
     def __repr__(self):
         return f"<User(id={self.id}, user_id='{self.user_id}', name='{self.name}')>"
 
+class MediaFile(Base):
+    """
+    Model representing an archived attachment (image, file, voice or video).
+    
+    The content lives in the media store under its SHA-256, so an attachment
+    forwarded to several groups is stored, and recorded here, once.
+    """
+    __tablename__ = 'media_files'
+    
+    id = Column(Integer, primary_key=True)
+    sha256 = Column(String(64), unique=True, nullable=False, index=True)
+    size = Column(Integer, nullable=False)
+    mime_type = Column(String(255), nullable=True)
+    # Name of the first copy received; later copies may be named differently
+    file_name = Column(String(255), nullable=True)
+    # Path relative to MEDIA_DIR
+    path = Column(String(255), nullable=False)
+    created_at = Column(DateTime, default=datetime.datetime.now)
+    
+    def __repr__(self):
+        return f"<MediaFile(id={self.id}, sha256='{self.sha256}', size={self.size})>"
+
 class Message(Base):
     """Model representing a message in a WeChat group chat."""
     __tablename__ = 'messages'
@@ -42,7 +70,16 @@ class Message(Base):
     user_id = Column(String(255), nullable=False, index=True)
     message_type = Column(String(50), nullable=False)
     content = Column(Text, nullable=False)
-    metadata = Column(Text, nullable=True)
+    # "metadata" is reserved on declarative classes, so map it under another name
+    message_metadata = Column('metadata', Text, nullable=True)
+    # Near-duplicate of a recent message in the same room; kept for the record
+    # but skipped by analysis
+    is_duplicate = Column(Boolean, nullable=False, default=False)
+    # Identifies the message across bot accounts that can all see its room,
+    # so it is stored once
+    dedup_key = Column(String(40), unique=True, nullable=True)
+    # Archived attachment of image, file, voice and video messages
+    media_id = Column(Integer, ForeignKey('media_files.id'), nullable=True, index=True)
     created_at = Column(DateTime, default=datetime.datetime.now, index=True)
     
     # Create composite index for efficient querying
@@ -54,7 +91,13 @@ class Message(Base):
         return f"<Message(id={self.id}, room_id='{self.room_id}', user_id='{self.user_id}')>"
 
 class MessageSummary(Base):
-    """Model representing a summary of messages from a time period."""
+    """
+    Model representing a summary of messages from a time period.
+    
+    Summaries form a hierarchy: rolling "window" summaries produced by each
+    analysis run are rolled up into "hourly", then "daily" and "weekly"
+    summaries, each pointing at its parent in the next level up.
+    """
     __tablename__ = 'message_summaries'
     
     id = Column(Integer, primary_key=True)
@@ -62,10 +105,20 @@ class MessageSummary(Base):
     summary = Column(Text, nullable=False)
     start_time = Column(DateTime, nullable=False)
     end_time = Column(DateTime, nullable=False)
+    level = Column(String(20), nullable=False, default='window')
+    # Summary of the next level up that this summary was rolled into
+    parent_id = Column(Integer, ForeignKey('message_summaries.id'), nullable=True, index=True)
+    # Previous summary of the same level used as context for this one
+    previous_id = Column(Integer, ForeignKey('message_summaries.id'), nullable=True)
+    message_count = Column(Integer, default=0)
     created_at = Column(DateTime, default=datetime.datetime.now)
     
+    __table_args__ = (
+        Index('idx_summary_room_level_start', 'room_id', 'level', 'start_time'),
+    )
+    
     def __repr__(self):
-        return f"<MessageSummary(id={self.id}, room_id='{self.room_id}')>"
+        return f"<MessageSummary(id={self.id}, room_id='{self.room_id}', level='{self.level}')>"
 
 class Keyword(Base):
     """Model representing keywords extracted from messages."""
@@ -84,4 +137,57 @@ class Keyword(Base):
     )
     
     def __repr__(self):
-        return f"<Keyword(id={self.id}, room_id='{self.room_id}', keyword='{self.keyword}')>" 
\ No newline at end of file
+        return f"<Keyword(id={self.id}, room_id='{self.room_id}', keyword='{self.keyword}')>" 
+
+# Columns added to tables of existing deployments, which create_all() does not
+# alter: (table, column, column DDL, DDL of its index or None). "{false}" is
+# the dialect's boolean false literal.
+ADDED_COLUMNS = [
+    ('rooms', 'member_count', "INTEGER", None),
+    ('messages', 'is_duplicate', "BOOLEAN NOT NULL DEFAULT {false}", None),
+    ('messages', 'dedup_key', "VARCHAR(40)",
+     "CREATE UNIQUE INDEX IF NOT EXISTS ix_messages_dedup_key ON messages (dedup_key)"),
+    ('messages', 'media_id', "INTEGER REFERENCES media_files (id)",
+     "CREATE INDEX IF NOT EXISTS ix_messages_media_id ON messages (media_id)"),
+    ('message_summaries', 'level', "VARCHAR(20) NOT NULL DEFAULT 'window'",
+     "CREATE INDEX IF NOT EXISTS idx_summary_room_level_start "
+     "ON message_summaries (room_id, level, start_time)"),
+    ('message_summaries', 'parent_id', "INTEGER REFERENCES message_summaries (id)",
+     "CREATE INDEX IF NOT EXISTS ix_message_summaries_parent_id ON message_summaries (parent_id)"),
+    ('message_summaries', 'previous_id', "INTEGER REFERENCES message_summaries (id)", None),
+    ('message_summaries', 'message_count', "INTEGER DEFAULT 0", None),
+]
+
+def upgrade_schema(engine):
+    """
+    Create missing tables and add the columns of ADDED_COLUMNS missing from
+    existing ones, so databases created by earlier versions keep working.
+    
+    Safe to run on every start and from several processes at once: a column
+    added concurrently by another process is skipped.
+    
+    Args:
+        engine: SQLAlchemy engine of the database
+    """
+    Base.metadata.create_all(engine)
+    
+    false = '0' if engine.dialect.name == 'sqlite' else 'false'
+    existing = {}
+    for table, column, ddl, index_ddl in ADDED_COLUMNS:
+        if table not in existing:
+            existing[table] = {col['name'] for col in inspect(engine).get_columns(table)}
+        if column in existing[table]:
+            continue
+        
+        logger.info(f"Upgrading database schema: adding {table}.{column}")
+        try:
+            with engine.begin() as connection:
+                connection.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl.format(false=false)}"))
+        except SQLAlchemyError:
+            if column not in {col['name'] for col in inspect(engine).get_columns(table)}:
+                raise
+            logger.info(f"{table}.{column} was added by another process")
+        if index_ddl:
+            with engine.begin() as connection:
+                connection.execute(text(index_ddl))
+        existing[table].add(column)
@@ -0,0 +1,127 @@
+"""
+Lightweight in-memory message records for the analysis pipeline.
+
+Rows are read from the database straight into MessageRecord objects, which
+use __slots__ and keep the creation time as an epoch timestamp, so grouping,
+sorting and time-range checks never round-trip through ISO strings.
+"""
+import datetime
+import json
+from operator import attrgetter
+from typing import Any, Dict, Iterable, List, Optional
+
+
+class MessageRecord:
+    """A single stored message with its room and sender names resolved."""
+
+    __slots__ = (
+        'id', 'room_id', 'room_topic', 'user_id', 'user_name',
+        'message_type', 'content', 'created_ts', '_metadata_json', '_metadata'
+    )
+
+    def __init__(self, id: Optional[int], room_id: str, room_topic: str,
+                 user_id: str, user_name: str, message_type: str,
+                 content: str, created_ts: float,
+                 metadata_json: Optional[str] = None,
+                 metadata: Optional[Dict[str, Any]] = None):
+        self.id = id
+        self.room_id = room_id
+        self.room_topic = room_topic
+        self.user_id = user_id
+        self.user_name = user_name
+        self.message_type = message_type
+        self.content = content
+        self.created_ts = created_ts
+        self._metadata_json = metadata_json
+        self._metadata = metadata
+
+    @property
+    def created_at(self) -> datetime.datetime:
+        """Creation time as a naive local datetime."""
+        return datetime.datetime.fromtimestamp(self.created_ts)
+
+    @property
+    def metadata(self) -> Dict[str, Any]:
+        """Message metadata, parsed from JSON on first access."""
+        if self._metadata is None:
+            try:
+                self._metadata = json.loads(self._metadata_json) if self._metadata_json else {}
+            except ValueError:
+                self._metadata = {}
+        return self._metadata
+
+    @property
+    def metadata_json(self) -> str:
+        """Message metadata as JSON, without parsing the stored text."""
+        if self._metadata_json is None:
+            return json.dumps(self._metadata or {}, ensure_ascii=False)
+        return self._metadata_json
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Convert the record to the message dictionary used by the web API."""
+        return {
+            'id': self.id,
+            'room_id': self.room_id,
+            'room_topic': self.room_topic,
+            'user_id': self.user_id,
+            'user_name': self.user_name,
+            'message_type': self.message_type,
+            'content': self.content,
+            'metadata': self.metadata,
+            'created_at': self.created_at.isoformat()
+        }
+
+    @classmethod
+    def from_dict(cls, message: Dict[str, Any]) -> 'MessageRecord':
+        """Build a record from a message dictionary with an ISO created_at."""
+        return cls(
+            id=message.get('id'),
+            room_id=message.get('room_id'),
+            room_topic=message.get('room_topic', 'Unknown Group'),
+            user_id=message.get('user_id'),
+            user_name=message.get('user_name', 'Unknown'),
+            message_type=message.get('message_type', ''),
+            content=message.get('content', ''),
+            created_ts=datetime.datetime.fromisoformat(message['created_at']).timestamp(),
+            metadata=message.get('metadata') or {}
+        )
+
+    def __repr__(self):
+        return f"<MessageRecord(id={self.id}, room_id='{self.room_id}', user_id='{self.user_id}')>"
+
+
+def as_records(messages: Iterable[Any]) -> List[MessageRecord]:
+    """
+    Normalize messages to records, converting dictionaries where needed.
+
+    Args:
+        messages: MessageRecord objects or message dictionaries
+
+    Returns:
+        list: MessageRecord objects
+    """
+    return [msg if isinstance(msg, MessageRecord) else MessageRecord.from_dict(msg)
+            for msg in messages]
+
+
+def group_by_room(records: Iterable[MessageRecord]) -> Dict[str, List[MessageRecord]]:
+    """
+    Group records by room, each group sorted by creation time.
+
+    Args:
+        records: Message records in any order
+
+    Returns:
+        dict: Room ID to chronologically sorted records
+    """
+    groups = {}
+    for record in records:
+        group = groups.get(record.room_id)
+        if group is None:
+            group = groups[record.room_id] = []
+        group.append(record)
+
+    by_time = attrgetter('created_ts')
+    for group in groups.values():
+        group.sort(key=by_time)
+    return groups
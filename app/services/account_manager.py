@@ -0,0 +1,206 @@
+"""
+Several WeChat accounts in one deployment.
+
+Each account configured in ``WECHATY_ACCOUNTS`` gets its own WechatyService
+(bot, ingestion queue, command lane and outbound dispatcher) on the shared
+event loop, all writing to the same database. An account that fails to start
+or crashes is restarted with backoff without affecting the others.
+
+A room visible to several accounts is owned by the first account that sees
+it, so its messages are stored and answered once; when that account goes
+down, another account takes the room over. Accounts can also run as
+separate processes (``app.py --account NAME``); messages are then
+deduplicated by the database through the unique ``Message.dedup_key``.
+
+Only the primary (first) account runs analysis and the periodic jobs;
+messages stored by the others are reported to its analysis scheduler. In
+supervisor mode analysis runs in its own process instead, and every account
+publishes its stored messages to the local channel.
+"""
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional
+
+import config as cfg
+
+logger = logging.getLogger(__name__)
+
+
+def load_accounts() -> List[Dict[str, Any]]:
+    """
+    Return the configured bot accounts.
+
+    Each account is a dict with 'name', 'token', 'puppet' and 'groups' (the
+    group names the account monitors; empty means MONITORED_GROUPS). Without
+    WECHATY_ACCOUNTS the single WECHATY_* account is returned.
+
+    Returns:
+        list: Account dictionaries, the primary account first
+    """
+    accounts = getattr(cfg, 'WECHATY_ACCOUNTS', None) or [{'name': cfg.WECHATY_NAME}]
+
+    loaded = []
+    for i, account in enumerate(accounts):
+        loaded.append({
+            'name': account.get('name') or f"{cfg.WECHATY_NAME}-{i + 1}",
+            'token': account.get('token', cfg.WECHATY_TOKEN),
+            'puppet': account.get('puppet', cfg.WECHATY_PUPPET),
+            'groups': list(account.get('groups') or cfg.MONITORED_GROUPS)
+        })
+
+    names = [account['name'] for account in loaded]
+    if len(set(names)) != len(names):
+        raise ValueError(f"Account names must be unique: {names}")
+    return loaded
+
+
+class RoomAssignment:
+    """Which account owns each room shared by several accounts."""
+
+    def __init__(self):
+        self._owners: Dict[str, str] = {}
+        self.stats = {'claims': 0, 'handovers': 0}
+
+    def claim(self, room_id: str, account: str) -> bool:
+        """
+        Tell whether an account owns a room, claiming it if unowned.
+
+        Args:
+            room_id: The ID of the room
+            account: The account name
+
+        Returns:
+            bool: True if the account (now) owns the room
+        """
+        owner = self._owners.get(room_id)
+        if owner is None:
+            self._owners[room_id] = account
+            self.stats['claims'] += 1
+            return True
+        return owner == account
+
+    def release(self, account: str):
+        """Give up all rooms of an account so others can claim them."""
+        released = [room_id for room_id, owner in self._owners.items() if owner == account]
+        for room_id in released:
+            del self._owners[room_id]
+        self.stats['handovers'] += len(released)
+        if released:
+            logger.info(f"Account {account} released {len(released)} rooms")
+
+    def owned_by(self, account: str) -> int:
+        """Return the number of rooms an account owns."""
+        return sum(1 for owner in self._owners.values() if owner == account)
+
+
+class AccountManager:
+    """Run one WechatyService per configured account."""
+
+    def __init__(self, accounts: Optional[List[Dict[str, Any]]] = None,
+                 only: Optional[str] = None,
+                 channel=None,
+                 restart_delay: float = 5.0, max_restart_delay: float = 300.0):
+        """
+        Create the services of the accounts.
+
+        Args:
+            accounts: All configured accounts (default: load_accounts())
+            only: Run just this account, as one of several processes
+            channel: LocalChannel to the analysis process (supervisor mode)
+            restart_delay: Seconds before restarting a failed account, doubled
+                on each consecutive failure
+            max_restart_delay: Upper bound of the restart delay
+        """
+        self.accounts = accounts or load_accounts()
+        self.restart_delay = restart_delay
+        self.max_restart_delay = max_restart_delay
+        self.multi = len(self.accounts) > 1
+        self.channel = channel
+
+        primary = self.accounts[0]['name']
+        if only:
+            self.accounts = [account for account in self.accounts if account['name'] == only]
+            if not self.accounts:
+                raise ValueError(f"Unknown account: {only}")
+
+        # Room ownership only works within one process; across processes the
+        # database deduplicates
+        self.rooms = RoomAssignment() if len(self.accounts) > 1 else None
+        self.primary = {account['name']: account['name'] == primary for account in self.accounts}
+        self.services = [self._create_service(account) for account in self.accounts]
+        self._share_analysis()
+        self.restarts = {account['name']: 0 for account in self.accounts}
+
+    @property
+    def primary_service(self):
+        """The service running analysis and periodic jobs, if in this process."""
+        for service in self.services:
+            if service.primary:
+                return service
+        return None
+
+    def _create_service(self, account: Dict[str, Any]):
+        """Create the service of one account."""
+        # Imported here so this module can be loaded without the puppet
+        from app.services.wechaty_service import WechatyService
+
+        return WechatyService(
+            account=account if self.multi else None,
+            primary=self.primary[account['name']],
+            rooms=self.rooms,
+            channel=self.channel
+        )
+
+    def _share_analysis(self):
+        """Let the traffic of every account drive the primary account's analysis."""
+        primary = self.primary_service
+        if primary:
+            for service in self.services:
+                if not service.primary:
+                    service.analysis = primary.analysis
+
+    async def start(self):
+        """Start the accounts and keep them running until cancelled."""
+        if len(self.services) == 1:
+            await self.services[0].start()
+            return
+
+        logger.info(f"Starting {len(self.services)} accounts: "
+                    f"{', '.join(account['name'] for account in self.accounts)}")
+        await asyncio.gather(*(self._supervise(i) for i in range(len(self.services))))
+
+    async def _supervise(self, index: int):
+        """Run one account, replacing it with a fresh service when it fails."""
+        delay = self.restart_delay
+        while True:
+            service = self.services[index]
+            try:
+                await service.start()
+                return
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Account {service.name} failed: {e}", exc_info=True)
+
+            # Let the other accounts take over its rooms meanwhile
+            if self.rooms:
+                self.rooms.release(service.name)
+            try:
+                await service.stop()
+            except Exception as e:
+                logger.warning(f"Error stopping account {service.name}: {e}")
+
+            self.restarts[service.name] += 1
+            logger.info(f"Restarting account {service.name} in {delay:.0f}s")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self.max_restart_delay)
+            self.services[index] = self._create_service(self.accounts[index])
+            self._share_analysis()
+
+    async def stop(self):
+        """Stop every account."""
+        results = await asyncio.gather(*(service.stop() for service in self.services),
+                                       return_exceptions=True)
+        for service, result in zip(self.services, results):
+            if isinstance(result, Exception):
+                logger.error(f"Error stopping account {service.name}: {result}")
@@ -1,34 +1,84 @@
 """
-AI service for analyzing WeChat messages using OpenAI GPT.
+AI service for analyzing WeChat messages using an LLM backend.
 """
 import logging
 import datetime
-import json
-from typing import List, Dict, Any, Optional
-import openai
+import asyncio
+import bisect
+from operator import attrgetter
+from typing import AsyncIterator, List, Dict, Any, Optional, Tuple
 
 import config as cfg
+from app.models.records import MessageRecord, as_records, group_by_room
 from app.services.message_service import MessageService
+from app.services.llm_backend import LlmBackend, LlmBackendError, create_backend
+from app.utils.helpers import estimate_tokens
+from app.utils.segmentation import segment_messages, batch_segments
 
 logger = logging.getLogger(__name__)
 
+# Roll-up hierarchy: (level, child level, period length)
+ROLLUP_LEVELS = [
+    ('hourly', 'window', datetime.timedelta(hours=1)),
+    ('daily', 'hourly', datetime.timedelta(days=1)),
+    ('weekly', 'daily', datetime.timedelta(weeks=1)),
+]
+
+# Stored summary levels, coarsest first, used to cover on-demand ranges
+CACHE_LEVELS = ['weekly', 'daily', 'hourly', 'window']
+
+def _select_cached_summaries(summaries: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Pick non-overlapping stored summaries, preferring coarser levels.
+    
+    Args:
+        summaries: Summary dictionaries lying within the requested range
+        
+    Returns:
+        Selected summaries ordered by start time
+    """
+    rank = {level: i for i, level in enumerate(CACHE_LEVELS)}
+    selected = []
+    for summary in sorted(summaries, key=lambda s: (rank.get(s['level'], len(rank)), s['start_time'])):
+        if all(summary['end_time'] < other['start_time'] or summary['start_time'] > other['end_time']
+               for other in selected):
+            selected.append(summary)
+    return sorted(selected, key=lambda s: s['start_time'])
+
+def _period_start(level: str, moment: datetime.datetime) -> datetime.datetime:
+    """Return the start of the roll-up period of a level containing a moment."""
+    if level == 'hourly':
+        return moment.replace(minute=0, second=0, microsecond=0)
+    day = moment.replace(hour=0, minute=0, second=0, microsecond=0)
+    if level == 'daily':
+        return day
+    # Weeks start on Monday
+    return day - datetime.timedelta(days=day.weekday())
+
 class AiService:
     """Service for AI-powered message analysis and summarization."""
     
-    def __init__(self):
-        """Initialize the AI service."""
-        # Configure OpenAI
-        openai.api_key = cfg.OPENAI_API_KEY
+    def __init__(self, backend: Optional[LlmBackend] = None,
+                 message_service: Optional[MessageService] = None):
+        """
+        Initialize the AI service.
+        
+        Args:
+            backend: Optional LLM backend, defaults to the configured backend
+            message_service: Optional message service for storing results
+        """
+        # LLM backend used for all completions
+        self.backend = backend or create_backend()
         
         # Initialize message service for storing results
-        self.message_service = MessageService()
+        self.message_service = message_service or MessageService()
     
-    async def analyze_messages(self, messages: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    async def analyze_messages(self, messages: List[Any]) -> Optional[Dict[str, Any]]:
         """
         Analyze a list of messages using AI.
         
         Args:
-            messages: List of message dictionaries to analyze
+            messages: MessageRecord objects (or message dictionaries) to analyze
             
         Returns:
             Dictionary containing analysis results or None if analysis failed
@@ -38,13 +88,8 @@ class AiService:
             return None
         
         try:
-            # Group messages by room
-            room_messages = {}
-            for msg in messages:
-                room_id = msg.get('room_id')
-                if room_id not in room_messages:
-                    room_messages[room_id] = []
-                room_messages[room_id].append(msg)
+            # Group messages by room, each group sorted by time
+            room_messages = group_by_room(as_records(messages))
             
             # Analyze each room's messages
             results = {}
@@ -61,52 +106,45 @@ class AiService:
             return None
     
     async def _analyze_room_messages(self, room_id: str, 
-                                  messages: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+                                  messages: List[MessageRecord]) -> Optional[Dict[str, Any]]:
         """
         Analyze messages from a specific room.
         
         Args:
             room_id: The ID of the room/group
-            messages: List of message dictionaries from the room
+            messages: Records from the room, sorted by creation time
             
         Returns:
             Dictionary containing analysis results or None if analysis failed
         """
         try:
-            # Sort messages by timestamp
-            sorted_messages = sorted(
-                messages, 
-                key=lambda x: datetime.datetime.fromisoformat(x.get('created_at', ''))
-            )
-            
-            if not sorted_messages:
+            if not messages:
                 return None
             
             # Get room information
-            room_topic = sorted_messages[0].get('room_topic', 'Unknown Group')
+            room_topic = messages[0].room_topic
             
             # Prepare messages for GPT processing
-            conversation = []
-            for msg in sorted_messages:
-                user_name = msg.get('user_name', 'Unknown')
-                content = msg.get('content', '')
-                
-                if content and content.strip():
-                    conversation.append(f"{user_name}: {content}")
+            conversation = [
+                f"{msg.user_name}: {msg.content}"
+                for msg in messages
+                if msg.content and msg.content.strip()
+            ]
             
             # Skip if no valid messages
             if not conversation:
                 return None
             
             # Get time range
-            start_time = datetime.datetime.fromisoformat(sorted_messages[0].get('created_at', ''))
-            end_time = datetime.datetime.fromisoformat(sorted_messages[-1].get('created_at', ''))
+            start_time = messages[0].created_at
+            end_time = messages[-1].created_at
             
-            # Generate summary using GPT
-            summary = await self._generate_summary(room_topic, conversation)
+            # Build on the previous window summary instead of starting from scratch
+            previous = self.message_service.get_latest_summary(room_id, level='window')
+            previous_summary = previous['summary'] if previous else None
             
-            # Extract keywords
-            keywords = await self._extract_keywords(conversation)
+            # Summarize each conversation thread separately
+            summary = await self._summarize_segments(room_topic, messages, previous_summary)
             
             # Store summary in database
             if summary:
@@ -114,7 +152,10 @@ class AiService:
                     room_id=room_id,
                     summary=summary,
                     start_time=start_time,
-                    end_time=end_time
+                    end_time=end_time,
+                    level='window',
+                    previous_id=previous['id'] if previous else None,
+                    message_count=len(conversation)
                 )
             
             # Return analysis results
@@ -122,7 +163,6 @@ class AiService:
                 'room_id': room_id,
                 'room_topic': room_topic,
                 'summary': summary,
-                'keywords': keywords,
                 'message_count': len(messages),
                 'start_time': start_time.isoformat(),
                 'end_time': end_time.isoformat()
@@ -132,14 +172,225 @@ class AiService:
             logger.error(f"Error analyzing room messages: {e}", exc_info=True)
             return None
     
+    async def summarize_messages(self, messages: List[Any],
+                                 previous_summary: Optional[str] = None) -> Optional[str]:
+        """
+        Summarize a room's messages without storing the result.
+        
+        Args:
+            messages: MessageRecord objects (or message dictionaries) from one room
+            previous_summary: Optional summary of the preceding period
+            
+        Returns:
+            Summary text or None if summarization failed
+        """
+        try:
+            records = sorted(as_records(messages), key=attrgetter('created_ts'))
+            if not records:
+                return None
+            
+            return await self._summarize_segments(records[0].room_topic, records, previous_summary)
+            
+        except Exception as e:
+            logger.error(f"Error summarizing messages: {e}", exc_info=True)
+            return None
+    
+    async def _summarize_segments(self, room_topic: str,
+                                  messages: List[MessageRecord],
+                                  previous_summary: Optional[str] = None) -> Optional[str]:
+        """
+        Split messages into conversation threads and summarize each batch.
+        
+        Threads are separated by time gaps, @mentions and quotes; small
+        threads are batched into one prompt. Batches are summarized
+        concurrently and the results joined in chronological order.
+        
+        Args:
+            room_topic: The topic/name of the room
+            messages: Records sorted by creation time
+            previous_summary: Optional summary of the preceding window
+            
+        Returns:
+            Summary text or None if every batch failed
+        """
+        segments = segment_messages(
+            messages,
+            gap_seconds=cfg.SEGMENT_GAP_SECONDS,
+            reply_window_seconds=cfg.SEGMENT_REPLY_WINDOW
+        )
+        batches = batch_segments(
+            segments,
+            min_messages=cfg.SEGMENT_MIN_MESSAGES,
+            max_messages=cfg.SEGMENT_MAX_BATCH_MESSAGES
+        )
+        
+        conversations = []
+        for batch in batches:
+            conversation = []
+            for segment in batch:
+                # Mark thread boundaries inside a batch of small threads
+                if conversation:
+                    conversation.append('---')
+                conversation.extend(
+                    f"{msg.user_name}: {msg.content}"
+                    for msg in segment
+                    if msg.content and msg.content.strip()
+                )
+            if conversation:
+                conversations.append(conversation)
+        
+        if not conversations:
+            return None
+        
+        # Only the first batch needs the previous window as context
+        summaries = await asyncio.gather(*(
+            self._generate_summary(room_topic, conversation, previous_summary if i == 0 else None)
+            for i, conversation in enumerate(conversations)
+        ))
+        summaries = [summary for summary in summaries if summary]
+        
+        logger.info(f"Summarized {len(segments)} threads in {len(conversations)} batches for {room_topic}")
+        return "\n\n".join(summaries) if summaries else None
+    
+    async def stream_summary(self, room_id: str, start_time: datetime.datetime,
+                             end_time: datetime.datetime) -> AsyncIterator[Tuple[str, Any]]:
+        """
+        Summarize a room over a time range on demand, streaming the result.
+        
+        Stored summaries lying within the range are reused, coarsest level
+        first, so only messages they do not cover are sent to the model. Those
+        are included verbatim when short, otherwise summarized concurrently
+        first. The final summary is streamed from the backend as it is
+        generated. Nothing is stored.
+        
+        Args:
+            room_id: The ID of the room/group
+            start_time: Start of the range
+            end_time: End of the range
+            
+        Yields:
+            (event, data) tuples: 'meta' with what the summary is built from,
+            'status' with progress text, 'token' with pieces of the summary,
+            then 'done' with the full summary or 'error' with a message
+        """
+        cached = _select_cached_summaries(
+            self.message_service.get_summaries_in_range(room_id, start_time, end_time)
+        )
+        records = self.message_service.get_message_records(
+            room_id=room_id,
+            limit=cfg.SUMMARIZE_MAX_MESSAGES,
+            since=start_time,
+            until=end_time
+        )
+        records.reverse()
+        room_topic = records[0].room_topic if records else 'Unknown Group'
+        
+        # Messages not covered by a selected summary, in runs between summaries
+        starts = [summary['start_time'].timestamp() for summary in cached]
+        ends = [summary['end_time'].timestamp() for summary in cached]
+        runs = {}
+        for record in records:
+            if not (record.content and record.content.strip()):
+                continue
+            position = bisect.bisect_right(starts, record.created_ts)
+            if position and record.created_ts <= ends[position - 1]:
+                continue
+            runs.setdefault(position, []).append(record)
+        
+        yield 'meta', {
+            'room_id': room_id,
+            'room_topic': room_topic,
+            'start_time': start_time.isoformat(),
+            'end_time': end_time.isoformat(),
+            'message_count': len(records),
+            'cached_summaries': len(cached),
+            'new_messages': sum(len(run) for run in runs.values())
+        }
+        
+        if not cached and not runs:
+            yield 'done', {'summary': None}
+            return
+        
+        # A single stored summary already covers everything
+        if len(cached) == 1 and not runs:
+            yield 'token', cached[0]['summary']
+            yield 'done', {'summary': cached[0]['summary']}
+            return
+        
+        # Short stretches of new messages go into the prompt verbatim
+        transcripts = {
+            position: "\n".join(f"{msg.user_name}: {msg.content}" for msg in run)
+            for position, run in runs.items()
+        }
+        run_summaries = {}
+        if sum(estimate_tokens(text) for text in transcripts.values()) > cfg.SUMMARIZE_INLINE_TOKENS:
+            yield 'status', f"Summarizing {sum(len(run) for run in runs.values())} new messages"
+            positions = sorted(runs)
+            summaries = await asyncio.gather(*(
+                self._summarize_segments(room_topic, runs[position]) for position in positions
+            ))
+            run_summaries = dict(zip(positions, summaries))
+        
+        # Interleave stored summaries and new messages chronologically
+        sections = []
+        for position in range(len(cached) + 1):
+            if position in runs:
+                run = runs[position]
+                label = f"[{run[0].created_at:%Y-%m-%d %H:%M} - {run[-1].created_at:%H:%M}]"
+                if run_summaries.get(position):
+                    sections.append(f"{label} Summary:\n{run_summaries[position]}")
+                elif position not in run_summaries:
+                    sections.append(f"{label} Messages:\n{transcripts[position]}")
+            if position < len(cached):
+                summary = cached[position]
+                sections.append(
+                    f"[{summary['start_time']:%Y-%m-%d %H:%M} - {summary['end_time']:%H:%M}] "
+                    f"Summary:\n{summary['summary']}"
+                )
+        
+        sections_text = "\n\n".join(sections)
+        prompt = f"""
+            The following covers a WeChat group named "{room_topic}" from
+            {start_time:%Y-%m-%d %H:%M} to {end_time:%Y-%m-%d %H:%M}: summaries of parts
+            of the period and messages not summarized yet, in chronological order.
+            
+            {sections_text}
+            
+            Please provide a concise summary of the whole period. Merge repeated
+            topics and focus on:
+            1. Main topics discussed
+            2. Key questions and answers
+            3. Important information, links, or resources shared
+            4. Action items or decisions made (if any)
+            
+            Format your summary in bullet points where appropriate.
+            """
+        
+        pieces = []
+        try:
+            async for piece in self.backend.stream(prompt, max_tokens=600, temperature=0.5, top_p=0.95):
+                pieces.append(piece)
+                yield 'token', piece
+        except LlmBackendError as e:
+            logger.error(f"Error streaming summary for room {room_id}: {e}")
+            yield 'error', {'message': str(e)}
+            return
+        
+        logger.info(f"Streamed on-demand summary for {room_topic} "
+                    f"({len(cached)} stored summaries, {len(sections)} sections)")
+        yield 'done', {'summary': "".join(pieces).strip()}
+    
     async def _generate_summary(self, room_topic: str, 
-                             conversation: List[str]) -> Optional[str]:
+                             conversation: List[str],
+                             previous_summary: Optional[str] = None) -> Optional[str]:
         """
-        Generate a summary of the conversation using GPT.
+        Generate a summary of the conversation using the LLM backend.
         
         Args:
             room_topic: The topic/name of the room
             conversation: List of formatted message strings
+            previous_summary: Optional summary of the preceding window, used
+                as context so only the new messages need to be summarized
             
         Returns:
             Summary text or None if generation failed
@@ -156,8 +407,19 @@ class AiService:
             # Combine messages into a single text
             conversation_text = "\n".join(conversation)
             
+            # Give the model the previous summary as context only
+            context = ""
+            if previous_summary:
+                context = f"""
+            For context, this is the summary of the preceding conversation in the group:
+            
+            {previous_summary}
+            
+            Do not repeat it; summarize only the new messages below.
+            """
+            
             # Create prompt for GPT
-            prompt = f"""
+            prompt = f"""{context}
             The following is a conversation from a WeChat group named "{room_topic}".
             
             {conversation_text}
@@ -172,18 +434,14 @@ class AiService:
             Format your summary in bullet points where appropriate.
             """
             
-            # Call GPT API
-            response = await openai.Completion.acreate(
-                engine=cfg.OPENAI_MODEL,
-                prompt=prompt,
+            # Call the LLM backend
+            summary = await self.backend.complete(
+                prompt,
                 max_tokens=500,
                 temperature=0.5,
                 top_p=0.95
             )
             
-            # Extract summary from response
-            summary = response.choices[0].text.strip()
-            
             logger.info(f"Generated summary for {room_topic} ({len(conversation)} messages)")
             return summary
             
@@ -191,58 +449,107 @@ class AiService:
             logger.error(f"Error generating summary: {e}", exc_info=True)
             return None
     
-    async def _extract_keywords(self, conversation: List[str]) -> List[str]:
+    async def roll_up_summaries(self, room_id: str, room_topic: str = 'Unknown Group',
+                                now: Optional[datetime.datetime] = None) -> int:
         """
-        Extract keywords from the conversation using GPT.
+        Roll completed periods of summaries up into the next level.
+        
+        Window summaries are rolled into hourly ones, hourly into daily and
+        daily into weekly. Each roll-up only reads the children of one
+        period, so long-horizon digests cost a bounded amount of work.
         
         Args:
-            conversation: List of formatted message strings
+            room_id: The ID of the room/group
+            room_topic: The topic/name of the room, used in prompts
+            now: Current time, defaults to datetime.datetime.now()
             
         Returns:
-            List of keywords or empty list if extraction failed
+            Number of roll-up summaries created
         """
+        now = now or datetime.datetime.now()
+        created = 0
+        
         try:
-            # Combine messages into a single text
-            conversation_text = "\n".join(conversation)
+            for level, child_level, period in ROLLUP_LEVELS:
+                # Only children from periods that have fully elapsed
+                children = self.message_service.get_unrolled_summaries(
+                    room_id, child_level, before=_period_start(level, now)
+                )
+                
+                # Group children by the period they start in
+                periods = {}
+                for child in children:
+                    periods.setdefault(_period_start(level, child['start_time']), []).append(child)
+                
+                previous = self.message_service.get_latest_summary(room_id, level=level)
+                for start_time, group in sorted(periods.items()):
+                    summary = await self._generate_rollup(room_topic, level, group)
+                    if not summary:
+                        continue
+                    
+                    summary_id = self.message_service.store_message_summary(
+                        room_id=room_id,
+                        summary=summary,
+                        start_time=start_time,
+                        end_time=start_time + period,
+                        level=level,
+                        previous_id=previous['id'] if previous else None,
+                        message_count=sum(c['message_count'] or 0 for c in group)
+                    )
+                    if summary_id:
+                        self.message_service.set_summary_parent([c['id'] for c in group], summary_id)
+                        previous = {'id': summary_id}
+                        created += 1
+            
+            return created
+            
+        except Exception as e:
+            logger.error(f"Error rolling up summaries for room {room_id}: {e}", exc_info=True)
+            return created
+    
+    async def _generate_rollup(self, room_topic: str, level: str,
+                               children: List[Dict[str, Any]]) -> Optional[str]:
+        """
+        Combine consecutive child summaries into one summary of a longer period.
+        
+        Args:
+            room_topic: The topic/name of the room
+            level: The level of the summary being produced
+            children: Child summary dictionaries ordered by start time
+            
+        Returns:
+            Summary text or None if generation failed
+        """
+        # A single child already is the summary of the whole period
+        if len(children) == 1:
+            return children[0]['summary']
+        
+        try:
+            sections = "\n\n".join(
+                f"[{c['start_time']:%Y-%m-%d %H:%M} - {c['end_time']:%H:%M}]\n{c['summary']}"
+                for c in children
+            )
             
-            # Create prompt for GPT
             prompt = f"""
-            Extract 5-10 key topics or keywords from this conversation:
+            The following are consecutive summaries of a WeChat group named "{room_topic}".
             
-            {conversation_text}
+            {sections}
             
-            Return only the keywords as a JSON array of strings.
+            Combine them into a single {level} digest. Merge repeated topics, keep
+            important information, decisions and action items, and drop details
+            that are no longer relevant. Format the digest in bullet points.
             """
             
-            # Call GPT API
-            response = await openai.Completion.acreate(
-                engine=cfg.OPENAI_MODEL,
-                prompt=prompt,
-                max_tokens=200,
+            summary = await self.backend.complete(
+                prompt,
+                max_tokens=600,
                 temperature=0.3,
                 top_p=0.95
             )
             
-            # Extract keywords from response
-            keywords_text = response.choices[0].text.strip()
-            
-            # Try to parse as JSON
-            try:
-                # Find JSON array in response
-                start_idx = keywords_text.find('[')
-                end_idx = keywords_text.rfind(']') + 1
-                
-                if start_idx >= 0 and end_idx > start_idx:
-                    json_text = keywords_text[start_idx:end_idx]
-                    keywords = json.loads(json_text)
-                    return keywords
-                else:
-                    # Fallback: split by commas or newlines
-                    return [k.strip() for k in keywords_text.replace('\n', ',').split(',') if k.strip()]
-            except:
-                # If JSON parsing fails, just split by commas or newlines
-                return [k.strip() for k in keywords_text.replace('\n', ',').split(',') if k.strip()]
+            logger.info(f"Generated {level} digest for {room_topic} from {len(children)} summaries")
+            return summary
             
         except Exception as e:
-            logger.error(f"Error extracting keywords: {e}", exc_info=True)
-            return [] 
\ No newline at end of file
+            logger.error(f"Error generating {level} digest: {e}", exc_info=True)
+            return None
@@ -0,0 +1,183 @@
+"""
+Adaptive, volume-driven scheduler for per-room message analysis.
+
+Instead of analyzing every room on a fixed timer, the scheduler tracks
+incoming traffic per room and triggers analysis when a room crosses a
+message-count or token threshold, or when pending messages have waited
+longer than the maximum staleness. Triggers are debounced so bursts are
+coalesced into a single run, and at most one run per room is in flight.
+"""
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict
+
+from app.utils.helpers import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+# Callback analyzing one room's messages not analyzed yet: receives the room ID
+AnalyzeRoomCallback = Callable[[str], Awaitable[Any]]
+
+
+class RoomActivity:
+    """Pending traffic and scheduling state for one room."""
+
+    __slots__ = (
+        'pending_messages', 'pending_tokens', 'first_pending_at',
+        'timer', 'in_flight', 'rerun'
+    )
+
+    def __init__(self):
+        self.pending_messages = 0
+        self.pending_tokens = 0
+        self.first_pending_at = None  # Event loop time of oldest pending message
+        self.timer = None  # Pending debounce timer handle
+        self.in_flight = False
+        self.rerun = False
+
+
+class AdaptiveAnalysisScheduler:
+    """Trigger per-room analysis based on actual room traffic."""
+
+    def __init__(self, analyze_room: AnalyzeRoomCallback,
+                 message_threshold: int = 200,
+                 token_threshold: int = 8000,
+                 max_staleness: float = 3600,
+                 debounce: float = 30,
+                 check_interval: float = 30):
+        """
+        Initialize the scheduler.
+
+        Args:
+            analyze_room: Coroutine function analyzing a single room
+            message_threshold: Pending messages that trigger an analysis
+            token_threshold: Pending estimated tokens that trigger an analysis
+            max_staleness: Seconds a pending message may wait before analysis
+            debounce: Seconds to wait after a trigger so bursts are coalesced
+            check_interval: Seconds between staleness checks
+        """
+        self.analyze_room = analyze_room
+        self.message_threshold = message_threshold
+        self.token_threshold = token_threshold
+        self.max_staleness = max_staleness
+        self.debounce = debounce
+        self.check_interval = check_interval
+
+        self.rooms: Dict[str, RoomActivity] = {}
+        self.stats = {
+            'threshold_triggers': 0,
+            'staleness_triggers': 0,
+            'coalesced_triggers': 0,
+            'runs': 0,
+            'failed_runs': 0
+        }
+        self._check_task = None
+        self._run_tasks = set()
+
+    async def start(self):
+        """Start the periodic staleness check on the running event loop."""
+        if self._check_task is None:
+            self._check_task = asyncio.ensure_future(self._staleness_loop())
+            logger.info("Adaptive analysis scheduler started")
+
+    async def stop(self):
+        """Cancel pending timers, the staleness check and in-flight runs."""
+        for state in self.rooms.values():
+            if state.timer:
+                state.timer.cancel()
+                state.timer = None
+
+        tasks = list(self._run_tasks)
+        if self._check_task:
+            tasks.append(self._check_task)
+            self._check_task = None
+
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+        logger.info("Adaptive analysis scheduler stopped")
+
+    def record_message(self, room_id: str, content: str = ""):
+        """
+        Account for a newly stored message and trigger analysis if needed.
+
+        Must be called from the event loop thread.
+
+        Args:
+            room_id: The ID of the room the message belongs to
+            content: The text content of the message
+        """
+        state = self.rooms.get(room_id)
+        if state is None:
+            state = self.rooms[room_id] = RoomActivity()
+
+        if state.pending_messages == 0:
+            state.first_pending_at = asyncio.get_event_loop().time()
+        state.pending_messages += 1
+        state.pending_tokens += estimate_tokens(content)
+
+        if (state.pending_messages >= self.message_threshold
+                or state.pending_tokens >= self.token_threshold):
+            self._trigger(room_id, state, 'threshold_triggers')
+
+    def _trigger(self, room_id: str, state: RoomActivity, reason: str):
+        """Schedule a debounced analysis run, coalescing repeated triggers."""
+        if state.timer or state.in_flight:
+            # Already scheduled or running; the run will pick up these messages
+            if state.in_flight:
+                state.rerun = True
+            self.stats['coalesced_triggers'] += 1
+            return
+
+        self.stats[reason] += 1
+        loop = asyncio.get_event_loop()
+        state.timer = loop.call_later(self.debounce, self._launch, room_id)
+
+    def _launch(self, room_id: str):
+        """Start the analysis task once the debounce delay has elapsed."""
+        state = self.rooms[room_id]
+        state.timer = None
+        task = asyncio.ensure_future(self._run(room_id, state))
+        self._run_tasks.add(task)
+        task.add_done_callback(self._run_tasks.discard)
+
+    async def _run(self, room_id: str, state: RoomActivity):
+        """Analyze one room and reset its pending counters."""
+        state.in_flight = True
+        state.rerun = False
+        pending = state.pending_messages
+        state.pending_messages = 0
+        state.pending_tokens = 0
+        state.first_pending_at = None
+
+        try:
+            logger.info(f"Analyzing room {room_id} ({pending} new messages)")
+            await self.analyze_room(room_id)
+            self.stats['runs'] += 1
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.stats['failed_runs'] += 1
+            logger.error(f"Error analyzing room {room_id}: {e}", exc_info=True)
+        finally:
+            state.in_flight = False
+
+        # Messages that crossed a threshold while we were busy get a follow-up run
+        if state.rerun and (state.pending_messages >= self.message_threshold
+                            or state.pending_tokens >= self.token_threshold):
+            self._trigger(room_id, state, 'threshold_triggers')
+
+    async def _staleness_loop(self):
+        """Periodically trigger rooms whose pending messages are too old."""
+        loop = asyncio.get_event_loop()
+        while True:
+            await asyncio.sleep(self.check_interval)
+            now = loop.time()
+            for room_id, state in self.rooms.items():
+                if state.timer or state.in_flight:
+                    continue
+                if (state.pending_messages and state.first_pending_at is not None
+                        and now - state.first_pending_at >= self.max_staleness):
+                    self._trigger(room_id, state, 'staleness_triggers')
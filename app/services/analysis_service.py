@@ -0,0 +1,169 @@
+"""
+Message analysis and the periodic jobs around it.
+
+Runs traffic-driven (adaptive) or interval analysis of stored messages plus
+the keyword refresh and vector indexing jobs. In the default single-process
+mode the primary WechatyService owns one and reports each stored message to
+it directly. In supervisor mode it runs in its own process (``app.py --role
+analysis``) and learns about stored messages from the local channel, so
+LLM calls and CPU-heavy jobs never compete with ingestion for the GIL.
+"""
+import logging
+from typing import Any, Dict, Optional
+
+import config as cfg
+from app.services.ai_service import AiService
+from app.services.analysis_scheduler import AdaptiveAnalysisScheduler
+from app.services.job_scheduler import JobScheduler
+from app.services.llm_backend import RateLimitedBackend, create_backend
+from app.services.message_service import MessageService
+from app.services.topic_service import TopicService
+from app.utils.metrics import register_metrics
+from app.utils.rate_limit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+# Channel event published for every stored message in supervisor mode
+MESSAGE_STORED = 'message_stored'
+
+
+class AnalysisService:
+    """Analysis scheduling and periodic jobs of one deployment."""
+
+    def __init__(self, message_service: Optional[MessageService] = None):
+        """
+        Initialize the analysis service.
+
+        Args:
+            message_service: Database access to share (default: a new one)
+        """
+        self.message_service = message_service or MessageService()
+        # Rooms analyzed together, and the batches of each, share the LLM rate limit
+        self.ai_service = AiService(
+            backend=RateLimitedBackend(
+                create_backend(), TokenBucket(cfg.LLM_RATE_LIMIT, cfg.LLM_RATE_BURST)
+            ),
+            message_service=self.message_service
+        )
+        self.topic_service = TopicService(self.message_service)
+
+        # Volume-driven per-room analysis (used when ANALYSIS_MODE is "adaptive")
+        self.analysis_scheduler = None
+        if cfg.ANALYSIS_MODE == "adaptive":
+            self.analysis_scheduler = AdaptiveAnalysisScheduler(
+                analyze_room=self._analyze_room,
+                message_threshold=cfg.ANALYSIS_MESSAGE_THRESHOLD,
+                token_threshold=cfg.ANALYSIS_TOKEN_THRESHOLD,
+                max_staleness=cfg.ANALYSIS_MAX_STALENESS,
+                debounce=cfg.ANALYSIS_DEBOUNCE
+            )
+
+        # Periodic tasks (analysis, keyword refresh, vector indexing)
+        self.job_scheduler = JobScheduler(jitter=cfg.JOB_JITTER)
+        self._schedule_jobs()
+
+        register_metrics('jobs', self.job_scheduler.metrics)
+        if self.analysis_scheduler:
+            register_metrics('analysis', lambda: dict(self.analysis_scheduler.stats))
+
+    async def start(self):
+        """Start analysis scheduling and the periodic jobs on the running loop."""
+        if self.analysis_scheduler:
+            # Analysis is triggered by room traffic on this event loop
+            await self.analysis_scheduler.start()
+        await self.job_scheduler.start()
+
+    async def stop(self):
+        """Cancel scheduled and running analysis and jobs."""
+        await self.job_scheduler.stop()
+        if self.analysis_scheduler:
+            await self.analysis_scheduler.stop()
+
+    def record_message(self, room_id: str, content: str = ""):
+        """
+        Account for a newly stored message (must be called on the event loop).
+
+        Args:
+            room_id: The ID of the room the message belongs to
+            content: The text content of the message
+        """
+        if self.analysis_scheduler:
+            self.analysis_scheduler.record_message(room_id, content)
+
+    def on_message_stored(self, event: Dict[str, Any]):
+        """Handle a MESSAGE_STORED channel event from the ingestion process."""
+        self.record_message(event['room_id'], event.get('content', ''))
+
+    def _schedule_jobs(self):
+        """Register the periodic tasks with the job scheduler."""
+        # Schedule periodic message analysis unless it is traffic-driven
+        if not self.analysis_scheduler:
+            self.job_scheduler.add_job(
+                'analysis', self._analyze_messages,
+                interval=cfg.ANALYSIS_INTERVAL * 60
+            )
+
+        # Schedule local TF-IDF keyword extraction (CPU-bound, on a thread)
+        if cfg.TOPIC_REFRESH_INTERVAL:
+            self.job_scheduler.add_job(
+                'topic_refresh',
+                lambda: self.topic_service.refresh_keywords(
+                    hours=cfg.TOPIC_LOOKBACK_HOURS,
+                    window=cfg.TOPIC_WINDOW_SECONDS
+                ),
+                interval=cfg.TOPIC_REFRESH_INTERVAL * 60,
+                blocking=True
+            )
+
+        # Schedule incremental indexing for similarity search
+        if cfg.VECTOR_INDEX_INTERVAL:
+            self.job_scheduler.add_job(
+                'vector_index', self.message_service.index_message_vectors,
+                interval=cfg.VECTOR_INDEX_INTERVAL * 60,
+                blocking=True
+            )
+
+    async def _analyze_messages(self):
+        """Analyze each room's messages received since its last summary (interval mode)."""
+        logger.info("Running scheduled message analysis...")
+        for room_id in self.message_service.get_room_ids():
+            try:
+                await self._analyze_room(room_id)
+            except Exception as e:
+                logger.error(f"Error analyzing room {room_id}: {e}", exc_info=True)
+
+    async def _analyze_room(self, room_id: str):
+        """
+        Analyze messages from one room received since its last window summary.
+
+        Messages are read oldest first from the end of the last stored window
+        summary, one MAX_MESSAGES_PER_ANALYSIS batch at a time, until the room
+        is caught up. A batch that stores no summary, e.g. because the room
+        had too few messages, stays unanalyzed for the next run.
+        """
+        analyzed = []
+        previous = self.message_service.get_latest_summary(room_id, level='window')
+        while True:
+            messages = self.message_service.get_message_records(
+                room_id=room_id,
+                limit=cfg.MAX_MESSAGES_PER_ANALYSIS,
+                since=previous['end_time'] if previous else None,
+                oldest_first=True
+            )
+            if not messages:
+                break
+
+            await self.ai_service.analyze_messages(messages)
+            logger.info(f"Analyzed {len(messages)} messages from room {room_id}")
+            analyzed = messages
+
+            # Continue with the next batch only once this one is summarized
+            latest = self.message_service.get_latest_summary(room_id, level='window')
+            if len(messages) < cfg.MAX_MESSAGES_PER_ANALYSIS or not latest or (
+                    previous and latest['id'] == previous['id']):
+                break
+            previous = latest
+
+        if analyzed:
+            # Roll finished periods up into hourly/daily/weekly digests
+            await self.ai_service.roll_up_summaries(room_id, analyzed[0].room_topic)
@@ -0,0 +1,221 @@
+"""
+Backfill service for summarizing historical messages in parallel.
+
+History is split into one job per room and day. Jobs run across a process
+pool, every worker shares one global LLM rate limit, completed jobs are
+checkpointed so an interrupted backfill resumes where it stopped, and
+daily summaries are written idempotently into MessageSummary.
+"""
+import asyncio
+import datetime
+import json
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Any, Dict, List, Optional, Set
+
+import config as cfg
+from app.services.message_service import MessageService
+from app.utils.helpers import ensure_directory_exists
+from app.utils.rate_limit import SharedTokenBucket, TokenBucket
+
+logger = logging.getLogger(__name__)
+
+# Per-process state of pool workers, set by _init_worker
+_worker_ai_service = None
+
+
+def _job_key(job: Dict[str, Any]) -> str:
+    """Return the checkpoint key of a job."""
+    return f"{job['room_id']}|{job['day'].isoformat()}"
+
+
+def _init_worker(limiter: SharedTokenBucket, backend_name: Optional[str]):
+    """Create the AI service of a pool worker process."""
+    global _worker_ai_service
+    # Imported here so the parent process never opens an LLM client
+    from app.services.ai_service import AiService
+    from app.services.llm_backend import RateLimitedBackend, create_backend
+
+    backend = RateLimitedBackend(create_backend(backend_name), limiter)
+    _worker_ai_service = AiService(backend=backend)
+
+
+def _run_job(job: Dict[str, Any]) -> Dict[str, Any]:
+    """Summarize one room-day in a pool worker."""
+    return asyncio.run(_summarize_day(_worker_ai_service, job))
+
+
+async def _summarize_day(ai_service, job: Dict[str, Any]) -> Dict[str, Any]:
+    """Summarize one room-day and store it as a daily summary."""
+    start_time = datetime.datetime.combine(job['day'], datetime.time.min)
+    end_time = start_time + datetime.timedelta(days=1)
+    started = time.perf_counter()
+
+    messages = ai_service.message_service.get_message_records(
+        room_id=job['room_id'],
+        limit=cfg.BACKFILL_MAX_MESSAGES_PER_DAY,
+        since=start_time - datetime.timedelta(microseconds=1),
+        until=end_time
+    )
+
+    summary = await ai_service.summarize_messages(messages) if messages else None
+    summary_id = None
+    if summary:
+        summary_id = ai_service.message_service.store_message_summary(
+            room_id=job['room_id'],
+            summary=summary,
+            start_time=start_time,
+            end_time=end_time,
+            level='daily',
+            message_count=len(messages),
+            replace=True
+        )
+
+    return {
+        'key': _job_key(job),
+        'room_id': job['room_id'],
+        'message_count': len(messages),
+        'summary_id': summary_id,
+        'ok': bool(summary_id) or not messages,
+        'duration': time.perf_counter() - started
+    }
+
+
+class BackfillService:
+    """Service planning and running historical summary backfills."""
+
+    def __init__(self, message_service: Optional[MessageService] = None,
+                 checkpoint_path: Optional[str] = None):
+        """
+        Initialize the backfill service.
+
+        Args:
+            message_service: Optional message service used to plan jobs
+            checkpoint_path: Optional path of the checkpoint file
+        """
+        self.message_service = message_service or MessageService()
+        self.checkpoint_path = checkpoint_path or cfg.BACKFILL_CHECKPOINT
+
+    def plan_jobs(self, room_ids: Optional[List[str]] = None,
+                  start_date: Optional[datetime.date] = None,
+                  end_date: Optional[datetime.date] = None,
+                  resume: bool = True) -> List[Dict[str, Any]]:
+        """
+        Split history into per-room, per-day jobs.
+
+        Args:
+            room_ids: Optional room IDs to restrict to
+            start_date: Optional first day to backfill
+            end_date: Optional last day to backfill, defaults to yesterday
+            resume: Skip jobs recorded in the checkpoint file
+
+        Returns:
+            List of job dictionaries, largest days first so stragglers start early
+        """
+        end_date = end_date or datetime.date.today() - datetime.timedelta(days=1)
+        jobs = self.message_service.get_room_days(room_ids, start_date, end_date)
+
+        if resume:
+            done = self.load_checkpoint()
+            jobs = [job for job in jobs if _job_key(job) not in done]
+
+        jobs.sort(key=lambda job: job['message_count'], reverse=True)
+        return jobs
+
+    def load_checkpoint(self) -> Set[str]:
+        """Return the keys of jobs completed by previous runs."""
+        if not os.path.exists(self.checkpoint_path):
+            return set()
+
+        done = set()
+        with open(self.checkpoint_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    try:
+                        done.add(json.loads(line)['key'])
+                    except (ValueError, KeyError):
+                        logger.warning(f"Skipping malformed checkpoint line: {line[:80]}")
+        return done
+
+    def run(self, jobs: List[Dict[str, Any]], workers: int = 4,
+            rate_limit: float = 1.0, burst: int = 1,
+            backend_name: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Run backfill jobs across a process pool.
+
+        Args:
+            jobs: Jobs as returned by plan_jobs
+            workers: Number of worker processes
+            rate_limit: Global LLM calls per second across all workers
+            burst: LLM calls allowed back to back
+            backend_name: Optional LLM backend overriding cfg.LLM_BACKEND
+
+        Returns:
+            Dictionary with job, message and timing totals
+        """
+        ensure_directory_exists(os.path.dirname(self.checkpoint_path) or '.')
+        limiter = SharedTokenBucket(rate_limit, burst)
+        stats = {'jobs': len(jobs), 'completed': 0, 'failed': 0, 'messages': 0}
+        started = time.perf_counter()
+
+        logger.info(f"Backfilling {len(jobs)} room-days with {workers} workers at {rate_limit} LLM calls/s")
+
+        with open(self.checkpoint_path, 'a', encoding='utf-8') as checkpoint, \
+                ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                    initargs=(limiter, backend_name)) as pool:
+            futures = {pool.submit(_run_job, job): job for job in jobs}
+
+            for future in as_completed(futures):
+                job = futures[future]
+                try:
+                    result = future.result()
+                except Exception as e:
+                    stats['failed'] += 1
+                    logger.error(f"Backfill job {_job_key(job)} crashed: {e}", exc_info=True)
+                    continue
+
+                if not result['ok']:
+                    stats['failed'] += 1
+                    logger.warning(f"Backfill job {result['key']} produced no summary")
+                    continue
+
+                # Checkpoint as soon as a job finishes so a restart skips it
+                checkpoint.write(json.dumps(result) + '\n')
+                checkpoint.flush()
+                stats['completed'] += 1
+                stats['messages'] += result['message_count']
+
+                done = stats['completed'] + stats['failed']
+                if done % 50 == 0 or done == len(jobs):
+                    logger.info(f"Backfill progress: {done}/{len(jobs)} jobs")
+
+        stats['elapsed'] = time.perf_counter() - started
+        return stats
+
+    async def roll_up(self, room_ids: List[str], rate_limit: float = 1.0,
+                      backend_name: Optional[str] = None) -> int:
+        """
+        Roll backfilled daily summaries up into weekly digests.
+
+        Args:
+            room_ids: Rooms whose daily summaries should be rolled up
+            rate_limit: LLM calls per second
+            backend_name: Optional LLM backend overriding cfg.LLM_BACKEND
+
+        Returns:
+            Number of weekly summaries created
+        """
+        from app.services.ai_service import AiService
+        from app.services.llm_backend import RateLimitedBackend, create_backend
+
+        ai_service = AiService(
+            backend=RateLimitedBackend(create_backend(backend_name), TokenBucket(rate_limit)),
+            message_service=self.message_service
+        )
+        created = 0
+        for room_id in room_ids:
+            created += await ai_service.roll_up_summaries(room_id)
+        return created
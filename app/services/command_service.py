@@ -0,0 +1,199 @@
+"""
+Bot commands and the fast lane they run on.
+
+Messages starting with the command prefix, and messages that @-mention the
+bot, are answered on a small lane with its own queue and workers, separate
+from the ingestion queue. Archival storage may lag behind during a burst,
+but a command never waits behind bulk chatter, so its latency stays flat
+under load.
+
+Commands are registered by name on a CommandRegistry; a handler is an async
+function taking a CommandContext and returning the reply text (or None).
+"""
+import asyncio
+import logging
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from app.utils.helpers import percentile
+
+logger = logging.getLogger(__name__)
+
+
+class CommandContext:
+    """One command invocation as seen by its handler."""
+
+    __slots__ = ('name', 'args', 'room_id', 'room_topic', 'sender_id',
+                 'sender_name', 'text', 'received_at')
+
+    def __init__(self, name: str, args: str, room_id: Optional[str],
+                 room_topic: Optional[str], sender_id: str, sender_name: str,
+                 text: str, received_at: float):
+        self.name = name
+        self.args = args
+        self.room_id = room_id
+        self.room_topic = room_topic
+        self.sender_id = sender_id
+        self.sender_name = sender_name
+        self.text = text
+        self.received_at = received_at
+
+
+CommandHandler = Callable[[CommandContext], Awaitable[Optional[str]]]
+
+
+class CommandRegistry:
+    """Commands by name, parsed from message text."""
+
+    def __init__(self, prefix: str = '/'):
+        """
+        Initialize an empty registry.
+
+        Args:
+            prefix: Text that command messages start with
+        """
+        self.prefix = prefix
+        self._commands: Dict[str, Tuple[str, CommandHandler]] = {}
+
+    def register(self, name: str, description: str, handler: CommandHandler):
+        """
+        Register (or replace) a command.
+
+        Args:
+            name: Command name, without the prefix
+            description: One-line description shown by the help command
+            handler: Async function producing the reply
+        """
+        self._commands[name.lower()] = (description, handler)
+
+    def commands(self) -> List[Tuple[str, str]]:
+        """Return (name, description) of every registered command."""
+        return [(name, description) for name, (description, _) in self._commands.items()]
+
+    def parse(self, text: str) -> Optional[Tuple[str, str]]:
+        """
+        Split a command message into command name and arguments.
+
+        Args:
+            text: Message text
+
+        Returns:
+            (name, args), or None if the text is not a command
+        """
+        if not text or not text.startswith(self.prefix):
+            return None
+
+        parts = text[len(self.prefix):].strip().split(maxsplit=1)
+        if not parts:
+            return None
+        return parts[0].lower(), parts[1] if len(parts) > 1 else ''
+
+    def help_text(self) -> str:
+        """Return the list of available commands."""
+        lines = ["Available commands:"]
+        lines.extend(f"{self.prefix}{name} - {description}" for name, description in self.commands())
+        return "\n".join(lines)
+
+    async def execute(self, context: CommandContext) -> Optional[str]:
+        """
+        Run a command.
+
+        Args:
+            context: The invocation
+
+        Returns:
+            The reply text, or None for no reply
+        """
+        entry = self._commands.get(context.name)
+        if entry is None:
+            return f"Unknown command: '{context.name}'. Type {self.prefix}help for available commands."
+        return await entry[1](context)
+
+
+# Async function sending a reply to the room or sender of an invocation
+ReplyCallback = Callable[[CommandContext, str], Awaitable[Any]]
+
+
+class CommandLane:
+    """Bounded queue of command invocations with dedicated workers."""
+
+    def __init__(self, registry: CommandRegistry, reply: ReplyCallback,
+                 workers: int = 2, maxsize: int = 100, latency_samples: int = 1000):
+        """
+        Initialize the lane.
+
+        Args:
+            registry: Commands to run
+            reply: Async function sending a reply
+            workers: Number of concurrent command workers
+            maxsize: Maximum number of waiting commands; more are rejected
+            latency_samples: Number of recent latencies kept for percentiles
+        """
+        self.registry = registry
+        self.reply = reply
+        self.workers = workers
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self._tasks = []
+        # Seconds from receipt of the message to the reply being sent
+        self._latencies = deque(maxlen=latency_samples)
+        self.stats = {'submitted': 0, 'completed': 0, 'failed': 0, 'rejected': 0}
+
+    async def start(self):
+        """Start the command workers."""
+        if not self._tasks:
+            self._tasks = [asyncio.ensure_future(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        """Stop the command workers, abandoning waiting commands."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def submit(self, context: CommandContext) -> bool:
+        """
+        Queue a command without waiting.
+
+        Args:
+            context: The invocation
+
+        Returns:
+            bool: False if the lane is full and the command was rejected
+        """
+        try:
+            self._queue.put_nowait(context)
+        except asyncio.QueueFull:
+            self.stats['rejected'] += 1
+            logger.warning(f"Command lane full, rejected {context.name} from {context.sender_name}")
+            return False
+        self.stats['submitted'] += 1
+        return True
+
+    async def _worker(self):
+        """Run queued commands one at a time."""
+        loop = asyncio.get_running_loop()
+        while True:
+            context = await self._queue.get()
+            try:
+                reply = await self.registry.execute(context)
+                if reply:
+                    await self.reply(context, reply)
+                self.stats['completed'] += 1
+            except Exception as e:
+                self.stats['failed'] += 1
+                logger.error(f"Error running command {context.name}: {e}", exc_info=True)
+            finally:
+                self._latencies.append(loop.time() - context.received_at)
+                self._queue.task_done()
+
+    def metrics(self) -> Dict[str, Any]:
+        """Return queue depth, latency and outcome metrics."""
+        latencies = list(self._latencies)
+        return {
+            'depth': self._queue.qsize(),
+            'workers': self.workers,
+            'latency_ms_p50': round(percentile(latencies, 50) * 1000, 2),
+            'latency_ms_p95': round(percentile(latencies, 95) * 1000, 2),
+            'latency_ms_max': round(max(latencies) * 1000, 2) if latencies else 0.0,
+            **self.stats
+        }
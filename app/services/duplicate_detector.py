@@ -0,0 +1,227 @@
+"""
+Streaming near-duplicate and flood detection for incoming messages.
+
+Each message gets a 64-bit SimHash signature over character shingles. Per
+room, the most recent signatures are kept in a sliding window and indexed
+by locality-sensitive hashing: the signature is split into eight 8-bit
+bands, so any two signatures within Hamming distance 7 share at least one
+band exactly. A lookup only inspects the few entries in the message's eight
+buckets, which keeps detection O(1) per message regardless of traffic.
+"""
+import hashlib
+import logging
+import re
+import time
+from collections import deque
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+SIGNATURE_BITS = 64
+BANDS = 8
+BAND_BITS = SIGNATURE_BITS // BANDS
+BAND_MASK = (1 << BAND_BITS) - 1
+
+# Characters ignored when comparing texts
+NOISE_PATTERN = re.compile(r'[\s\W_]+', re.UNICODE)
+
+
+def _feature_hash(feature: str) -> int:
+    """Return a stable 64-bit hash of a shingle."""
+    return int.from_bytes(hashlib.blake2b(feature.encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+def simhash(text: str, shingle: int = 2, max_chars: int = 512) -> int:
+    """
+    Compute the 64-bit SimHash signature of a text.
+
+    The text is normalized (case, whitespace and punctuation removed) and cut
+    to max_chars, so the cost per message is bounded.
+
+    Args:
+        text: The message text
+        shingle: Length of the character shingles used as features
+        max_chars: Maximum number of normalized characters considered
+
+    Returns:
+        int: The signature
+    """
+    normalized = NOISE_PATTERN.sub('', text.lower())[:max_chars]
+    if len(normalized) <= shingle:
+        return _feature_hash(normalized)
+
+    hashes = np.fromiter(
+        (_feature_hash(normalized[i:i + shingle]) for i in range(len(normalized) - shingle + 1)),
+        dtype=np.uint64
+    )
+    # One row of 64 bits per feature; a bit is set if most features set it
+    bits = np.unpackbits(hashes.view(np.uint8).reshape(-1, 8), axis=1, bitorder='little')
+    votes = bits.sum(axis=0, dtype=np.int64) * 2 > len(hashes)
+    return int.from_bytes(np.packbits(votes, bitorder='little').tobytes(), 'little')
+
+
+def hamming_distance(a: int, b: int) -> int:
+    """Return the number of differing bits between two signatures."""
+    return bin(a ^ b).count('1')
+
+
+class SignatureEntry:
+    """A recent message signature in a room's sliding window."""
+
+    __slots__ = ('signature', 'timestamp', 'ref', 'copies')
+
+    def __init__(self, signature: int, timestamp: float, ref: Optional[str]):
+        self.signature = signature
+        self.timestamp = timestamp
+        self.ref = ref  # Identifier of the original message
+        self.copies = 0  # Near-duplicates seen since the original
+
+
+class DuplicateCheck:
+    """Outcome of checking one message against its room's recent traffic."""
+
+    __slots__ = ('is_duplicate', 'duplicate_of', 'distance', 'copies', 'collapse')
+
+    def __init__(self, is_duplicate: bool = False, duplicate_of: Optional[str] = None,
+                 distance: int = 0, copies: int = 0, collapse: bool = False):
+        self.is_duplicate = is_duplicate
+        self.duplicate_of = duplicate_of
+        self.distance = distance
+        self.copies = copies
+        self.collapse = collapse
+
+    def to_metadata(self) -> Dict[str, Any]:
+        """Return metadata fields tagging a near-duplicate message."""
+        if not self.is_duplicate:
+            return {}
+        return {
+            'near_duplicate': True,
+            'duplicate_of': self.duplicate_of,
+            'duplicate_distance': self.distance,
+            'duplicate_copies': self.copies
+        }
+
+
+class RoomIndex:
+    """Sliding window of signatures for one room with its LSH buckets."""
+
+    __slots__ = ('window', 'buckets')
+
+    def __init__(self):
+        self.window = deque()
+        self.buckets: Dict[tuple, deque] = {}
+
+
+class DuplicateDetector:
+    """Detect near-duplicate messages and floods per room."""
+
+    def __init__(self, window_size: int = 500, window_seconds: float = 3600,
+                 max_distance: int = 6, flood_threshold: int = 5,
+                 min_length: int = 10, bucket_size: int = 16):
+        """
+        Initialize the detector.
+
+        Args:
+            window_size: Recent messages remembered per room
+            window_seconds: Maximum age of remembered messages in seconds
+            max_distance: Maximum Hamming distance of near-duplicates (at most 7
+                for the eight-band index to find every match)
+            flood_threshold: Copies of one message after which further copies
+                are collapsed instead of stored
+            min_length: Messages shorter than this (in characters) are never
+                treated as duplicates, since short replies repeat legitimately
+            bucket_size: Maximum entries kept per LSH bucket
+        """
+        self.window_size = window_size
+        self.window_seconds = window_seconds
+        self.max_distance = min(max_distance, BANDS - 1)
+        self.flood_threshold = flood_threshold
+        self.min_length = min_length
+        self.bucket_size = bucket_size
+
+        self.rooms: Dict[str, RoomIndex] = {}
+        self.stats = {'checked': 0, 'duplicates': 0, 'collapsed': 0}
+
+    @staticmethod
+    def _band_keys(signature: int):
+        return [(band, (signature >> (band * BAND_BITS)) & BAND_MASK) for band in range(BANDS)]
+
+    def check(self, room_id: str, text: str, ref: Optional[str] = None,
+              timestamp: Optional[float] = None) -> DuplicateCheck:
+        """
+        Check a message against recent messages of its room and remember it.
+
+        Args:
+            room_id: The ID of the room the message belongs to
+            text: The message text
+            ref: Identifier of the message, reported for later copies
+            timestamp: Epoch time of the message, defaults to now
+
+        Returns:
+            DuplicateCheck: Whether the message is a near-duplicate and
+            whether it should be collapsed as part of a flood
+        """
+        self.stats['checked'] += 1
+        if not text or len(text) < self.min_length:
+            return DuplicateCheck()
+
+        timestamp = timestamp or time.time()
+        index = self.rooms.get(room_id)
+        if index is None:
+            index = self.rooms[room_id] = RoomIndex()
+        self._expire(index, timestamp)
+
+        signature = simhash(text)
+        band_keys = self._band_keys(signature)
+
+        # Closest recent entry sharing at least one band
+        best = None
+        best_distance = SIGNATURE_BITS
+        for key in band_keys:
+            for entry in index.buckets.get(key, ()):
+                distance = hamming_distance(signature, entry.signature)
+                if distance < best_distance:
+                    best, best_distance = entry, distance
+
+        if best is not None and best_distance <= self.max_distance:
+            best.copies += 1
+            self.stats['duplicates'] += 1
+            collapse = best.copies > self.flood_threshold
+            if collapse:
+                self.stats['collapsed'] += 1
+            return DuplicateCheck(True, best.ref, best_distance, best.copies, collapse)
+
+        # New content: remember it in the window and its buckets
+        entry = SignatureEntry(signature, timestamp, ref)
+        index.window.append(entry)
+        for key in band_keys:
+            bucket = index.buckets.get(key)
+            if bucket is None:
+                bucket = index.buckets[key] = deque(maxlen=self.bucket_size)
+            bucket.append(entry)
+
+        if len(index.window) > self.window_size:
+            self._evict(index)
+
+        return DuplicateCheck()
+
+    def _expire(self, index: RoomIndex, now: float):
+        """Evict entries older than the window duration."""
+        while index.window and now - index.window[0].timestamp > self.window_seconds:
+            self._evict(index)
+
+    def _evict(self, index: RoomIndex):
+        """Remove the oldest entry from the window and its buckets."""
+        entry = index.window.popleft()
+        for key in self._band_keys(entry.signature):
+            bucket = index.buckets.get(key)
+            if bucket is None:
+                continue
+            try:
+                bucket.remove(entry)
+            except ValueError:
+                pass  # Already pushed out of a full bucket
+            if not bucket:
+                del index.buckets[key]
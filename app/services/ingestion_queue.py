@@ -0,0 +1,254 @@
+"""
+Bounded ingestion pipeline between the message handler and storage.
+
+The message handler only validates a message and puts it on a bounded
+asyncio queue; a pool of storage workers drains the queue and writes to the
+database on worker threads, so a burst in one busy group does not hold up
+other events. When the queue is full one of three overflow policies applies:
+
+* ``block``: the handler waits for free space (backpressure on the puppet)
+* ``spill``: messages are appended to a local JSONL file and replayed into
+  the queue, in order, once it has room again
+* ``drop_oldest``: the oldest queued message is discarded
+"""
+import asyncio
+import json
+import logging
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from app.utils.helpers import percentile
+
+logger = logging.getLogger(__name__)
+
+OVERFLOW_POLICIES = ('block', 'spill', 'drop_oldest')
+
+# Blocking callable storing one queued item, returning True on success
+StoreCallback = Callable[[Dict[str, Any]], bool]
+
+
+class IngestionQueue:
+    """Bounded queue of incoming messages drained by storage workers."""
+
+    def __init__(self, store: StoreCallback,
+                 on_stored: Optional[Callable[[Dict[str, Any]], None]] = None,
+                 maxsize: int = 10000, workers: int = 4,
+                 overflow: str = 'block', spill_path: Optional[str] = None,
+                 replay_interval: float = 0.2, wait_samples: int = 1000):
+        """
+        Initialize the queue.
+
+        Args:
+            store: Blocking function storing one item; runs on a worker thread
+            on_stored: Optional function called on the event loop after an
+                item was stored
+            maxsize: Maximum number of queued items
+            workers: Number of storage workers (and worker threads)
+            overflow: Overflow policy, one of OVERFLOW_POLICIES
+            spill_path: JSONL file used by the 'spill' policy
+            replay_interval: Seconds between replay attempts while items are spilled
+            wait_samples: Number of recent queue wait times kept for percentiles
+        """
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy: {overflow}")
+        if overflow == 'spill' and not spill_path:
+            raise ValueError("The 'spill' overflow policy needs a spill_path")
+
+        self.store = store
+        self.on_stored = on_stored
+        self.maxsize = maxsize
+        self.workers = workers
+        self.overflow = overflow
+        self.spill_path = spill_path
+        self.replay_interval = replay_interval
+
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='ingest')
+        self._tasks = []
+        self._wait_times = deque(maxlen=wait_samples)
+
+        # Spill file state: items appended but not yet replayed
+        self._spill_file = None
+        self._spill_offset = 0
+        self._spill_backlog = 0
+        self._spill_ready = asyncio.Event()
+
+        self.stats = {
+            'enqueued': 0,
+            'stored': 0,
+            'failed': 0,
+            'dropped': 0,
+            'spilled': 0,
+            'replayed': 0,
+            'max_depth': 0
+        }
+
+    async def start(self):
+        """Start the storage workers (and the spill replayer)."""
+        if self._tasks:
+            return
+
+        for _ in range(self.workers):
+            self._tasks.append(asyncio.ensure_future(self._worker()))
+
+        if self.overflow == 'spill':
+            self._open_spill()
+            self._tasks.append(asyncio.ensure_future(self._replay_loop()))
+
+        logger.info(f"Ingestion queue started ({self.workers} workers, "
+                    f"max {self.maxsize} queued, overflow={self.overflow})")
+
+    async def stop(self, timeout: float = 10.0):
+        """
+        Drain the queue, then stop the workers.
+
+        Items still spilled to disk stay there and are replayed on next start.
+
+        Args:
+            timeout: Maximum seconds to wait for queued items to be stored
+        """
+        if not self._tasks:
+            return
+
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Stopped with {self._queue.qsize()} messages still queued")
+
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+        if self._spill_file:
+            self._spill_file.close()
+            self._spill_file = None
+        self._executor.shutdown(wait=True)
+
+        logger.info(f"Ingestion queue stopped: {self.stats}")
+
+    async def put(self, item: Dict[str, Any]):
+        """
+        Queue an item for storage, applying the overflow policy if full.
+
+        Args:
+            item: JSON-serializable message fields passed to the store function
+        """
+        self.stats['enqueued'] += 1
+
+        if self.overflow == 'block':
+            await self._queue.put((asyncio.get_running_loop().time(), item))
+        elif self.overflow == 'spill':
+            # Once anything is spilled, later items follow it to keep order
+            if self._spill_backlog or self._queue.full():
+                self._spill(item)
+                return
+            self._queue.put_nowait((asyncio.get_running_loop().time(), item))
+        else:
+            if self._queue.full():
+                self._queue.get_nowait()
+                self._queue.task_done()
+                self.stats['dropped'] += 1
+            self._queue.put_nowait((asyncio.get_running_loop().time(), item))
+
+        depth = self._queue.qsize()
+        if depth > self.stats['max_depth']:
+            self.stats['max_depth'] = depth
+
+    async def _worker(self):
+        """Store queued items one at a time on the worker thread pool."""
+        loop = asyncio.get_running_loop()
+        while True:
+            enqueued_at, item = await self._queue.get()
+            try:
+                self._wait_times.append(loop.time() - enqueued_at)
+                stored = await loop.run_in_executor(self._executor, self.store, item)
+                if stored:
+                    self.stats['stored'] += 1
+                    if self.on_stored:
+                        self.on_stored(item)
+                else:
+                    self.stats['failed'] += 1
+            except Exception as e:
+                self.stats['failed'] += 1
+                logger.error(f"Error storing queued message: {e}", exc_info=True)
+            finally:
+                self._queue.task_done()
+
+    def _open_spill(self):
+        """Open the spill file, picking up items left over from a previous run."""
+        os.makedirs(os.path.dirname(self.spill_path) or '.', exist_ok=True)
+        self._spill_file = open(self.spill_path, 'ab')
+
+        try:
+            with open(self.spill_path + '.offset', 'r') as f:
+                self._spill_offset = int(f.read().strip() or 0)
+        except (OSError, ValueError):
+            self._spill_offset = 0
+
+        with open(self.spill_path, 'rb') as f:
+            f.seek(self._spill_offset)
+            self._spill_backlog = sum(1 for _ in f)
+
+        if self._spill_backlog:
+            logger.info(f"Replaying {self._spill_backlog} spilled messages from {self.spill_path}")
+            self._spill_ready.set()
+
+    def _spill(self, item: Dict[str, Any]):
+        """Append an item to the spill file."""
+        self._spill_file.write(json.dumps(item, ensure_ascii=False).encode('utf-8') + b'\n')
+        self._spill_file.flush()
+        self._spill_backlog += 1
+        self.stats['spilled'] += 1
+        self._spill_ready.set()
+
+    async def _replay_loop(self):
+        """Move spilled items back into the queue as space frees up."""
+        loop = asyncio.get_running_loop()
+        while True:
+            await self._spill_ready.wait()
+
+            free = self.maxsize - self._queue.qsize()
+            # Refill only once the queue has drained below half, in batches
+            if free >= self.maxsize // 2:
+                replayed = 0
+                with open(self.spill_path, 'rb') as f:
+                    f.seek(self._spill_offset)
+                    while replayed < free:
+                        line = f.readline()
+                        if not line.endswith(b'\n'):
+                            break  # End of file (or a partially written line)
+                        self._spill_offset += len(line)
+                        self._queue.put_nowait((loop.time(), json.loads(line)))
+                        replayed += 1
+
+                self._spill_backlog -= replayed
+                self.stats['replayed'] += replayed
+
+                if self._spill_backlog <= 0:
+                    # Everything is back in the queue: start a fresh file
+                    self._spill_backlog = 0
+                    self._spill_offset = 0
+                    self._spill_file.truncate(0)
+                    self._spill_ready.clear()
+                with open(self.spill_path + '.offset', 'w') as f:
+                    f.write(str(self._spill_offset))
+
+            await asyncio.sleep(self.replay_interval)
+
+    def metrics(self) -> Dict[str, Any]:
+        """Return queue depth, wait time and overflow metrics."""
+        waits = list(self._wait_times)
+        return {
+            'depth': self._queue.qsize(),
+            'maxsize': self.maxsize,
+            'workers': self.workers,
+            'overflow': self.overflow,
+            'spill_backlog': self._spill_backlog,
+            'wait_ms_p50': round(percentile(waits, 50) * 1000, 2),
+            'wait_ms_p95': round(percentile(waits, 95) * 1000, 2),
+            'wait_ms_max': round(max(waits) * 1000, 2) if waits else 0.0,
+            **self.stats
+        }
@@ -0,0 +1,188 @@
+"""
+Periodic jobs on the application's event loop.
+
+Each job runs in its own task on the main loop, so coroutine jobs share the
+loop's connections and clients instead of starting a fresh loop per run.
+Blocking jobs (CPU-heavy or synchronous database work) run on the default
+thread pool. A job never overlaps itself: the next run is only scheduled
+after the previous one finished. Intervals are jittered so jobs started
+together drift apart, and ``stop()`` cancels waiting and running jobs.
+"""
+import asyncio
+import logging
+import random
+import time
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class Job:
+    """A periodic job and its run statistics."""
+
+    __slots__ = ('name', 'func', 'interval', 'jitter', 'blocking', 'run_at_start',
+                 'task', 'running', 'stats')
+
+    def __init__(self, name: str, func: Callable[[], Any], interval: float,
+                 jitter: float, blocking: bool, run_at_start: bool):
+        self.name = name
+        self.func = func
+        self.interval = interval
+        self.jitter = jitter
+        self.blocking = blocking
+        self.run_at_start = run_at_start
+        self.task: Optional[asyncio.Task] = None
+        self.running = False
+        self.stats = {
+            'runs': 0,
+            'failures': 0,
+            'skipped': 0,
+            'last_started': None,
+            'last_duration': 0.0,
+            'total_duration': 0.0,
+            'max_duration': 0.0
+        }
+
+    def next_delay(self) -> float:
+        """Return the seconds until the next run, with random jitter."""
+        spread = self.interval * self.jitter
+        return max(0.0, self.interval + random.uniform(-spread, spread))
+
+
+class JobScheduler:
+    """Run periodic jobs on the running event loop."""
+
+    def __init__(self, jitter: float = 0.1):
+        """
+        Initialize the scheduler.
+
+        Args:
+            jitter: Default fraction of the interval by which runs are randomly
+                moved earlier or later
+        """
+        self.jitter = jitter
+        self.jobs: Dict[str, Job] = {}
+        self._started = False
+
+    def add_job(self, name: str, func: Callable[[], Any], interval: float,
+                jitter: Optional[float] = None, blocking: bool = False,
+                run_at_start: bool = False) -> Job:
+        """
+        Register a periodic job; it starts with the scheduler (or at once if
+        the scheduler is already running).
+
+        Args:
+            name: Unique job name, used in logs and metrics
+            func: Coroutine function, or a plain function if blocking is True
+            interval: Seconds between the end of one run and the next start
+            jitter: Fraction of the interval to jitter by (default: scheduler's)
+            blocking: Run func on the default thread pool
+            run_at_start: Run once immediately instead of after one interval
+
+        Returns:
+            Job: The registered job
+        """
+        if name in self.jobs:
+            raise ValueError(f"Job {name} already exists")
+
+        job = Job(name, func, interval, self.jitter if jitter is None else jitter,
+                  blocking, run_at_start)
+        self.jobs[name] = job
+        if self._started:
+            job.task = asyncio.ensure_future(self._job_loop(job))
+        return job
+
+    async def start(self):
+        """Start all registered jobs."""
+        if self._started:
+            return
+        self._started = True
+
+        for job in self.jobs.values():
+            job.task = asyncio.ensure_future(self._job_loop(job))
+        logger.info(f"Job scheduler started with {len(self.jobs)} jobs: {', '.join(self.jobs)}")
+
+    async def stop(self):
+        """
+        Cancel all jobs, including running ones.
+
+        A blocking job already running on the thread pool cannot be
+        interrupted; it finishes in the background and its result is ignored.
+        """
+        self._started = False
+        tasks = [job.task for job in self.jobs.values() if job.task]
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+        for job in self.jobs.values():
+            job.task = None
+
+        logger.info("Job scheduler stopped")
+
+    async def run_now(self, name: str) -> bool:
+        """
+        Run a job immediately, unless it is already running.
+
+        Args:
+            name: The job name
+
+        Returns:
+            bool: False if the job was skipped because it is running
+        """
+        job = self.jobs[name]
+        if job.running:
+            job.stats['skipped'] += 1
+            logger.info(f"Job {name} is still running, skipped")
+            return False
+
+        await self._run(job)
+        return True
+
+    async def _job_loop(self, job: Job):
+        """Run a job forever, waiting a jittered interval after each run."""
+        if not job.run_at_start:
+            await asyncio.sleep(job.next_delay())
+        while True:
+            if job.running:
+                # A manual run is in progress; wait for the next slot
+                job.stats['skipped'] += 1
+            else:
+                await self._run(job)
+            await asyncio.sleep(job.next_delay())
+
+    async def _run(self, job: Job):
+        """Run a job once and record its duration and outcome."""
+        job.running = True
+        job.stats['last_started'] = time.time()
+        started = time.monotonic()
+        try:
+            if job.blocking:
+                await asyncio.get_running_loop().run_in_executor(None, job.func)
+            else:
+                await job.func()
+        except asyncio.CancelledError:
+            logger.info(f"Job {job.name} cancelled")
+            raise
+        except Exception as e:
+            job.stats['failures'] += 1
+            logger.error(f"Job {job.name} failed: {e}", exc_info=True)
+        finally:
+            duration = time.monotonic() - started
+            job.running = False
+            job.stats['runs'] += 1
+            job.stats['last_duration'] = round(duration, 3)
+            job.stats['total_duration'] += duration
+            job.stats['max_duration'] = round(max(job.stats['max_duration'], duration), 3)
+
+    def metrics(self) -> Dict[str, Dict[str, Any]]:
+        """Return run counts and durations per job."""
+        metrics = {}
+        for name, job in self.jobs.items():
+            stats = dict(job.stats)
+            total = stats.pop('total_duration')
+            stats['avg_duration'] = round(total / stats['runs'], 3) if stats['runs'] else 0.0
+            stats['interval'] = job.interval
+            stats['running'] = job.running
+            metrics[name] = stats
+        return metrics
@@ -0,0 +1,305 @@
+"""
+Pluggable LLM backends used by the AI service.
+
+Backends share a minimal async ``complete`` interface so the analysis pipeline
+can run against the OpenAI API, an OpenAI-compatible local endpoint, or a
+deterministic in-process fake for offline testing and benchmarking.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import random
+import re
+from typing import AsyncIterator, Optional
+
+import openai
+
+import config as cfg
+from app.utils.rate_limit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+
+class LlmBackendError(Exception):
+    """Raised when a backend fails to produce a completion."""
+
+
+class LlmBackend:
+    """Base class for LLM completion backends."""
+
+    name = "base"
+
+    async def complete(self, prompt: str, max_tokens: int = 500,
+                       temperature: float = 0.5, top_p: float = 0.95) -> str:
+        """
+        Generate a completion for a prompt.
+
+        Args:
+            prompt: The prompt text
+            max_tokens: Maximum number of tokens to generate
+            temperature: Sampling temperature
+            top_p: Nucleus sampling probability
+
+        Returns:
+            The completion text
+        """
+        raise NotImplementedError
+
+    async def stream(self, prompt: str, max_tokens: int = 500,
+                     temperature: float = 0.5, top_p: float = 0.95) -> AsyncIterator[str]:
+        """
+        Generate a completion for a prompt as a stream of text pieces.
+
+        Backends without native streaming yield the whole completion at once.
+
+        Args:
+            prompt: The prompt text
+            max_tokens: Maximum number of tokens to generate
+            temperature: Sampling temperature
+            top_p: Nucleus sampling probability
+
+        Yields:
+            Consecutive pieces of the completion text
+        """
+        yield await self.complete(prompt, max_tokens, temperature, top_p)
+
+
+class OpenAiChatBackend(LlmBackend):
+    """Backend using the OpenAI chat completions API or a compatible server."""
+
+    name = "openai"
+
+    def __init__(self, api_key: str, model: str, api_base: Optional[str] = None,
+                 timeout: Optional[float] = None):
+        """
+        Initialize the backend.
+
+        Args:
+            api_key: API key sent with each request
+            model: Model name to request
+            api_base: Optional base URL of an OpenAI-compatible endpoint
+            timeout: Optional request timeout in seconds
+        """
+        self.api_key = api_key
+        self.model = model
+        self.api_base = api_base
+        self.timeout = timeout
+
+    def _request_kwargs(self) -> dict:
+        """Per-request connection settings."""
+        # Pass credentials per request instead of mutating the global module
+        kwargs = {'api_key': self.api_key}
+        if self.api_base:
+            kwargs['api_base'] = self.api_base
+        if self.timeout:
+            kwargs['request_timeout'] = self.timeout
+        return kwargs
+
+    async def complete(self, prompt: str, max_tokens: int = 500,
+                       temperature: float = 0.5, top_p: float = 0.95) -> str:
+        """Generate a completion with a single-turn chat request."""
+        try:
+            response = await openai.ChatCompletion.acreate(
+                model=self.model,
+                messages=[{'role': 'user', 'content': prompt}],
+                max_tokens=max_tokens,
+                temperature=temperature,
+                top_p=top_p,
+                **self._request_kwargs()
+            )
+        except Exception as e:
+            raise LlmBackendError(f"Chat completion failed: {e}") from e
+
+        return response.choices[0].message.content.strip()
+
+    async def stream(self, prompt: str, max_tokens: int = 500,
+                     temperature: float = 0.5, top_p: float = 0.95) -> AsyncIterator[str]:
+        """Stream a completion as the server generates it."""
+        try:
+            response = await openai.ChatCompletion.acreate(
+                model=self.model,
+                messages=[{'role': 'user', 'content': prompt}],
+                max_tokens=max_tokens,
+                temperature=temperature,
+                top_p=top_p,
+                stream=True,
+                **self._request_kwargs()
+            )
+            async for chunk in response:
+                content = chunk.choices[0].delta.get('content')
+                if content:
+                    yield content
+        except Exception as e:
+            raise LlmBackendError(f"Chat completion stream failed: {e}") from e
+
+
+class FakeLlmBackend(LlmBackend):
+    """
+    Deterministic in-process backend for tests and benchmarks.
+
+    Replies are derived from the prompt text only, so the same prompt always
+    yields the same completion. Latency and error injection are driven by a
+    seeded random generator so benchmark runs are reproducible.
+    """
+
+    name = "fake"
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0,
+                 error_rate: float = 0.0, seed: int = 0):
+        """
+        Initialize the fake backend.
+
+        Args:
+            latency: Base latency of each call in seconds
+            jitter: Maximum extra latency added uniformly at random, in seconds
+            error_rate: Probability in [0, 1] that a call raises LlmBackendError
+            seed: Seed for the latency and error random generator
+        """
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self._random = random.Random(seed)
+        self.call_count = 0
+        self.error_count = 0
+
+    def next_delay(self) -> float:
+        """Return the simulated latency for the next call."""
+        return self.latency + (self._random.uniform(0, self.jitter) if self.jitter else 0.0)
+
+    def should_fail(self) -> bool:
+        """Return True if the next call should raise an injected error."""
+        return self.error_rate > 0 and self._random.random() < self.error_rate
+
+    async def complete(self, prompt: str, max_tokens: int = 500,
+                       temperature: float = 0.5, top_p: float = 0.95) -> str:
+        """Return a canned completion after the configured delay."""
+        self.call_count += 1
+        delay = self.next_delay()
+        fail = self.should_fail()
+
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+        if fail:
+            self.error_count += 1
+            raise LlmBackendError("Injected fake backend error")
+
+        return render_fake_completion(prompt, max_tokens)
+
+    async def stream(self, prompt: str, max_tokens: int = 500,
+                     temperature: float = 0.5, top_p: float = 0.95) -> AsyncIterator[str]:
+        """Yield the canned completion word by word, spread over the configured delay."""
+        self.call_count += 1
+        delay = self.next_delay()
+        fail = self.should_fail()
+
+        if fail:
+            await asyncio.sleep(delay)
+            self.error_count += 1
+            raise LlmBackendError("Injected fake backend error")
+
+        pieces = split_stream_pieces(render_fake_completion(prompt, max_tokens))
+        for piece in pieces:
+            if delay > 0:
+                await asyncio.sleep(delay / len(pieces))
+            yield piece
+
+
+class RateLimitedBackend(LlmBackend):
+    """Backend wrapper that waits for a rate limiter before each call."""
+
+    def __init__(self, backend: LlmBackend, limiter: TokenBucket):
+        """
+        Initialize the wrapper.
+
+        Args:
+            backend: The backend performing the completions
+            limiter: Token bucket shared by all callers that must respect the limit
+        """
+        self.backend = backend
+        self.limiter = limiter
+        self.name = backend.name
+
+    async def complete(self, prompt: str, max_tokens: int = 500,
+                       temperature: float = 0.5, top_p: float = 0.95) -> str:
+        """Generate a completion once the rate limiter allows it."""
+        await self.limiter.acquire()
+        return await self.backend.complete(prompt, max_tokens, temperature, top_p)
+
+    async def stream(self, prompt: str, max_tokens: int = 500,
+                     temperature: float = 0.5, top_p: float = 0.95) -> AsyncIterator[str]:
+        """Stream a completion once the rate limiter allows it."""
+        await self.limiter.acquire()
+        async for piece in self.backend.stream(prompt, max_tokens, temperature, top_p):
+            yield piece
+
+
+def render_fake_completion(prompt: str, max_tokens: int = 500) -> str:
+    """
+    Build a deterministic completion for a prompt.
+
+    Prompts asking for a JSON array get a JSON array of frequent words back,
+    everything else gets a short bullet list, so callers parse fake output the
+    same way they parse real output.
+
+    Args:
+        prompt: The prompt text
+        max_tokens: Rough cap on the number of words returned
+
+    Returns:
+        The completion text
+    """
+    words = re.findall(r'\w+', prompt.lower())
+    counts = {}
+    for word in words:
+        if len(word) > 2:
+            counts[word] = counts.get(word, 0) + 1
+    top_words = sorted(counts, key=lambda w: (-counts[w], w))[:8]
+
+    if 'json array' in prompt.lower():
+        return json.dumps(top_words, ensure_ascii=False)
+
+    digest = hashlib.sha1(prompt.encode('utf-8')).hexdigest()[:8]
+    lines = [f"- Discussion about {word}" for word in top_words[:5]]
+    lines.append(f"- Reference {digest}")
+    return "\n".join(lines[:max(1, max_tokens // 10)])
+
+
+def split_stream_pieces(text: str) -> list:
+    """Split a completion into the word-sized pieces a streaming server would send."""
+    return re.findall(r'\S+\s*|\s+', text) or [text]
+
+
+def create_backend(backend_name: Optional[str] = None) -> LlmBackend:
+    """
+    Create the LLM backend selected in the configuration.
+
+    Args:
+        backend_name: Optional backend name overriding cfg.LLM_BACKEND
+
+    Returns:
+        An LlmBackend instance
+    """
+    name = backend_name or cfg.LLM_BACKEND
+
+    if name == "fake":
+        return FakeLlmBackend(
+            latency=cfg.FAKE_LLM_LATENCY,
+            error_rate=cfg.FAKE_LLM_ERROR_RATE
+        )
+    if name == "openai_compatible":
+        return OpenAiChatBackend(
+            api_key=cfg.OPENAI_API_KEY,
+            model=cfg.OPENAI_MODEL,
+            api_base=cfg.LLM_API_BASE,
+            timeout=cfg.LLM_REQUEST_TIMEOUT
+        )
+    if name == "openai":
+        return OpenAiChatBackend(
+            api_key=cfg.OPENAI_API_KEY,
+            model=cfg.OPENAI_MODEL,
+            timeout=cfg.LLM_REQUEST_TIMEOUT
+        )
+
+    raise ValueError(f"Unknown LLM backend: {name}")
@@ -0,0 +1,275 @@
+"""
+Media archiving for image, file, voice and video messages.
+
+Attachments are downloaded by a small pool of media workers, off the message
+handler, and written to a content-addressed store: each file is named by the
+SHA-256 of its content, so a picture forwarded to ten groups is stored once.
+Downloads are streamed to a temporary file while being hashed, so large files
+never sit in memory, and are then renamed into place (or discarded if the
+content is already stored).
+
+Once its attachment is archived (or the download failed), the message
+continues to the ingestion queue with a ``media`` reference, which the
+message service stores as a MediaFile row linked from the message.
+
+File boxes are duck-typed: a remote URL (``remoteUrl``) is streamed with
+requests; any other box is written by its own ``to_file()``.
+"""
+import asyncio
+import hashlib
+import logging
+import mimetypes
+import os
+import time
+import uuid
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict
+
+import requests
+
+from app.utils.helpers import percentile
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 256 * 1024
+
+
+class MediaTooLarge(Exception):
+    """The attachment exceeds the configured size limit."""
+
+
+class MediaStore:
+    """Content-addressed file store: <base>/<ab>/<cd>/<sha256>."""
+
+    def __init__(self, base_dir: str, max_bytes: int = 100 * 2 ** 20,
+                 download_timeout: float = 60.0):
+        """
+        Initialize the store.
+
+        Args:
+            base_dir: Root directory of the store
+            max_bytes: Largest attachment archived
+            download_timeout: Seconds without data before a download is abandoned
+        """
+        self.base_dir = base_dir
+        self.max_bytes = max_bytes
+        self.download_timeout = download_timeout
+        self._tmp_dir = os.path.join(base_dir, 'tmp')
+        os.makedirs(self._tmp_dir, exist_ok=True)
+
+    def relative_path(self, sha256: str) -> str:
+        """Return the path of a file relative to the store root."""
+        return os.path.join(sha256[:2], sha256[2:4], sha256)
+
+    def path(self, sha256: str) -> str:
+        """Return the absolute path of a stored file."""
+        return os.path.join(self.base_dir, self.relative_path(sha256))
+
+    def exists(self, sha256: str) -> bool:
+        """Tell whether content is already stored."""
+        return os.path.exists(self.path(sha256))
+
+    async def save(self, file_box: Any) -> Dict[str, Any]:
+        """
+        Archive the content of a file box.
+
+        Args:
+            file_box: The attachment
+
+        Returns:
+            dict: sha256, size, file_name, mime_type, path (relative) and
+            whether the content was already stored ('existing')
+        """
+        loop = asyncio.get_running_loop()
+        tmp_path = os.path.join(self._tmp_dir, uuid.uuid4().hex)
+        name = getattr(file_box, 'name', None) or ''
+
+        try:
+            url = getattr(file_box, 'remoteUrl', None) or getattr(file_box, 'remote_url', None)
+            if url:
+                headers = getattr(file_box, 'headers', None) or {}
+                sha256, size = await loop.run_in_executor(
+                    None, self._download, url, headers, tmp_path
+                )
+            else:
+                # The puppet writes the file; hash it afterwards in chunks
+                await file_box.to_file(tmp_path, True)
+                sha256, size = await loop.run_in_executor(None, self._hash_file, tmp_path)
+
+            existing = await loop.run_in_executor(None, self._commit, tmp_path, sha256)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+        mime_type = (getattr(file_box, 'mimeType', None) or getattr(file_box, 'mime_type', None)
+                     or mimetypes.guess_type(name)[0])
+        return {
+            'sha256': sha256,
+            'size': size,
+            'file_name': name[:255],
+            'mime_type': mime_type,
+            'path': self.relative_path(sha256),
+            'existing': existing
+        }
+
+    def _download(self, url: str, headers: Dict[str, str], tmp_path: str):
+        """Stream a URL to a file while hashing it (runs on a worker thread)."""
+        digest = hashlib.sha256()
+        size = 0
+        with requests.get(url, headers=headers, stream=True, timeout=self.download_timeout) as response:
+            response.raise_for_status()
+            with open(tmp_path, 'wb') as f:
+                for chunk in response.iter_content(CHUNK_SIZE):
+                    size += len(chunk)
+                    if size > self.max_bytes:
+                        raise MediaTooLarge(f"larger than {self.max_bytes} bytes")
+                    digest.update(chunk)
+                    f.write(chunk)
+        return digest.hexdigest(), size
+
+    def _hash_file(self, path: str):
+        """Hash a file in chunks (runs on a worker thread)."""
+        size = os.path.getsize(path)
+        if size > self.max_bytes:
+            raise MediaTooLarge(f"{size} bytes, larger than {self.max_bytes}")
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+                digest.update(chunk)
+        return digest.hexdigest(), size
+
+    def _commit(self, tmp_path: str, sha256: str) -> bool:
+        """Move a downloaded file into place; return True if already stored."""
+        final_path = self.path(sha256)
+        if os.path.exists(final_path):
+            return True
+        os.makedirs(os.path.dirname(final_path), exist_ok=True)
+        # Atomic on one filesystem, so readers never see a partial file
+        os.replace(tmp_path, final_path)
+        return False
+
+
+# Async function returning the file box of a message's attachment
+FetchCallback = Callable[[Any], Awaitable[Any]]
+# Async function receiving the ingestion item once its media was handled
+DoneCallback = Callable[[Dict[str, Any]], Awaitable[None]]
+
+
+class MediaPipeline:
+    """Bounded queue of attachments archived by dedicated workers."""
+
+    def __init__(self, store: MediaStore, fetch: FetchCallback, on_done: DoneCallback,
+                 workers: int = 4, maxsize: int = 1000, latency_samples: int = 1000):
+        """
+        Initialize the pipeline.
+
+        Args:
+            store: Where attachments are archived
+            fetch: Async function getting the file box of a message
+            on_done: Async function receiving each item after its media
+                was handled (successfully or not)
+            workers: Maximum number of concurrent downloads
+            maxsize: Maximum number of waiting attachments; more are skipped
+            latency_samples: Number of recent download durations kept
+        """
+        self.store = store
+        self.fetch = fetch
+        self.on_done = on_done
+        self.workers = workers
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self._tasks = []
+        self._durations = deque(maxlen=latency_samples)
+        self.stats = {
+            'archived': 0,
+            'deduplicated': 0,
+            'failed': 0,
+            'skipped': 0,
+            'bytes_written': 0
+        }
+
+    async def start(self):
+        """Start the media workers."""
+        if not self._tasks:
+            self._tasks = [asyncio.ensure_future(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self, timeout: float = 30.0):
+        """
+        Finish queued downloads, then stop the workers.
+
+        Args:
+            timeout: Maximum seconds to wait for queued downloads
+        """
+        if not self._tasks:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Stopped with {self._queue.qsize()} attachments not archived")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def submit(self, message: Any, item: Dict[str, Any]) -> bool:
+        """
+        Queue a message's attachment for archiving.
+
+        Args:
+            message: The raw message
+            item: Its ingestion item, passed on to on_done
+
+        Returns:
+            bool: False if the queue is full; the caller stores the message
+            without its attachment
+        """
+        try:
+            self._queue.put_nowait((message, item))
+        except asyncio.QueueFull:
+            self.stats['skipped'] += 1
+            return False
+        return True
+
+    async def _worker(self):
+        """Archive queued attachments one at a time."""
+        while True:
+            message, item = await self._queue.get()
+            started = time.monotonic()
+            try:
+                media = await self.store.save(await self.fetch(message))
+                item['media'] = media
+                item['metadata']['media'] = {
+                    'sha256': media['sha256'],
+                    'size': media['size'],
+                    'mime_type': media['mime_type']
+                }
+                if media['existing']:
+                    self.stats['deduplicated'] += 1
+                else:
+                    self.stats['archived'] += 1
+                    self.stats['bytes_written'] += media['size']
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.stats['failed'] += 1
+                item['metadata']['media_error'] = str(e)[:200]
+                logger.warning(f"Could not archive attachment of message {item['metadata'].get('msg_id')}: {e}")
+            finally:
+                self._durations.append(time.monotonic() - started)
+
+            try:
+                await self.on_done(item)
+            except Exception as e:
+                logger.error(f"Error passing on media message: {e}", exc_info=True)
+            finally:
+                self._queue.task_done()
+
+    def metrics(self) -> Dict[str, Any]:
+        """Return queue depth, download duration and outcome metrics."""
+        durations = list(self._durations)
+        return {
+            'depth': self._queue.qsize(),
+            'workers': self.workers,
+            'download_ms_p50': round(percentile(durations, 50) * 1000, 2),
+            'download_ms_p95': round(percentile(durations, 95) * 1000, 2),
+            **self.stats
+        }
@@ -4,39 +4,126 @@ Message service for handling storage and retrieval of WeChat messages.
 import logging
 import json
 import datetime
-from typing import List, Dict, Any, Optional
-from sqlalchemy import create_engine, desc
+import hashlib
+import numpy as np
+from typing import Iterator, List, Dict, Any, Optional, Tuple
+from sqlalchemy import create_engine, desc, event, func
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import sessionmaker
 
 import config as cfg
-from app.models.database import Base, Message, Room, User, MessageSummary
+from app.models.database import (
+    MediaFile, Message, Room, User, MessageSummary, Keyword, upgrade_schema
+)
+from app.models.records import MessageRecord
+from app.utils.live_stream import broker as stream_broker
+from app.utils.response_cache import bump_version
+from app.utils.segmentation import parse_quote
+from app.utils.vector_index import HashedEmbedder, VectorIndex
 
 logger = logging.getLogger(__name__)
 
+def raw_message_metadata(raw_message: Any) -> Dict[str, Any]:
+    """
+    Extract the metadata stored with a message from the raw puppet message.
+    
+    Args:
+        raw_message: The raw message object, or None
+        
+    Returns:
+        Dictionary with the message ID and, if any, the mentioned contact IDs
+    """
+    metadata = {'msg_id': getattr(raw_message, 'message_id', None)}
+    
+    payload = getattr(raw_message, 'payload', None)
+    mention_ids = getattr(payload, 'mention_ids', None)
+    if mention_ids:
+        metadata['mention_ids'] = list(mention_ids)
+    return metadata
+
+def message_dedup_key(room_id: str, sender_id: str, timestamp: Optional[float],
+                      content: str) -> Optional[str]:
+    """
+    Build the key identifying a message across bot accounts.
+    
+    Puppet message IDs differ per account, so the key is derived from what
+    every account sees identically: room, sender, server timestamp and text.
+    Identical texts from one sender within the same second share a key, so
+    only set it when several accounts may store the same message.
+    
+    Args:
+        room_id: The ID of the room/group
+        sender_id: The ID of the message sender
+        timestamp: Server timestamp of the message, or None if unknown
+        content: The text content of the message
+        
+    Returns:
+        Hex digest, or None without a timestamp (the message is then never
+        deduplicated)
+    """
+    if timestamp is None:
+        return None
+    raw = f"{room_id}\x00{sender_id}\x00{int(timestamp)}\x00{content}"
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+def _enable_sqlite_wal(dbapi_connection, connection_record):
+    """Switch a SQLite connection to write-ahead logging."""
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.close()
+
 class MessageService:
     """Service for managing message storage and retrieval."""
     
-    def __init__(self):
-        """Initialize the message service with database connection."""
+    def __init__(self, db_url: Optional[str] = None):
+        """
+        Initialize the message service with database connection.
+        
+        Args:
+            db_url: Optional SQLAlchemy URL overriding the configured database
+        """
         # Create database connection
-        if cfg.DB_TYPE == "sqlite":
+        if db_url:
+            self.engine = create_engine(db_url)
+        elif cfg.DB_TYPE == "sqlite":
             self.engine = create_engine(f"sqlite:///{cfg.DB_PATH}")
+            # Let readers (web, analysis) work while another process writes
+            event.listen(self.engine, 'connect', _enable_sqlite_wal)
         else:
             # PostgreSQL connection
             self.engine = create_engine(
                 f"postgresql://{cfg.DB_USER}:{cfg.DB_PASSWORD}@{cfg.DB_HOST}:{cfg.DB_PORT}/{cfg.DB_NAME}"
             )
         
-        # Create tables if they don't exist
-        Base.metadata.create_all(self.engine)
+        # Create tables if they don't exist, and add columns added since
+        upgrade_schema(self.engine)
         
         # Create session factory
         self.Session = sessionmaker(bind=self.engine)
+        
+        # Similarity search index, opened on first use
+        self._vector_index = None
+        self._embedder = None
+    
+    @property
+    def vector_index(self) -> VectorIndex:
+        """The on-disk vector index of message history."""
+        if self._vector_index is None:
+            self._vector_index = VectorIndex(cfg.VECTOR_INDEX_DIR, cfg.VECTOR_DIM)
+        return self._vector_index
+    
+    @property
+    def embedder(self) -> HashedEmbedder:
+        """The embedder producing the vectors of the index."""
+        if self._embedder is None:
+            self._embedder = HashedEmbedder(cfg.VECTOR_DIM)
+        return self._embedder
     
     async def store_message(self, room_id: str, room_topic: str, 
                           sender_id: str, sender_name: str,
                           message_type: str, content: str, 
-                          raw_message: Any) -> bool:
+                          raw_message: Any, is_duplicate: bool = False,
+                          extra_metadata: Optional[Dict[str, Any]] = None) -> bool:
         """
         Store a message in the database.
         
@@ -48,10 +135,48 @@ class MessageService:
             message_type: The type of the message
             content: The text content of the message
             raw_message: The raw message object for additional processing
+            is_duplicate: Whether the message near-duplicates a recent one
+            extra_metadata: Optional fields merged into the stored metadata
             
         Returns:
             bool: True if successful, False otherwise
         """
+        return self.save_message(
+            room_id, room_topic, sender_id, sender_name, message_type, content,
+            raw_message=raw_message, is_duplicate=is_duplicate, extra_metadata=extra_metadata
+        )
+    
+    def save_message(self, room_id: str, room_topic: str,
+                     sender_id: str, sender_name: str,
+                     message_type: str, content: str,
+                     raw_message: Any = None, is_duplicate: bool = False,
+                     extra_metadata: Optional[Dict[str, Any]] = None,
+                     created_at: Optional[datetime.datetime] = None,
+                     dedup_key: Optional[str] = None,
+                     media: Optional[Dict[str, Any]] = None) -> bool:
+        """
+        Store a message in the database (blocking; safe to call from worker threads).
+        
+        Args:
+            room_id: The ID of the room/group
+            room_topic: The name/topic of the room/group
+            sender_id: The ID of the message sender
+            sender_name: The name of the message sender
+            message_type: The type of the message
+            content: The text content of the message
+            raw_message: Optional raw message object for additional metadata
+            is_duplicate: Whether the message near-duplicates a recent one
+            extra_metadata: Optional fields merged into the stored metadata
+            created_at: When the message was received, defaults to now
+            dedup_key: Optional message_dedup_key(); a message whose key is
+                already stored (received by another account) is skipped
+            media: Optional archived attachment (see MediaStore.save), linked
+                through a MediaFile row shared by all copies of the file
+            
+        Returns:
+            bool: True if successful (or already stored), False otherwise
+        """
+        session = None
         try:
             # Create a database session
             session = self.Session()
@@ -65,7 +190,12 @@ class MessageService:
                     created_at=datetime.datetime.now()
                 )
                 session.add(room)
-                session.commit()
+                try:
+                    session.commit()
+                    bump_version('rooms')
+                except IntegrityError:
+                    # Created concurrently by another worker or account
+                    session.rollback()
             
             # Check if user exists, create if not
             user = session.query(User).filter_by(user_id=sender_id).first()
@@ -76,7 +206,14 @@ class MessageService:
                     created_at=datetime.datetime.now()
                 )
                 session.add(user)
-                session.commit()
+                try:
+                    session.commit()
+                except IntegrityError:
+                    # Created concurrently by another worker or account
+                    session.rollback()
+            
+            media_file = self._get_or_create_media(session, media) if media else None
+            created_at = created_at or datetime.datetime.now()
             
             # Create message object
             message = Message(
@@ -84,26 +221,60 @@ class MessageService:
                 user_id=sender_id,
                 message_type=message_type,
                 content=content,
-                created_at=datetime.datetime.now()
+                is_duplicate=is_duplicate,
+                dedup_key=dedup_key,
+                media_id=media_file.id if media_file else None,
+                created_at=created_at
             )
             
             # Store additional message metadata as JSON
             try:
-                metadata = {
-                    'msg_id': getattr(raw_message, 'message_id', None),
-                    'timestamp': datetime.datetime.now().isoformat()
-                }
-                message.metadata = json.dumps(metadata)
+                metadata = raw_message_metadata(raw_message)
+                metadata['timestamp'] = datetime.datetime.now().isoformat()
+                
+                # Reply structure used to segment conversations before analysis
+                quote = parse_quote(content)
+                if quote:
+                    metadata['quote_name'] = quote[0]
+                if extra_metadata:
+                    metadata.update(extra_metadata)
+                message.message_metadata = json.dumps(metadata)
             except Exception as e:
                 logger.warning(f"Error serializing message metadata: {e}")
             
             # Add and commit the message
             session.add(message)
+            session.flush()
+            # Read before the commit expires the attributes
+            message_id, metadata_json = message.id, message.message_metadata
             session.commit()
+            bump_version('messages', room_id)
+            
+            # Push to live stream subscribers, building the event only if anyone listens
+            if stream_broker.wants(room_id):
+                stream_broker.publish('message', room_id, MessageRecord(
+                    id=message_id,
+                    room_id=room_id,
+                    room_topic=room_topic,
+                    user_id=sender_id,
+                    user_name=sender_name,
+                    message_type=message_type,
+                    content=content,
+                    created_ts=created_at.timestamp(),
+                    metadata_json=metadata_json
+                ).to_dict())
             
             logger.debug(f"Stored message from {sender_name} in {room_topic}")
             return True
             
+        except IntegrityError as e:
+            if session:
+                session.rollback()
+            if dedup_key is None:
+                logger.error(f"Error storing message: {e}", exc_info=True)
+                return False
+            logger.debug(f"Message from {sender_name} in {room_topic} already stored by another account")
+            return True
         except Exception as e:
             logger.error(f"Error storing message: {e}", exc_info=True)
             if session:
@@ -113,66 +284,190 @@ class MessageService:
             if session:
                 session.close()
     
-    def get_recent_messages(self, room_id: Optional[str] = None, 
-                           limit: int = 100) -> List[Dict[str, Any]]:
+    def _get_or_create_media(self, session, media: Dict[str, Any]) -> Optional[MediaFile]:
+        """Return the MediaFile row of an archived attachment, creating it if new."""
+        media_file = session.query(MediaFile).filter_by(sha256=media['sha256']).first()
+        if media_file:
+            return media_file
+        
+        media_file = MediaFile(
+            sha256=media['sha256'],
+            size=media['size'],
+            mime_type=media.get('mime_type'),
+            file_name=media.get('file_name') or None,
+            path=media['path'],
+            created_at=datetime.datetime.now()
+        )
+        session.add(media_file)
+        try:
+            session.commit()
+            return media_file
+        except IntegrityError:
+            # The same file arrived in another room at the same time
+            session.rollback()
+            return session.query(MediaFile).filter_by(sha256=media['sha256']).first()
+    
+    def get_media(self, sha256: str) -> Optional[Dict[str, Any]]:
         """
-        Get recent messages from the database.
+        Get an archived attachment by its content hash.
+        
+        Args:
+            sha256: The SHA-256 of the content
+            
+        Returns:
+            dict: sha256, size, mime_type, file_name and path, or None
+        """
+        session = None
+        try:
+            session = self.Session()
+            media_file = session.query(MediaFile).filter_by(sha256=sha256).first()
+            if not media_file:
+                return None
+            return {
+                'sha256': media_file.sha256,
+                'size': media_file.size,
+                'mime_type': media_file.mime_type,
+                'file_name': media_file.file_name,
+                'path': media_file.path
+            }
+        except Exception as e:
+            logger.error(f"Error getting media {sha256}: {e}", exc_info=True)
+            return None
+        finally:
+            if session:
+                session.close()
+    
+    def upsert_rooms(self, rooms: List[Tuple[str, str, Optional[int]]],
+                     batch_size: int = 500) -> int:
+        """
+        Create or update many rooms in one transaction.
+        
+        Args:
+            rooms: (room_id, topic, member_count) tuples; a member count of
+                None leaves the stored count unchanged
+            batch_size: Number of room IDs looked up per query
+        
+        Returns:
+            int: Number of rooms written, or 0 on error
+        """
+        session = None
+        try:
+            session = self.Session()
+            now = datetime.datetime.now()
+            
+            room_ids = [room_id for room_id, _, _ in rooms]
+            existing = {}
+            for start in range(0, len(room_ids), batch_size):
+                existing.update({
+                    room.room_id: room for room in session.query(Room).filter(
+                        Room.room_id.in_(room_ids[start:start + batch_size])
+                    )
+                })
+            
+            changed = False
+            for room_id, topic, member_count in rooms:
+                room = existing.get(room_id)
+                if room:
+                    changed = changed or room.topic != topic
+                    room.topic = topic
+                    if member_count is not None:
+                        room.member_count = member_count
+                else:
+                    room = existing[room_id] = Room(
+                        room_id=room_id,
+                        topic=topic,
+                        member_count=member_count,
+                        created_at=now
+                    )
+                    session.add(room)
+                    changed = True
+            
+            session.commit()
+            if changed:
+                bump_version('rooms')
+            return len(rooms)
+        
+        except Exception as e:
+            logger.error(f"Error storing rooms: {e}", exc_info=True)
+            if session:
+                session.rollback()
+            return 0
+        finally:
+            if session:
+                session.close()
+
+    def get_message_records(self, room_id: Optional[str] = None, 
+                           limit: int = 100,
+                           since: Optional[datetime.datetime] = None,
+                           until: Optional[datetime.datetime] = None,
+                           include_duplicates: bool = False,
+                           message_ids: Optional[List[int]] = None,
+                           oldest_first: bool = False) -> List[MessageRecord]:
+        """
+        Get recent messages from the database as typed records.
+        
+        Room topics and sender names are resolved with outer joins in the same
+        query, and rows are read as plain column tuples rather than ORM objects.
         
         Args:
             room_id: Optional room ID to filter by
             limit: Maximum number of messages to retrieve
+            since: Optional time; only messages created after it are returned
+            until: Optional time; only messages created before it are returned
+            include_duplicates: Whether to include messages tagged as near-duplicates
+            message_ids: Optional message IDs to restrict to
+            oldest_first: Return the oldest messages after since instead of
+                the most recent ones, in ascending order
             
         Returns:
-            List of message dictionaries
+            List of MessageRecord objects, most recent first unless oldest_first
         """
         try:
             # Create a database session
             session = self.Session()
             
-            # Query messages
-            query = session.query(Message)
+            # Query message columns with room topic and sender name joined in
+            query = session.query(
+                Message.id, Message.room_id, Room.topic, Message.user_id, User.name,
+                Message.message_type, Message.content, Message.created_at,
+                Message.message_metadata
+            ).outerjoin(Room, Room.room_id == Message.room_id
+            ).outerjoin(User, User.user_id == Message.user_id)
             
             # Filter by room if specified
             if room_id:
-                query = query.filter_by(room_id=room_id)
+                query = query.filter(Message.room_id == room_id)
+            if message_ids is not None:
+                query = query.filter(Message.id.in_(message_ids))
             
-            # Get most recent messages first
-            query = query.order_by(desc(Message.created_at)).limit(limit)
+            # Only include messages newer than the given time
+            if since:
+                query = query.filter(Message.created_at > since)
+            if until:
+                query = query.filter(Message.created_at < until)
             
-            # Convert to list of dictionaries
-            messages = []
-            for msg in query.all():
-                # Get related room and user information
-                room = session.query(Room).filter_by(room_id=msg.room_id).first()
-                user = session.query(User).filter_by(user_id=msg.user_id).first()
-                
-                room_topic = room.topic if room else "Unknown"
-                user_name = user.name if user else "Unknown"
-                
-                # Parse metadata if available
-                metadata = {}
-                if msg.metadata:
-                    try:
-                        metadata = json.loads(msg.metadata)
-                    except:
-                        pass
-                
-                # Create message dict
-                message_dict = {
-                    'id': msg.id,
-                    'room_id': msg.room_id,
-                    'room_topic': room_topic,
-                    'user_id': msg.user_id,
-                    'user_name': user_name,
-                    'message_type': msg.message_type,
-                    'content': msg.content,
-                    'metadata': metadata,
-                    'created_at': msg.created_at.isoformat()
-                }
-                
-                messages.append(message_dict)
+            # Floods and repeated messages would skew summaries and topics
+            if not include_duplicates:
+                query = query.filter(Message.is_duplicate.is_(False))
+            
+            # Get most recent messages first, or read forward from since
+            order = Message.created_at if oldest_first else desc(Message.created_at)
+            query = query.order_by(order).limit(limit)
             
-            return messages
+            return [
+                MessageRecord(
+                    id=row[0],
+                    room_id=row[1],
+                    room_topic=row[2] or "Unknown",
+                    user_id=row[3],
+                    user_name=row[4] or "Unknown",
+                    message_type=row[5],
+                    content=row[6],
+                    created_ts=row[7].timestamp(),
+                    metadata_json=row[8]
+                )
+                for row in query.all()
+            ]
             
         except Exception as e:
             logger.error(f"Error retrieving messages: {e}", exc_info=True)
@@ -181,20 +476,134 @@ class MessageService:
             if session:
                 session.close()
     
+    def get_recent_messages(self, room_id: Optional[str] = None, 
+                           limit: int = 100,
+                           since: Optional[datetime.datetime] = None,
+                           until: Optional[datetime.datetime] = None) -> List[Dict[str, Any]]:
+        """
+        Get recent messages from the database.
+        
+        Args:
+            room_id: Optional room ID to filter by
+            limit: Maximum number of messages to retrieve
+            since: Optional time; only messages created after it are returned
+            until: Optional time; only messages created before it are returned
+            
+        Returns:
+            List of message dictionaries, including near-duplicates
+        """
+        records = self.get_message_records(room_id=room_id, limit=limit, since=since, until=until,
+                                           include_duplicates=True)
+        return [record.to_dict() for record in records]
+    
+    def iter_room_messages(self, room_id: str,
+                           since: Optional[datetime.datetime] = None,
+                           until: Optional[datetime.datetime] = None,
+                           batch_size: int = 1000) -> Iterator[MessageRecord]:
+        """
+        Iterate over a room's full history, oldest first, in constant memory.
+        
+        Rows are fetched batch_size at a time through a server-side cursor
+        where the database supports one (PostgreSQL); SQLite cursors step
+        through the result lazily anyway. Messages are in storage order, which
+        is time order for live ingestion. The session stays open until the
+        iteration finishes or the iterator is closed.
+        
+        Args:
+            room_id: The ID of the room/group
+            since: Optional time; only messages created after it are returned
+            until: Optional time; only messages created before it are returned
+            batch_size: Rows fetched from the database at a time
+        
+        Yields:
+            MessageRecord objects, including near-duplicates
+        
+        Raises:
+            Database errors, so a failed export is not mistaken for a complete one
+        """
+        session = self.Session()
+        try:
+            # The topic is the same for every row, so only senders are joined
+            room = session.query(Room.topic).filter(Room.room_id == room_id).first()
+            room_topic = (room[0] if room else None) or "Unknown"
+            
+            query = session.query(
+                Message.id, Message.user_id, User.name, Message.message_type,
+                Message.content, Message.created_at, Message.message_metadata
+            ).outerjoin(User, User.user_id == Message.user_id
+            ).filter(Message.room_id == room_id)
+            
+            if since:
+                query = query.filter(Message.created_at > since)
+            if until:
+                query = query.filter(Message.created_at < until)
+            
+            # The room_id index already yields rows in ID order, so nothing is sorted
+            query = query.order_by(Message.id).yield_per(batch_size)
+            
+            for row in query:
+                yield MessageRecord(
+                    id=row[0],
+                    room_id=room_id,
+                    room_topic=room_topic,
+                    user_id=row[1],
+                    user_name=row[2] or "Unknown",
+                    message_type=row[3],
+                    content=row[4],
+                    created_ts=row[5].timestamp(),
+                    metadata_json=row[6]
+                )
+        except Exception as e:
+            logger.error(f"Error reading messages of room {room_id}: {e}", exc_info=True)
+            raise
+        finally:
+            session.close()
+    
+    def get_room_ids(self) -> List[str]:
+        """Return the IDs of all stored rooms."""
+        session = self.Session()
+        try:
+            return [row[0] for row in session.query(Room.room_id).all()]
+        except Exception as e:
+            logger.error(f"Error retrieving rooms: {e}", exc_info=True)
+            return []
+        finally:
+            session.close()
+    
+    def room_exists(self, room_id: str) -> bool:
+        """Return whether a room has been stored."""
+        session = self.Session()
+        try:
+            return session.query(Room.id).filter(Room.room_id == room_id).first() is not None
+        finally:
+            session.close()
+    
     def store_message_summary(self, room_id: str, summary: str, 
                             start_time: datetime.datetime, 
-                            end_time: datetime.datetime) -> bool:
+                            end_time: datetime.datetime,
+                            level: str = 'window',
+                            previous_id: Optional[int] = None,
+                            message_count: int = 0,
+                            replace: bool = False) -> Optional[int]:
         """
         Store a summary of messages from a specific time range.
         
+        With replace=True, an existing summary of the same room, level and
+        time range is replaced in the same transaction, so repeated runs
+        (e.g. backfills) are idempotent.
+        
         Args:
             room_id: The ID of the room/group
             summary: The generated summary text
             start_time: The start time of the summary period
             end_time: The end time of the summary period
+            level: Summary level ("window", "hourly", "daily" or "weekly")
+            previous_id: ID of the previous summary used as context, if any
+            message_count: Number of messages covered by the summary
+            replace: Replace an existing summary of the same range and level
             
         Returns:
-            bool: True if successful, False otherwise
+            int: The ID of the stored summary, or None if storing failed
         """
         try:
             # Create a database session
@@ -206,18 +615,256 @@ class MessageService:
                 summary=summary,
                 start_time=start_time,
                 end_time=end_time,
+                level=level,
+                previous_id=previous_id,
+                message_count=message_count,
                 created_at=datetime.datetime.now()
             )
             
-            # Add and commit the summary
+            # Add the summary
             session.add(summary_obj)
+            
+            if replace:
+                existing = session.query(MessageSummary).filter(
+                    MessageSummary.room_id == room_id,
+                    MessageSummary.level == level,
+                    MessageSummary.start_time == start_time,
+                    MessageSummary.end_time == end_time
+                ).all()
+                if existing:
+                    # Take over the replaced summaries' place in the hierarchy
+                    session.flush()
+                    old_ids = [old.id for old in existing if old.id != summary_obj.id]
+                    summary_obj.parent_id = next(
+                        (old.parent_id for old in existing if old.parent_id), None
+                    )
+                    session.query(MessageSummary).filter(
+                        MessageSummary.parent_id.in_(old_ids)
+                    ).update({'parent_id': summary_obj.id}, synchronize_session=False)
+                    for old in existing:
+                        if old.id != summary_obj.id:
+                            session.delete(old)
+            
+            # Commit the summary
             session.commit()
+            bump_version('summaries', room_id)
             
-            logger.info(f"Stored summary for room {room_id} from {start_time} to {end_time}")
-            return True
+            if stream_broker.wants(room_id):
+                stream_broker.publish('summary', room_id, {
+                    'id': summary_obj.id,
+                    'room_id': room_id,
+                    'summary': summary,
+                    'level': level,
+                    'parent_id': summary_obj.parent_id,
+                    'message_count': message_count,
+                    'start_time': start_time.isoformat(),
+                    'end_time': end_time.isoformat(),
+                    'created_at': summary_obj.created_at.isoformat()
+                })
+            
+            logger.info(f"Stored {level} summary for room {room_id} from {start_time} to {end_time}")
+            return summary_obj.id
             
         except Exception as e:
             logger.error(f"Error storing message summary: {e}", exc_info=True)
+            if session:
+                session.rollback()
+            return None
+        finally:
+            if session:
+                session.close()
+    
+    def get_room_days(self, room_ids: Optional[List[str]] = None,
+                     start_date: Optional[datetime.date] = None,
+                     end_date: Optional[datetime.date] = None) -> List[Dict[str, Any]]:
+        """
+        Get the days on which each room has messages.
+        
+        Args:
+            room_ids: Optional room IDs to restrict to
+            start_date: Optional first day to include
+            end_date: Optional last day to include
+            
+        Returns:
+            List of dictionaries with room_id, day (datetime.date) and
+            message_count, ordered by room and day
+        """
+        try:
+            session = self.Session()
+            
+            day = func.date(Message.created_at)
+            query = session.query(Message.room_id, day, func.count(Message.id))
+            
+            if room_ids:
+                query = query.filter(Message.room_id.in_(room_ids))
+            if start_date:
+                query = query.filter(Message.created_at >= datetime.datetime.combine(start_date, datetime.time.min))
+            if end_date:
+                query = query.filter(Message.created_at < datetime.datetime.combine(
+                    end_date + datetime.timedelta(days=1), datetime.time.min))
+            
+            query = query.group_by(Message.room_id, day).order_by(Message.room_id, day)
+            
+            room_days = []
+            for room_id, message_day, count in query.all():
+                # SQLite returns dates as strings
+                if isinstance(message_day, str):
+                    message_day = datetime.date.fromisoformat(message_day)
+                room_days.append({
+                    'room_id': room_id,
+                    'day': message_day,
+                    'message_count': count
+                })
+            
+            return room_days
+            
+        except Exception as e:
+            logger.error(f"Error retrieving room days: {e}", exc_info=True)
+            return []
+        finally:
+            if session:
+                session.close()
+    
+    def get_latest_summary(self, room_id: str, 
+                          level: str = 'window') -> Optional[Dict[str, Any]]:
+        """
+        Get the most recent summary of a level for a room.
+        
+        Args:
+            room_id: The ID of the room/group
+            level: Summary level to look up
+            
+        Returns:
+            Summary dictionary or None if the room has no summary of that level
+        """
+        try:
+            session = self.Session()
+            
+            summary = session.query(MessageSummary).filter_by(
+                room_id=room_id, level=level
+            ).order_by(desc(MessageSummary.end_time)).first()
+            
+            if not summary:
+                return None
+            
+            return {
+                'id': summary.id,
+                'room_id': summary.room_id,
+                'summary': summary.summary,
+                'level': summary.level,
+                'start_time': summary.start_time,
+                'end_time': summary.end_time,
+                'message_count': summary.message_count
+            }
+            
+        except Exception as e:
+            logger.error(f"Error retrieving latest summary: {e}", exc_info=True)
+            return None
+        finally:
+            if session:
+                session.close()
+    
+    def get_unrolled_summaries(self, room_id: str, level: str,
+                              before: datetime.datetime) -> List[Dict[str, Any]]:
+        """
+        Get summaries of a level that have not been rolled up yet.
+        
+        Args:
+            room_id: The ID of the room/group
+            level: Summary level of the children to roll up
+            before: Only summaries starting before this time are returned
+            
+        Returns:
+            List of summary dictionaries ordered by start time
+        """
+        try:
+            session = self.Session()
+            
+            query = session.query(MessageSummary).filter(
+                MessageSummary.room_id == room_id,
+                MessageSummary.level == level,
+                MessageSummary.parent_id.is_(None),
+                MessageSummary.start_time < before
+            ).order_by(MessageSummary.start_time)
+            
+            return [{
+                'id': summary.id,
+                'summary': summary.summary,
+                'start_time': summary.start_time,
+                'end_time': summary.end_time,
+                'message_count': summary.message_count
+            } for summary in query.all()]
+            
+        except Exception as e:
+            logger.error(f"Error retrieving unrolled summaries: {e}", exc_info=True)
+            return []
+        finally:
+            if session:
+                session.close()
+    
+    def get_summaries_in_range(self, room_id: str, start_time: datetime.datetime,
+                               end_time: datetime.datetime) -> List[Dict[str, Any]]:
+        """
+        Get summaries of any level that lie entirely within a time range.
+        
+        Args:
+            room_id: The ID of the room/group
+            start_time: Start of the range
+            end_time: End of the range
+        
+        Returns:
+            List of summary dictionaries ordered by start time
+        """
+        try:
+            session = self.Session()
+            
+            query = session.query(MessageSummary).filter(
+                MessageSummary.room_id == room_id,
+                MessageSummary.start_time >= start_time,
+                MessageSummary.end_time <= end_time
+            ).order_by(MessageSummary.start_time)
+            
+            return [{
+                'id': summary.id,
+                'summary': summary.summary,
+                'level': summary.level,
+                'start_time': summary.start_time,
+                'end_time': summary.end_time,
+                'message_count': summary.message_count
+            } for summary in query.all()]
+        
+        except Exception as e:
+            logger.error(f"Error retrieving summaries in range: {e}", exc_info=True)
+            return []
+        finally:
+            if session:
+                session.close()
+    
+    def set_summary_parent(self, summary_ids: List[int], parent_id: int) -> bool:
+        """
+        Link child summaries to the summary they were rolled up into.
+        
+        Args:
+            summary_ids: IDs of the child summaries
+            parent_id: ID of the parent summary
+            
+        Returns:
+            bool: True if successful, False otherwise
+        """
+        try:
+            session = self.Session()
+            
+            session.query(MessageSummary).filter(
+                MessageSummary.id.in_(summary_ids)
+            ).update({'parent_id': parent_id}, synchronize_session=False)
+            session.commit()
+            
+            parent = session.query(MessageSummary.room_id).filter_by(id=parent_id).first()
+            bump_version('summaries', parent.room_id if parent else None)
+            return True
+            
+        except Exception as e:
+            logger.error(f"Error linking summaries to parent: {e}", exc_info=True)
             if session:
                 session.rollback()
             return False
@@ -226,13 +873,15 @@ class MessageService:
                 session.close()
     
     def get_message_summaries(self, room_id: Optional[str] = None, 
-                            limit: int = 10) -> List[Dict[str, Any]]:
+                            limit: int = 10,
+                            level: Optional[str] = None) -> List[Dict[str, Any]]:
         """
         Get message summaries from the database.
         
         Args:
             room_id: Optional room ID to filter by
             limit: Maximum number of summaries to retrieve
+            level: Optional summary level to filter by
             
         Returns:
             List of summary dictionaries
@@ -248,6 +897,10 @@ class MessageService:
             if room_id:
                 query = query.filter_by(room_id=room_id)
             
+            # Filter by summary level if specified
+            if level:
+                query = query.filter_by(level=level)
+            
             # Get most recent summaries first
             query = query.order_by(desc(MessageSummary.created_at)).limit(limit)
             
@@ -264,6 +917,9 @@ class MessageService:
                     'room_id': summary.room_id,
                     'room_topic': room_topic,
                     'summary': summary.summary,
+                    'level': summary.level,
+                    'parent_id': summary.parent_id,
+                    'message_count': summary.message_count,
                     'start_time': summary.start_time.isoformat(),
                     'end_time': summary.end_time.isoformat(),
                     'created_at': summary.created_at.isoformat()
@@ -278,4 +934,217 @@ class MessageService:
             return []
         finally:
             if session:
-                session.close() 
\ No newline at end of file
+                session.close() 
+    
+    def upsert_keywords(self, room_id: str, keywords: List[Tuple[str, int]]) -> bool:
+        """
+        Replace the keyword counts of a room, creating keywords as needed.
+        
+        Counts are set, not added, since each refresh recounts the whole
+        lookback period. The room's other keywords are no longer among its
+        top terms and drop to 0; they keep last_seen as a record.
+        
+        Args:
+            room_id: The ID of the room/group
+            keywords: (keyword, occurrence count) pairs, e.g. over the
+                TOPIC_LOOKBACK_HOURS before now
+            
+        Returns:
+            bool: True if successful, False otherwise
+        """
+        try:
+            session = self.Session()
+            now = datetime.datetime.now()
+            
+            terms = [term[:255] for term, _ in keywords]
+            existing = {
+                kw.keyword: kw for kw in session.query(Keyword).filter(
+                    Keyword.room_id == room_id, Keyword.keyword.in_(terms)
+                )
+            }
+            
+            # Terms that fell out of the top terms
+            session.query(Keyword).filter(
+                Keyword.room_id == room_id,
+                Keyword.keyword.notin_(terms),
+                Keyword.frequency > 0
+            ).update({'frequency': 0}, synchronize_session=False)
+            
+            for term, count in keywords:
+                term = term[:255]
+                keyword = existing.get(term)
+                if keyword:
+                    keyword.frequency = count
+                    keyword.last_seen = now
+                else:
+                    keyword = existing[term] = Keyword(
+                        room_id=room_id,
+                        keyword=term,
+                        frequency=count,
+                        last_seen=now,
+                        created_at=now
+                    )
+                    session.add(keyword)
+            
+            session.commit()
+            return True
+            
+        except Exception as e:
+            logger.error(f"Error storing keywords: {e}", exc_info=True)
+            if session:
+                session.rollback()
+            return False
+        finally:
+            if session:
+                session.close()
+    
+    def get_keywords(self, room_id: Optional[str] = None,
+                     limit: int = 20,
+                     since: Optional[datetime.datetime] = None) -> List[Dict[str, Any]]:
+        """
+        Get the most frequent current keywords, optionally for one room.
+        
+        Args:
+            room_id: Optional room ID to filter by
+            limit: Maximum number of keywords to retrieve
+            since: Optional time; only keywords seen after it are returned
+            
+        Returns:
+            List of keyword dictionaries
+        """
+        try:
+            session = self.Session()
+            
+            # Keywords no longer among the top terms have a count of 0
+            query = session.query(Keyword).filter(Keyword.frequency > 0)
+            if room_id:
+                query = query.filter(Keyword.room_id == room_id)
+            if since:
+                query = query.filter(Keyword.last_seen > since)
+            query = query.order_by(desc(Keyword.frequency)).limit(limit)
+            
+            return [{
+                'room_id': kw.room_id,
+                'keyword': kw.keyword,
+                'frequency': kw.frequency,
+                'last_seen': kw.last_seen.isoformat()
+            } for kw in query.all()]
+            
+        except Exception as e:
+            logger.error(f"Error retrieving keywords: {e}", exc_info=True)
+            return []
+        finally:
+            if session:
+                session.close()
+    
+    def index_message_vectors(self, batch_size: int = 5000,
+                              max_messages: Optional[int] = None) -> int:
+        """
+        Embed messages stored since the last run and append them to the vector index.
+        
+        Messages are read in ID order, so the last indexed ID is all the state
+        needed to resume. Near-duplicates are not indexed.
+        
+        Args:
+            batch_size: Number of messages read and embedded at a time
+            max_messages: Optional cap on messages indexed in this call
+            
+        Returns:
+            Number of messages indexed
+        """
+        index = self.vector_index
+        state = index.load_state()
+        last_id = state.get('last_message_id', 0)
+        indexed = 0
+        
+        session = None
+        try:
+            session = self.Session()
+            while max_messages is None or indexed < max_messages:
+                limit = batch_size if max_messages is None else min(batch_size, max_messages - indexed)
+                rows = session.query(
+                    Message.id, Message.room_id, Message.content, Message.created_at
+                ).filter(Message.id > last_id
+                ).filter(Message.is_duplicate.is_(False)
+                ).order_by(Message.id).limit(limit).all()
+                if not rows:
+                    break
+                
+                # One append per room-month shard
+                shards = {}
+                for row in rows:
+                    shards.setdefault((row[1], row[3].strftime('%Y-%m')), []).append(row)
+                for (room_id, month), shard_rows in shards.items():
+                    index.add(
+                        room_id, month,
+                        np.fromiter((row[0] for row in shard_rows), dtype=np.int64, count=len(shard_rows)),
+                        self.embedder.embed_many(row[2] for row in shard_rows)
+                    )
+                
+                last_id = rows[-1][0]
+                indexed += len(rows)
+                index.save_state({'last_message_id': last_id})
+            
+            if indexed:
+                logger.info(f"Indexed {indexed} messages for similarity search")
+            return indexed
+            
+        except Exception as e:
+            logger.error(f"Error indexing message vectors: {e}", exc_info=True)
+            return indexed
+        finally:
+            if session:
+                session.close()
+    
+    def search_similar(self, text: Optional[str] = None,
+                       message_id: Optional[int] = None,
+                       room_id: Optional[str] = None,
+                       months: Optional[List[str]] = None,
+                       limit: int = 10) -> List[Dict[str, Any]]:
+        """
+        Find earlier messages similar to a text or to a stored message.
+        
+        Args:
+            text: Query text
+            message_id: ID of a stored message to use as the query instead
+            room_id: Optional room ID to search in
+            months: Optional months (YYYY-MM) to search in
+            limit: Maximum number of results
+            
+        Returns:
+            List of message dictionaries with a 'score' (cosine similarity),
+            best first
+        """
+        exclude = []
+        if message_id is not None:
+            found = self.get_message_records(message_ids=[message_id], limit=1, include_duplicates=True)
+            if not found:
+                return []
+            text = found[0].content
+            exclude.append(message_id)
+        
+        query = self.embedder.embed(text or '')
+        if not query.any():
+            return []
+        
+        hits = self.vector_index.search(query, top_k=limit, room_id=room_id,
+                                        months=months, exclude_ids=exclude)
+        # Vectors sharing no tokens with the query score zero or below
+        hits = [(message_id, score) for message_id, score in hits if score > 0]
+        if not hits:
+            return []
+        
+        records = {
+            record.id: record for record in self.get_message_records(
+                message_ids=[message_id for message_id, _ in hits],
+                limit=len(hits), include_duplicates=True
+            )
+        }
+        results = []
+        for message_id, score in hits:
+            record = records.get(message_id)
+            if record:
+                result = record.to_dict()
+                result['score'] = round(score, 4)
+                results.append(result)
+        return results
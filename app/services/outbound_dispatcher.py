@@ -0,0 +1,260 @@
+"""
+Outbound message dispatcher.
+
+Messages sent to rooms are queued per room and delivered by one task per
+busy room, paced by a per-room and a global token bucket so bursts do not
+trip WeChat's anti-spam limits. Short messages waiting for the same room are
+coalesced into one, long ones are split with ``chunk_text``, and failed sends
+are retried with exponential backoff.
+
+Room handles are cached by room_id, so a send needs no puppet lookup for
+rooms the bot has already seen.
+"""
+import asyncio
+import logging
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional
+
+from app.utils.helpers import chunk_text, percentile
+from app.utils.rate_limit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+# Async function looking up a room handle by room_id (None if not found)
+RoomResolver = Callable[[str], Awaitable[Optional[Any]]]
+
+
+class OutboundMessage:
+    """One queued piece of text and the delivery it belongs to."""
+
+    __slots__ = ('text', 'delivery', 'last', 'enqueued_at')
+
+    def __init__(self, text: str, delivery: asyncio.Future, last: bool, enqueued_at: float):
+        self.text = text
+        self.delivery = delivery
+        # Only the last piece of a split message completes its delivery
+        self.last = last
+        self.enqueued_at = enqueued_at
+
+
+class OutboundDispatcher:
+    """Rate-limited, coalescing sender of room messages."""
+
+    def __init__(self, resolve_room: RoomResolver,
+                 rate: float = 1.0, burst: int = 3,
+                 room_rate: float = 0.5, room_burst: int = 2,
+                 max_length: int = 2000, coalesce_length: int = 200,
+                 max_retries: int = 3, retry_delay: float = 2.0,
+                 maxsize: int = 500, latency_samples: int = 1000):
+        """
+        Initialize the dispatcher.
+
+        Args:
+            resolve_room: Async function finding a room handle on a cache miss
+            rate: Messages per second across all rooms
+            burst: Messages allowed back to back across all rooms
+            room_rate: Messages per second to any one room
+            room_burst: Messages allowed back to back to one room
+            max_length: Maximum length of one sent message
+            coalesce_length: Queued messages up to this length are merged
+            max_retries: Retries of a failed send before giving up
+            retry_delay: Delay before the first retry, doubled on each retry
+            maxsize: Maximum number of queued pieces across all rooms
+            latency_samples: Number of recent send latencies kept for percentiles
+        """
+        self.resolve_room = resolve_room
+        self.room_rate = room_rate
+        self.room_burst = room_burst
+        self.max_length = max_length
+        self.coalesce_length = coalesce_length
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.maxsize = maxsize
+
+        self._bucket = TokenBucket(rate, burst)
+        self._room_buckets: Dict[str, TokenBucket] = {}
+        self._pending: Dict[str, Deque[OutboundMessage]] = {}
+        self._room_tasks: Dict[str, asyncio.Task] = {}
+        self._rooms: Dict[str, Any] = {}
+        self._depth = 0
+        # Seconds from queueing a message to it being sent
+        self._latencies = deque(maxlen=latency_samples)
+
+        self.stats = {
+            'queued': 0,
+            'sent': 0,
+            'coalesced': 0,
+            'chunks': 0,
+            'retries': 0,
+            'failed': 0,
+            'rejected': 0,
+            'handle_hits': 0,
+            'handle_misses': 0,
+            'max_depth': 0
+        }
+
+    def remember_room(self, room: Any):
+        """Cache a room handle seen elsewhere (e.g. at login or on a message)."""
+        self._rooms[room.room_id] = room
+
+    def forget_room(self, room_id: str):
+        """Drop a cached room handle so the next send looks it up again."""
+        self._rooms.pop(room_id, None)
+
+    def send(self, room_id: str, text: str) -> asyncio.Future:
+        """
+        Queue a message for a room.
+
+        Args:
+            room_id: The ID of the room
+            text: Message text; split into several messages if too long
+
+        Returns:
+            Future resolving to True once every piece was sent, or False if
+            the message was rejected (queue full) or a piece could not be sent
+        """
+        loop = asyncio.get_running_loop()
+        delivery = loop.create_future()
+
+        pieces = chunk_text(text, self.max_length)
+        if self._depth + len(pieces) > self.maxsize:
+            self.stats['rejected'] += 1
+            logger.warning(f"Outbound queue full, dropped message to room {room_id}")
+            delivery.set_result(False)
+            return delivery
+
+        queue = self._pending.setdefault(room_id, deque())
+        now = loop.time()
+        for i, piece in enumerate(pieces):
+            queue.append(OutboundMessage(piece, delivery, i == len(pieces) - 1, now))
+        self._depth += len(pieces)
+        self.stats['queued'] += 1
+        if len(pieces) > 1:
+            self.stats['chunks'] += len(pieces)
+        if self._depth > self.stats['max_depth']:
+            self.stats['max_depth'] = self._depth
+
+        if room_id not in self._room_tasks:
+            self._room_tasks[room_id] = asyncio.ensure_future(self._drain_room(room_id))
+        return delivery
+
+    async def stop(self, timeout: float = 10.0):
+        """
+        Deliver what is queued, then stop.
+
+        Args:
+            timeout: Maximum seconds to wait for queued messages
+        """
+        tasks = list(self._room_tasks.values())
+        if not tasks:
+            return
+
+        done, pending = await asyncio.wait(tasks, timeout=timeout)
+        for task in pending:
+            task.cancel()
+        if pending:
+            logger.warning(f"Stopped with {self._depth} outbound messages unsent")
+        await asyncio.gather(*pending, return_exceptions=True)
+
+    def _next_batch(self, queue: Deque[OutboundMessage]) -> List[OutboundMessage]:
+        """Take the next message, merged with short messages queued behind it."""
+        batch = [queue.popleft()]
+        length = len(batch[0].text)
+        if length > self.coalesce_length:
+            return batch
+
+        while queue:
+            following = queue[0]
+            if (len(following.text) > self.coalesce_length
+                    or length + 1 + len(following.text) > self.max_length):
+                break
+            batch.append(queue.popleft())
+            length += 1 + len(following.text)
+        return batch
+
+    async def _drain_room(self, room_id: str):
+        """Send a room's queued messages in order, then exit."""
+        loop = asyncio.get_running_loop()
+        bucket = self._room_buckets.get(room_id)
+        if bucket is None:
+            bucket = self._room_buckets[room_id] = TokenBucket(self.room_rate, self.room_burst)
+        queue = self._pending[room_id]
+
+        try:
+            while queue:
+                batch = self._next_batch(queue)
+                self._depth -= len(batch)
+                if len(batch) > 1:
+                    self.stats['coalesced'] += len(batch) - 1
+
+                await bucket.acquire()
+                await self._bucket.acquire()
+                sent = await self._say(room_id, "\n".join(m.text for m in batch))
+
+                now = loop.time()
+                for message in batch:
+                    self._latencies.append(now - message.enqueued_at)
+                    if message.delivery.done():
+                        continue
+                    if not sent:
+                        message.delivery.set_result(False)
+                    elif message.last:
+                        message.delivery.set_result(True)
+        finally:
+            # Anything left (only when cancelled) is reported as not sent
+            for message in queue:
+                if not message.delivery.done():
+                    message.delivery.set_result(False)
+            self._depth -= len(queue)
+            queue.clear()
+            del self._room_tasks[room_id]
+
+    async def _say(self, room_id: str, text: str) -> bool:
+        """Send one message, retrying with exponential backoff."""
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                self.stats['retries'] += 1
+                await asyncio.sleep(self.retry_delay * 2 ** (attempt - 1))
+            try:
+                room = await self._room(room_id)
+                if room is None:
+                    logger.warning(f"Room {room_id} not found")
+                    break
+                await room.say(text)
+                self.stats['sent'] += 1
+                logger.info(f"Sent message to room {room_id}")
+                return True
+            except Exception as e:
+                # The handle may be stale; look it up again before retrying
+                self.forget_room(room_id)
+                logger.warning(f"Error sending message to room {room_id} "
+                               f"(attempt {attempt + 1}/{self.max_retries + 1}): {e}")
+
+        self.stats['failed'] += 1
+        return False
+
+    async def _room(self, room_id: str) -> Optional[Any]:
+        """Return the cached handle of a room, looking it up on a miss."""
+        room = self._rooms.get(room_id)
+        if room is not None:
+            self.stats['handle_hits'] += 1
+            return room
+
+        self.stats['handle_misses'] += 1
+        room = await self.resolve_room(room_id)
+        if room is not None:
+            self._rooms[room_id] = room
+        return room
+
+    def metrics(self) -> Dict[str, Any]:
+        """Return queue depth, send latency and delivery metrics."""
+        latencies = list(self._latencies)
+        return {
+            'depth': self._depth,
+            'rooms_pending': len(self._room_tasks),
+            'cached_rooms': len(self._rooms),
+            'latency_ms_p50': round(percentile(latencies, 50) * 1000, 2),
+            'latency_ms_p95': round(percentile(latencies, 95) * 1000, 2),
+            'latency_ms_max': round(max(latencies) * 1000, 2) if latencies else 0.0,
+            **self.stats
+        }
@@ -0,0 +1,163 @@
+"""
+Room metadata cache for the Wechaty message handlers.
+
+Room topics are cached by room_id so the per-message hot path does not make
+a puppet round trip for rooms that are already known. The cache is warmed at
+login and kept current from room events: topic changes update the entry in
+place, and membership changes invalidate it so it is re-read on next use.
+Warm-up fetches rooms concurrently with a bounded fan-out, so accounts in
+hundreds of groups become ready quickly.
+
+The cache also resolves the monitored group names to a frozenset of
+room_ids, updated whenever a topic is cached, so message handlers can drop
+unmonitored traffic with one set lookup before any other work.
+
+Rooms are duck-typed (a ``room_id`` attribute and an async ``topic()``), so
+the cache does not depend on the puppet implementation.
+"""
+import asyncio
+import logging
+import time
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class RoomInfo:
+    """Cached metadata of one room."""
+
+    __slots__ = ('room_id', 'topic', 'member_count', 'updated_at')
+
+    def __init__(self, room_id: str, topic: str, member_count: Optional[int] = None):
+        self.room_id = room_id
+        self.topic = topic
+        self.member_count = member_count
+        self.updated_at = time.time()
+
+
+class RoomCache:
+    """Room metadata keyed by room_id."""
+
+    def __init__(self, monitored_topics: Iterable[str] = ()):
+        """
+        Initialize an empty cache.
+
+        Args:
+            monitored_topics: Topics of the rooms to monitor (empty means all rooms)
+        """
+        self._rooms: Dict[str, RoomInfo] = {}
+        self.monitored_topics = frozenset(monitored_topics)
+        self.monitored_ids: FrozenSet[str] = frozenset()
+        self.stats = {
+            'hits': 0,
+            'misses': 0,
+            'invalidations': 0,
+            # Outcome of the last warm-up
+            'warm_rooms': 0,
+            'warm_failed': 0,
+            'warm_seconds': 0.0
+        }
+
+    def __len__(self) -> int:
+        return len(self._rooms)
+
+    def __contains__(self, room_id: str) -> bool:
+        return room_id in self._rooms
+
+    def get(self, room_id: str) -> Optional[RoomInfo]:
+        """Return the cached metadata of a room, if any."""
+        return self._rooms.get(room_id)
+
+    def put(self, room_id: str, topic: str, member_count: Optional[int] = None) -> RoomInfo:
+        """Store or replace the metadata of a room."""
+        if member_count is None and room_id in self._rooms:
+            # Keep the known member count when only the topic changed
+            member_count = self._rooms[room_id].member_count
+        info = RoomInfo(room_id, topic, member_count)
+        self._rooms[room_id] = info
+        self._set_monitored(room_id, topic in self.monitored_topics)
+        return info
+
+    def invalidate(self, room_id: str):
+        """Drop a room so its metadata is fetched again on next use."""
+        if self._rooms.pop(room_id, None) is not None:
+            self.stats['invalidations'] += 1
+        self._set_monitored(room_id, False)
+
+    def _set_monitored(self, room_id: str, monitored: bool):
+        # Rebuilt only when membership changes, which is rare
+        if monitored and room_id not in self.monitored_ids:
+            self.monitored_ids = self.monitored_ids | {room_id}
+        elif not monitored and room_id in self.monitored_ids:
+            self.monitored_ids = self.monitored_ids - {room_id}
+
+    def is_monitored(self, room_id: str) -> Optional[bool]:
+        """
+        Tell whether messages from a room should be processed.
+
+        Args:
+            room_id: The ID of the room
+
+        Returns:
+            True or False for known rooms, None for rooms whose topic has not
+            been cached yet (always True when every room is monitored)
+        """
+        if not self.monitored_topics or room_id in self.monitored_ids:
+            return True
+        return False if room_id in self._rooms else None
+
+    async def refresh(self, room: Any) -> RoomInfo:
+        """Fetch a room's metadata from the puppet and cache it."""
+        return self.put(room.room_id, await room.topic())
+
+    async def topic(self, room: Any) -> str:
+        """
+        Return a room's topic, fetching it from the puppet only on a miss.
+
+        Args:
+            room: The room
+
+        Returns:
+            str: The room topic
+        """
+        info = self._rooms.get(room.room_id)
+        if info is not None:
+            self.stats['hits'] += 1
+            return info.topic
+
+        self.stats['misses'] += 1
+        return (await self.refresh(room)).topic
+
+    async def warm(self, rooms: Iterable[Any], concurrency: int = 10,
+                   members: bool = True) -> List[RoomInfo]:
+        """
+        Cache the metadata of several rooms, fetching them concurrently.
+
+        Args:
+            rooms: Rooms to fetch
+            concurrency: Maximum number of rooms fetched at once
+            members: Also fetch member counts (via ``member_list()``)
+
+        Returns:
+            list: Metadata of the rooms cached; failed rooms are skipped
+        """
+        started = time.monotonic()
+        semaphore = asyncio.Semaphore(max(1, concurrency))
+
+        async def fetch(room: Any) -> Optional[RoomInfo]:
+            async with semaphore:
+                try:
+                    topic = await room.topic()
+                    member_count = len(await room.member_list()) if members else None
+                except Exception as e:
+                    logger.warning(f"Could not cache room {room.room_id}: {e}")
+                    return None
+            return self.put(room.room_id, topic, member_count)
+
+        results = await asyncio.gather(*(fetch(room) for room in rooms))
+        cached = [info for info in results if info is not None]
+
+        self.stats['warm_rooms'] = len(cached)
+        self.stats['warm_failed'] = len(results) - len(cached)
+        self.stats['warm_seconds'] = round(time.monotonic() - started, 3)
+        return cached
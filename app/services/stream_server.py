@@ -0,0 +1,188 @@
+"""
+Server-Sent Events endpoint streaming newly stored messages and summaries.
+
+The web server's request threads are too few to hold thousands of open
+streams, so the stream is served by a small asyncio HTTP server on the event
+loop of the ingestion path, where the StreamBroker delivers events. Each
+client costs one coroutine and a bounded buffer rather than a thread.
+
+    GET /api/stream?room_id=<id>&room_id=<id>&kinds=message,summary
+
+streams 'message' events (the dictionaries of /api/messages) and 'summary'
+events (those of /api/summaries, without room_topic) for the given rooms, or
+all rooms. A comment line is sent every heartbeat interval so dead clients
+are noticed and proxies keep the connection open. A client that cannot keep
+up is sent an 'evicted' event and disconnected.
+"""
+import asyncio
+import logging
+from typing import Dict, Optional
+from urllib.parse import parse_qs, urlsplit
+
+from app.utils.live_stream import StreamBroker, Subscriber
+from app.utils.sse import format_sse
+
+logger = logging.getLogger(__name__)
+
+STREAM_PATH = '/api/stream'
+KINDS = ('message', 'summary')
+
+RESPONSE_HEADERS = (
+    "HTTP/1.1 200 OK\r\n"
+    "Content-Type: text/event-stream; charset=utf-8\r\n"
+    "Cache-Control: no-cache\r\n"
+    "Connection: close\r\n"
+    "Access-Control-Allow-Origin: *\r\n"
+    "X-Accel-Buffering: no\r\n"
+    "\r\n"
+).encode('ascii')
+
+
+def _error_response(status: str, message: str) -> bytes:
+    """Return a complete plain-text error response."""
+    body = message.encode('utf-8')
+    return (
+        f"HTTP/1.1 {status}\r\n"
+        "Content-Type: text/plain; charset=utf-8\r\n"
+        f"Content-Length: {len(body)}\r\n"
+        "Connection: close\r\n"
+        "Access-Control-Allow-Origin: *\r\n"
+        "\r\n"
+    ).encode('ascii') + body
+
+
+class StreamServer:
+    """Asyncio HTTP server for /api/stream."""
+
+    def __init__(self, broker: StreamBroker, host: str, port: int,
+                 max_clients: int = 5000, buffer_size: int = 256,
+                 heartbeat: float = 15.0, write_timeout: float = 30.0):
+        """
+        Initialize the server.
+
+        Args:
+            broker: Broker the storage path publishes to
+            host: Address to listen on
+            port: Port to listen on
+            max_clients: Concurrent streams; further clients get a 503
+            buffer_size: Events buffered per client before it is evicted
+            heartbeat: Seconds between keep-alive comments on an idle stream
+            write_timeout: Seconds a client may take to accept buffered data
+                before it is disconnected
+        """
+        self.broker = broker
+        self.host = host
+        self.port = port
+        self.max_clients = max_clients
+        self.heartbeat = heartbeat
+        self.write_timeout = write_timeout
+        self.broker.buffer_size = buffer_size
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._clients = 0
+        self.stats = {'connections': 0, 'rejected': 0, 'write_timeouts': 0, 'bytes_sent': 0}
+
+    async def start(self):
+        """Listen for clients and start delivering events to them."""
+        self.broker.attach(asyncio.get_running_loop())
+        self._server = await asyncio.start_server(self._handle, self.host, self.port,
+                                                  backlog=1024)
+        logger.info(f"Streaming stored messages at http://{self.host}:{self.port}{STREAM_PATH}")
+
+    async def stop(self):
+        """Stop listening and disconnect all clients."""
+        self.broker.detach()
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Serve one connection."""
+        try:
+            try:
+                request_line, _ = await asyncio.wait_for(self._read_request(reader), 10)
+            except (asyncio.TimeoutError, asyncio.IncompleteReadError, asyncio.LimitOverrunError,
+                    ConnectionError, ValueError):
+                return
+
+            parts = request_line.split()
+            if len(parts) != 3:
+                writer.write(_error_response("400 Bad Request", "Malformed request"))
+                return
+            method, target, _ = parts
+            url = urlsplit(target)
+            if url.path != STREAM_PATH:
+                writer.write(_error_response("404 Not Found", "Not found"))
+                return
+            if method != 'GET':
+                writer.write(_error_response("405 Method Not Allowed", "Only GET is supported"))
+                return
+            if self._clients >= self.max_clients:
+                self.stats['rejected'] += 1
+                writer.write(_error_response("503 Service Unavailable", "Too many streams"))
+                return
+
+            query = parse_qs(url.query)
+            rooms = [room for value in query.get('room_id', []) for room in value.split(',') if room]
+            kinds = [kind for value in query.get('kinds', []) for kind in value.split(',') if kind]
+            unknown = set(kinds) - set(KINDS)
+            if unknown:
+                writer.write(_error_response("400 Bad Request", f"Unknown kinds: {', '.join(sorted(unknown))}"))
+                return
+
+            await self._stream(writer, self.broker.subscribe(rooms or None, kinds or None))
+        except (ConnectionError, asyncio.TimeoutError):
+            pass
+        except Exception as e:
+            logger.error(f"Error serving stream: {e}", exc_info=True)
+        finally:
+            writer.close()
+
+    async def _read_request(self, reader: asyncio.StreamReader):
+        """Read the request line and headers."""
+        request_line = (await reader.readuntil(b"\r\n")).decode('latin-1').strip()
+        headers: Dict[str, str] = {}
+        while True:
+            line = (await reader.readuntil(b"\r\n")).decode('latin-1').strip()
+            if not line:
+                return request_line, headers
+            name, _, value = line.partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+    async def _stream(self, writer: asyncio.StreamWriter, subscriber: Subscriber):
+        """Send a subscriber's events until it disconnects or is evicted."""
+        self._clients += 1
+        self.stats['connections'] += 1
+        try:
+            # Ask browsers to reconnect after 3 seconds if the stream ends
+            await self._send(writer, RESPONSE_HEADERS + b"retry: 3000\n\n")
+            while True:
+                try:
+                    await asyncio.wait_for(subscriber.wakeup.wait(), self.heartbeat)
+                except asyncio.TimeoutError:
+                    await self._send(writer, b": ping\n\n")
+                    continue
+
+                chunk = subscriber.take()
+                if chunk:
+                    await self._send(writer, chunk)
+                if subscriber.evicted:
+                    writer.write(format_sse({'reason': subscriber.evicted}, 'evicted').encode('utf-8'))
+                    return
+        except asyncio.TimeoutError:
+            # Not even the transport buffer drained in time
+            self.stats['write_timeouts'] += 1
+            writer.transport.abort()
+        finally:
+            self.broker.unsubscribe(subscriber)
+            self._clients -= 1
+
+    async def _send(self, writer: asyncio.StreamWriter, data: bytes):
+        """Write data, waiting at most write_timeout for the client to take it."""
+        writer.write(data)
+        self.stats['bytes_sent'] += len(data)
+        await asyncio.wait_for(writer.drain(), self.write_timeout)
+
+    def metrics(self) -> Dict[str, int]:
+        """Return client counts and broker statistics."""
+        return {'clients': self._clients, **self.stats, **self.broker.metrics()}
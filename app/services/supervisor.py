@@ -0,0 +1,128 @@
+"""
+Supervisor mode: ingestion, web server and analysis as separate processes.
+
+``python app.py --supervise`` starts one child process per role
+(``app.py --role ingest|web|analysis``) and restarts any child that exits,
+with backoff. The children share the database and a LocalChannel file
+(PROCESS_CHANNEL_FILE): the ingestion process publishes stored messages for
+the analysis process, and every process publishes its metrics, which
+/api/metrics in the web process reports under "processes". Each role can
+thus be profiled, restarted or moved to another CPU on its own, and a slow
+API request or analysis pass no longer delays message ingestion.
+"""
+import asyncio
+import logging
+import os
+import signal
+import sys
+import time
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+ROLES = ('ingest', 'web', 'analysis')
+
+
+class ChildProcess:
+    """A supervised child process and its restart history."""
+
+    __slots__ = ('role', 'command', 'process', 'started_at', 'restarts', 'last_exit')
+
+    def __init__(self, role: str, command: List[str]):
+        self.role = role
+        self.command = command
+        self.process: Optional[asyncio.subprocess.Process] = None
+        self.started_at = None
+        self.restarts = 0
+        self.last_exit = None
+
+
+class Supervisor:
+    """Start the role processes and keep them running."""
+
+    def __init__(self, roles=ROLES, script: Optional[str] = None,
+                 restart_delay: float = 1.0, max_restart_delay: float = 60.0,
+                 stable_after: float = 60.0, stop_timeout: float = 30.0):
+        """
+        Initialize the supervisor.
+
+        Args:
+            roles: Roles to run, one process each
+            script: The app.py to run the roles with (default: the running script)
+            restart_delay: Seconds before restarting a child, doubled on each
+                consecutive quick failure
+            max_restart_delay: Upper bound of the restart delay
+            stable_after: Seconds a child must run for its delay to reset
+            stop_timeout: Seconds children get to shut down before being killed
+        """
+        script = script or os.path.abspath(sys.argv[0])
+        self.children = [ChildProcess(role, [sys.executable, script, '--role', role])
+                         for role in roles]
+        self.restart_delay = restart_delay
+        self.max_restart_delay = max_restart_delay
+        self.stable_after = stable_after
+        self.stop_timeout = stop_timeout
+        self._stopping = False
+
+    async def run(self):
+        """Run the children until cancelled."""
+        logger.info(f"Supervising {len(self.children)} processes: "
+                    f"{', '.join(child.role for child in self.children)}")
+        await asyncio.gather(*(self._supervise(child) for child in self.children))
+
+    async def _supervise(self, child: ChildProcess):
+        """Run one child, restarting it whenever it exits."""
+        delay = self.restart_delay
+        while not self._stopping:
+            child.process = await asyncio.create_subprocess_exec(*child.command)
+            child.started_at = time.monotonic()
+            logger.info(f"Started {child.role} process (pid {child.process.pid})")
+
+            child.last_exit = await child.process.wait()
+            if self._stopping:
+                return
+            uptime = time.monotonic() - child.started_at
+            logger.error(f"The {child.role} process exited with code {child.last_exit} "
+                         f"after {uptime:.0f}s")
+
+            # Back off only while the child keeps failing right away
+            if uptime >= self.stable_after:
+                delay = self.restart_delay
+            child.restarts += 1
+            logger.info(f"Restarting {child.role} process in {delay:.0f}s")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self.max_restart_delay)
+
+    async def stop(self):
+        """Ask every child to shut down, killing those that do not in time."""
+        self._stopping = True
+        running = [child.process for child in self.children
+                   if child.process and child.process.returncode is None]
+        for process in running:
+            process.send_signal(signal.SIGTERM)
+
+        try:
+            await asyncio.wait_for(
+                asyncio.gather(*(process.wait() for process in running)), self.stop_timeout
+            )
+        except asyncio.TimeoutError:
+            for process in running:
+                if process.returncode is None:
+                    logger.warning(f"Killing process {process.pid}")
+                    process.kill()
+            await asyncio.gather(*(process.wait() for process in running))
+        logger.info("All processes stopped")
+
+    def metrics(self) -> Dict[str, Dict[str, Any]]:
+        """Return pid, uptime and restarts of each child."""
+        now = time.monotonic()
+        return {
+            child.role: {
+                'pid': child.process.pid if child.process else None,
+                'running': bool(child.process and child.process.returncode is None),
+                'uptime_seconds': round(now - child.started_at, 1) if child.started_at else 0.0,
+                'restarts': child.restarts,
+                'last_exit': child.last_exit
+            }
+            for child in self.children
+        }
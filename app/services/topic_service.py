@@ -0,0 +1,275 @@
+"""
+Offline topic and keyword engine based on TF-IDF over hashed features.
+
+Message content is tokenized into CJK character bigrams and Latin words,
+hashed into a fixed-size sparse feature space and weighted with TF-IDF
+across (room, time window) documents. From that matrix the engine surfaces
+per-room trending terms (the latest window against the room's own earlier
+windows) and cross-room hot topics, without any LLM calls.
+"""
+import datetime
+import logging
+import zlib
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from scipy import sparse
+
+import config as cfg
+from app.models.records import MessageRecord, group_by_room
+from app.services.message_service import MessageService
+from app.utils.tokenizer import tokenize
+
+logger = logging.getLogger(__name__)
+
+class HashingVectorizer:
+    """
+    Map documents to sparse term-count vectors in a fixed feature space.
+
+    Terms are hashed with CRC32 so feature indices are stable across
+    processes. Each document's terms are counted first, so every distinct
+    term is hashed once per document. Feature indices are named after the
+    terms of the same batch only: on a collision the batch's most frequent
+    term wins, and nothing is kept between calls.
+    """
+
+    def __init__(self, n_features: int = 2 ** 18):
+        """
+        Initialize the vectorizer.
+
+        Args:
+            n_features: Size of the hashed feature space
+        """
+        self.n_features = n_features
+
+    def _index(self, term: str) -> int:
+        return zlib.crc32(term.encode('utf-8')) % self.n_features
+
+    def transform(self, documents: Iterable[Iterable[str]]) -> Tuple[sparse.csr_matrix, Dict[int, str]]:
+        """
+        Build the term-count matrix of documents.
+
+        Args:
+            documents: Each document as an iterable of message texts
+
+        Returns:
+            tuple: Documents x features csr_matrix of term counts, and the
+            term each used feature index stands for in these documents
+        """
+        indices = []
+        data = []
+        indptr = [0]
+        totals = Counter()
+        index = self._index
+        for texts in documents:
+            counts = Counter()
+            for text in texts:
+                counts.update(tokenize(text))
+            indices.extend(index(term) for term in counts)
+            data.extend(counts.values())
+            indptr.append(len(indices))
+            totals.update(counts)
+
+        # Name each index after its most frequent term in the batch
+        terms = {}
+        best = {}
+        for term, total in totals.items():
+            i = index(term)
+            if total > best.get(i, 0):
+                terms[i] = term
+                best[i] = total
+
+        matrix = sparse.csr_matrix(
+            (np.asarray(data, dtype=np.float32), np.asarray(indices, dtype=np.int32),
+             np.asarray(indptr, dtype=np.int64)),
+            shape=(len(indptr) - 1, self.n_features)
+        )
+        # Colliding terms within a document become a single summed entry
+        matrix.sum_duplicates()
+        return matrix, terms
+
+
+def tfidf(counts: sparse.csr_matrix) -> sparse.csr_matrix:
+    """
+    Weight a term-count matrix with sublinear TF and smoothed IDF.
+
+    Args:
+        counts: Documents x features matrix of term counts
+
+    Returns:
+        csr_matrix: L2-normalized TF-IDF matrix of the same shape
+    """
+    n_docs = counts.shape[0]
+    df = np.bincount(counts.indices, minlength=counts.shape[1])
+    idf = np.log((1 + n_docs) / (1 + df)) + 1.0
+
+    weights = counts.copy()
+    weights.data = (1.0 + np.log(weights.data)) * idf[weights.indices]
+
+    # Row-wise L2 normalization
+    norms = np.sqrt(np.asarray(weights.multiply(weights).sum(axis=1)).ravel())
+    norms[norms == 0] = 1.0
+    return sparse.diags(1.0 / norms) @ weights
+
+
+class TopicService:
+    """Service computing trending terms per room and hot topics across rooms."""
+
+    def __init__(self, message_service: Optional[MessageService] = None,
+                 n_features: int = 2 ** 18):
+        """
+        Initialize the topic service.
+
+        Args:
+            message_service: Optional message service to read messages from
+            n_features: Size of the hashed feature space
+        """
+        self.message_service = message_service or MessageService()
+        self.vectorizer = HashingVectorizer(n_features)
+
+    def analyze(self, records: List[MessageRecord], window: float = 3600,
+                top_k: int = 10, now: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Compute per-room trending terms and cross-room hot topics.
+
+        Messages are bucketed into (room, window) documents. A room's trending
+        terms are those whose weight in its latest window most exceeds their
+        mean weight in the room's earlier windows. Hot topics are terms that
+        trend in several rooms at once.
+
+        Args:
+            records: Message records from any number of rooms
+            window: Window length in seconds
+            top_k: Number of terms to return per room and overall
+            now: Epoch time closing the latest window, defaults to the newest message
+
+        Returns:
+            Dictionary with 'rooms' (room ID to list of term dictionaries)
+            and 'hot_topics' (list of term dictionaries)
+        """
+        groups = group_by_room(record for record in records if record.content)
+        if not groups:
+            return {'rooms': {}, 'hot_topics': []}
+
+        now = now or max(group[-1].created_ts for group in groups.values())
+
+        # One document per (room, window), windows counted back from now
+        documents = []
+        doc_rooms = []
+        doc_windows = []
+        for room_id, group in groups.items():
+            buckets = {}
+            for record in group:
+                buckets.setdefault(int((now - record.created_ts) // window), []).append(record.content)
+            for age, texts in buckets.items():
+                documents.append(texts)
+                doc_rooms.append(room_id)
+                doc_windows.append(age)
+
+        counts, terms = self.vectorizer.transform(documents)
+        weights = tfidf(counts)
+        doc_rooms = np.asarray(doc_rooms)
+        doc_windows = np.asarray(doc_windows)
+
+        rooms = {}
+        latest_rows = []
+        # Positive trend scores summed over rooms, and how many rooms trend on each term
+        trend_sum = np.zeros(counts.shape[1], dtype=np.float64)
+        coverage = np.zeros(counts.shape[1], dtype=np.int64)
+        for room_id in groups:
+            rows = np.flatnonzero(doc_rooms == room_id)
+            newest = doc_windows[rows].min()
+            latest = rows[doc_windows[rows] == newest]
+            earlier = rows[doc_windows[rows] != newest]
+            latest_rows.extend(latest)
+
+            current = np.asarray(weights[latest].sum(axis=0)).ravel()
+            if len(earlier):
+                baseline = np.asarray(weights[earlier].mean(axis=0)).ravel()
+                scores = current - baseline
+            else:
+                scores = current
+
+            room_counts = np.asarray(counts[latest].sum(axis=0)).ravel()
+            rooms[room_id] = self._top_terms(scores, room_counts, terms, top_k)
+
+            trending = scores > 0
+            trend_sum[trending] += scores[trending]
+            coverage += trending
+
+        # Hot topics: terms trending in several rooms at once
+        hot_scores = trend_sum * np.log1p(coverage)
+        hot_scores[coverage < 2] = 0.0
+        hot_counts = np.asarray(counts[latest_rows].sum(axis=0)).ravel()
+        hot_topics = self._top_terms(hot_scores, hot_counts, terms, top_k)
+        for topic, index in zip(hot_topics, self._top_indices(hot_scores, top_k)):
+            topic['rooms'] = int(coverage[index])
+
+        return {'rooms': rooms, 'hot_topics': hot_topics}
+
+    @staticmethod
+    def _top_indices(scores: np.ndarray, top_k: int) -> np.ndarray:
+        """Return indices of the top_k positive scores, best first."""
+        k = min(top_k, int((scores > 0).sum()))
+        if k == 0:
+            return np.array([], dtype=np.int64)
+        top = np.argpartition(-scores, k - 1)[:k]
+        return top[np.argsort(-scores[top], kind='stable')]
+
+    def _top_terms(self, scores: np.ndarray, term_counts: np.ndarray,
+                   terms: Dict[int, str], top_k: int) -> List[Dict[str, Any]]:
+        """Convert the best-scoring feature indices into term dictionaries."""
+        return [{
+            'term': terms.get(int(index), f"#{index}"),
+            'score': round(float(scores[index]), 4),
+            'count': int(term_counts[index])
+        } for index in self._top_indices(scores, top_k)]
+
+    def compute_topics(self, hours: float = 24, window: float = 3600,
+                       top_k: int = 10) -> Dict[str, Any]:
+        """
+        Compute topics over recent messages from the database.
+
+        Args:
+            hours: How far back to read messages
+            window: Window length in seconds
+            top_k: Number of terms to return per room and overall
+
+        Returns:
+            Dictionary as returned by analyze, plus the covered time range
+        """
+        until = datetime.datetime.now()
+        since = until - datetime.timedelta(hours=hours)
+        records = self.message_service.get_message_records(
+            limit=cfg.TOPIC_MAX_MESSAGES, since=since, until=until
+        )
+
+        result = self.analyze(records, window=window, top_k=top_k, now=until.timestamp())
+        result['since'] = since.isoformat()
+        result['until'] = until.isoformat()
+        result['message_count'] = len(records)
+        return result
+
+    def refresh_keywords(self, hours: float = 24, window: float = 3600,
+                         top_k: int = 10) -> int:
+        """
+        Recompute trending terms and store them in the Keyword table.
+
+        Args:
+            hours: How far back to read messages
+            window: Window length in seconds
+            top_k: Number of terms to store per room
+
+        Returns:
+            Number of rooms whose keywords were updated
+        """
+        result = self.compute_topics(hours=hours, window=window, top_k=top_k)
+        updated = 0
+        for room_id, terms in result['rooms'].items():
+            if terms and self.message_service.upsert_keywords(
+                    room_id, [(t['term'], t['count']) for t in terms]):
+                updated += 1
+
+        logger.info(f"Refreshed keywords for {updated} rooms from {result['message_count']} messages")
+        return updated
@@ -3,12 +3,21 @@ Web service for the WeChat Group Chat Assistant, providing a web interface for u
 """
 import os
 import logging
+import datetime
 import threading
-from flask import Flask, render_template, jsonify, request, Response
+from functools import wraps
+from urllib.parse import urlencode, urlsplit
+from flask import Flask, render_template, jsonify, redirect, request, Response, send_file
 from flask_cors import CORS
 
 import config as cfg
 from app.services.message_service import MessageService
+from app.services.topic_service import TopicService
+from app.services.ai_service import AiService
+from app.utils.export import EXPORT_FORMATS, export_chunks
+from app.utils.sse import format_sse, iterate_async
+from app.utils.metrics import collect_metrics, register_metrics
+from app.utils.response_cache import ResponseCache, get_versions, use_versions, version_keys
 
 logger = logging.getLogger(__name__)
 
@@ -22,6 +31,65 @@ CORS(app)
 
 # Initialize services
 message_service = MessageService()
+topic_service = TopicService(message_service)
+ai_service = AiService(message_service=message_service)
+
+# Responses of polled endpoints, reused until their rooms change
+response_cache = None
+if cfg.HTTP_CACHE_ENABLED:
+    response_cache = ResponseCache(max_entries=cfg.HTTP_CACHE_SIZE, ttl=cfg.HTTP_CACHE_TTL)
+    register_metrics('http_cache', response_cache.metrics)
+
+def conditional(*kinds, min_age: float = 0):
+    """
+    Serve a GET endpoint from the response cache, with ETag and Last-Modified.
+    
+    The cached response is valid until the data it covers changes: the given
+    kinds of data, for the room in the room_id parameter or for all rooms.
+    Clients revalidating with If-None-Match or If-Modified-Since get a 304
+    without any database work.
+    
+    Args:
+        kinds: Kinds of data the endpoint returns (see response_cache)
+        min_age: Seconds a response is reused even if its data changed
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if response_cache is None:
+                return view(*args, **kwargs)
+            
+            room_id = request.args.get('room_id')
+            keys = [key for kind in kinds
+                    for key in version_keys(kind, None if kind == 'rooms' else room_id)]
+            versions = get_versions(keys)
+            cache_key = f"{request.path}?{urlencode(sorted(request.args.items(multi=True)))}"
+            
+            entry = response_cache.get(cache_key, versions, min_age)
+            if entry is None:
+                response = app.make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response  # Errors are not cached
+                entry = response_cache.put(cache_key, versions, response.get_data(), response.mimetype)
+            
+            last_modified = datetime.datetime.fromtimestamp(int(entry.last_modified), datetime.timezone.utc)
+            if request.if_none_match:
+                unchanged = request.if_none_match.contains(entry.etag)
+            else:
+                unchanged = bool(request.if_modified_since and last_modified <= request.if_modified_since)
+            
+            if unchanged:
+                response_cache.stats['not_modified'] += 1
+                response = Response(status=304)
+            else:
+                response = Response(entry.body, mimetype=entry.mimetype)
+            response.set_etag(entry.etag)
+            response.last_modified = last_modified
+            # Cacheable by the browser, but revalidated on every poll
+            response.cache_control.no_cache = True
+            return response
+        return wrapper
+    return decorator
 
 @app.route('/')
 def index():
@@ -29,6 +97,7 @@ def index():
     return render_template('index.html')
 
 @app.route('/api/rooms')
+@conditional('rooms')
 def get_rooms():
     """API endpoint to get list of rooms/groups."""
     try:
@@ -63,6 +132,7 @@ def get_rooms():
             session.close()
 
 @app.route('/api/messages')
+@conditional('messages', 'rooms')
 def get_messages():
     """API endpoint to get messages, optionally filtered by room."""
     try:
@@ -86,17 +156,42 @@ def get_messages():
             'error': str(e)
         }), 500
 
+@app.route('/api/stream')
+def get_stream():
+    """
+    API endpoint to stream newly stored messages and summaries.
+    
+    The stream is served by the ingestion process (see stream_server), so
+    holding it open does not take a request thread here; this redirects
+    there with the same 'room_id' and 'kinds' parameters.
+    """
+    if not cfg.STREAM_ENABLED:
+        return jsonify({
+            'success': False,
+            'error': "The live stream is disabled (STREAM_ENABLED)"
+        }), 404
+    
+    # The stream runs on the same machine, under the name the client used
+    host = urlsplit(request.host_url).hostname
+    if ':' in host:
+        host = f"[{host}]"
+    query = f"?{request.query_string.decode()}" if request.query_string else ""
+    return redirect(f"{request.scheme}://{host}:{cfg.STREAM_PORT}/api/stream{query}", code=307)
+
 @app.route('/api/summaries')
+@conditional('summaries', 'rooms')
 def get_summaries():
     """API endpoint to get message summaries, optionally filtered by room."""
     try:
         room_id = request.args.get('room_id')
         limit = request.args.get('limit', 10, type=int)
+        level = request.args.get('level')
         
         # Get summaries from service
         summaries = message_service.get_message_summaries(
             room_id=room_id,
-            limit=limit
+            limit=limit,
+            level=level
         )
         
         return jsonify({
@@ -110,6 +205,250 @@ def get_summaries():
             'error': str(e)
         }), 500
 
+@app.route('/api/topics')
+@conditional('messages', min_age=cfg.TOPIC_CACHE_SECONDS)
+def get_topics():
+    """
+    API endpoint to get trending terms per room and hot topics across rooms.
+    
+    Topics are computed over all recent messages, so a response is reused
+    for TOPIC_CACHE_SECONDS seconds even while new messages arrive, and the
+    parameters are clamped to bound the work of one computation.
+    """
+    try:
+        hours = min(request.args.get('hours', cfg.TOPIC_LOOKBACK_HOURS, type=float),
+                    cfg.TOPIC_LOOKBACK_HOURS)
+        window = max(request.args.get('window', cfg.TOPIC_WINDOW_SECONDS, type=float), 60)
+        limit = min(max(request.args.get('limit', 10, type=int), 1), 100)
+        
+        # Compute topics from recent messages
+        topics = topic_service.compute_topics(
+            hours=hours,
+            window=window,
+            top_k=limit
+        )
+        
+        return jsonify({
+            'success': True,
+            'data': topics
+        })
+    except Exception as e:
+        logger.error(f"Error computing topics: {e}", exc_info=True)
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/keywords')
+def get_keywords():
+    """API endpoint to get stored keywords, optionally filtered by room."""
+    try:
+        room_id = request.args.get('room_id')
+        limit = request.args.get('limit', 20, type=int)
+        
+        # Get keywords from service
+        keywords = message_service.get_keywords(
+            room_id=room_id,
+            limit=limit
+        )
+        
+        return jsonify({
+            'success': True,
+            'data': keywords
+        })
+    except Exception as e:
+        logger.error(f"Error retrieving keywords: {e}", exc_info=True)
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/rooms/<room_id>/summarize')
+def summarize_room(room_id):
+    """
+    API endpoint to summarize a room over a time range on demand.
+    
+    The range is given by ISO 'start' and 'end' times, or by 'hours' back
+    from now (default 2). The summary is streamed as Server-Sent Events
+    ('meta', 'status', 'token', then 'done' or 'error'); pass stream=0 to get
+    a single JSON response instead.
+    """
+    try:
+        end = request.args.get('end')
+        end_time = datetime.datetime.fromisoformat(end) if end else datetime.datetime.now()
+        start = request.args.get('start')
+        if start:
+            start_time = datetime.datetime.fromisoformat(start)
+        else:
+            start_time = end_time - datetime.timedelta(hours=request.args.get('hours', 2, type=float))
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': f"Invalid time range: {e}"
+        }), 400
+    
+    if start_time >= end_time:
+        return jsonify({
+            'success': False,
+            'error': "'start' must be before 'end'"
+        }), 400
+    
+    events = ai_service.stream_summary(room_id, start_time, end_time)
+    
+    if request.args.get('stream', '1') == '0':
+        try:
+            result = {}
+            for event, data in iterate_async(events):
+                if event == 'meta':
+                    result.update(data)
+                elif event == 'done':
+                    result['summary'] = data['summary']
+                elif event == 'error':
+                    raise RuntimeError(data['message'])
+            
+            return jsonify({
+                'success': True,
+                'data': result
+            })
+        except Exception as e:
+            logger.error(f"Error summarizing room {room_id}: {e}", exc_info=True)
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 500
+    
+    def generate():
+        try:
+            for event, data in iterate_async(events):
+                yield format_sse(data, event)
+        except Exception as e:
+            logger.error(f"Error streaming summary for room {room_id}: {e}", exc_info=True)
+            yield format_sse({'message': str(e)}, 'error')
+    
+    return Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'  # Keep reverse proxies from buffering the stream
+    })
+
+@app.route('/api/rooms/<room_id>/export')
+def export_room(room_id):
+    """
+    API endpoint to download a room's full message history.
+    
+    The history is streamed oldest first as 'format' jsonl (default; one
+    /api/messages dictionary per line) or csv, optionally limited by ISO
+    'start' and 'end' times. With gzip=1 the stream is gzip-compressed
+    (Content-Encoding: gzip). Rows are read, encoded and sent in batches, so
+    memory use does not grow with the size of the export.
+    """
+    fmt = request.args.get('format', 'jsonl')
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({
+            'success': False,
+            'error': f"Unknown format '{fmt}', expected one of: {', '.join(EXPORT_FORMATS)}"
+        }), 400
+    
+    try:
+        start = request.args.get('start')
+        start_time = datetime.datetime.fromisoformat(start) if start else None
+        end = request.args.get('end')
+        end_time = datetime.datetime.fromisoformat(end) if end else None
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': f"Invalid time range: {e}"
+        }), 400
+    
+    try:
+        if not message_service.room_exists(room_id):
+            return jsonify({
+                'success': False,
+                'error': "Room not found"
+            }), 404
+    except Exception as e:
+        logger.error(f"Error looking up room {room_id}: {e}", exc_info=True)
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+    
+    compress = request.args.get('gzip', '0') == '1'
+    records = message_service.iter_room_messages(room_id, since=start_time, until=end_time,
+                                                 batch_size=cfg.EXPORT_BATCH_SIZE)
+    chunks = export_chunks(records, fmt, compress=compress, chunk_size=cfg.EXPORT_CHUNK_SIZE,
+                           level=cfg.EXPORT_GZIP_LEVEL)
+    
+    # No Content-Length, so the server sends the body with chunked transfer encoding
+    response = Response(chunks, mimetype=EXPORT_FORMATS[fmt])
+    response.headers['Content-Disposition'] = f'attachment; filename="{room_id}.{fmt}"'
+    response.headers['X-Accel-Buffering'] = 'no'
+    if compress:
+        response.headers['Content-Encoding'] = 'gzip'
+    return response
+
+@app.route('/api/similar')
+def get_similar():
+    """API endpoint to find earlier messages similar to a text or a stored message."""
+    try:
+        text = request.args.get('q')
+        message_id = request.args.get('message_id', type=int)
+        room_id = request.args.get('room_id')
+        months = request.args.get('months')
+        limit = request.args.get('limit', 10, type=int)
+        
+        if not text and message_id is None:
+            return jsonify({
+                'success': False,
+                'error': "Either 'q' or 'message_id' is required"
+            }), 400
+        
+        # Search the local vector index
+        results = message_service.search_similar(
+            text=text,
+            message_id=message_id,
+            room_id=room_id,
+            months=months.split(',') if months else None,
+            limit=limit
+        )
+        
+        return jsonify({
+            'success': True,
+            'data': results
+        })
+    except Exception as e:
+        logger.error(f"Error searching similar messages: {e}", exc_info=True)
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/media/<sha256>')
+def get_media(sha256):
+    """API endpoint to download an archived attachment by its content hash."""
+    try:
+        media = message_service.get_media(sha256)
+        path = os.path.join(cfg.MEDIA_DIR, media['path']) if media else None
+        if not path or not os.path.exists(path):
+            return jsonify({
+                'success': False,
+                'error': "Media not found"
+            }), 404
+        
+        # Content never changes under a hash, so clients may cache it for good
+        return send_file(
+            path,
+            mimetype=media['mime_type'] or 'application/octet-stream',
+            download_name=media['file_name'] or sha256,
+            conditional=True,
+            max_age=365 * 24 * 3600
+        )
+    except Exception as e:
+        logger.error(f"Error serving media {sha256}: {e}", exc_info=True)
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
 @app.route('/api/status')
 def get_status():
     """API endpoint to get system status."""
@@ -144,19 +483,109 @@ def get_status():
         if session:
             session.close()
 
-def start_web_server():
-    """Start the web server in a separate thread."""
-    def run_server():
-        logger.info(f"Starting web server at {cfg.WEB_HOST}:{cfg.WEB_PORT}")
+@app.route('/api/metrics')
+def get_metrics():
+    """API endpoint to get runtime metrics of the running services."""
+    try:
+        metrics = collect_metrics()
+        
+        # In supervisor mode the other processes publish theirs to the channel
+        channel = app.config.get('PROCESS_CHANNEL')
+        if channel:
+            metrics['processes'] = channel.read_metrics()
+        
+        return jsonify({
+            'success': True,
+            'data': metrics
+        })
+    except Exception as e:
+        logger.error(f"Error collecting metrics: {e}", exc_info=True)
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+def gunicorn_options():
+    """Return the gunicorn settings of WEB_SERVER = "gunicorn"."""
+    return {
+        'bind': f"{cfg.WEB_HOST}:{cfg.WEB_PORT}",
+        'workers': cfg.WEB_WORKERS,
+        # Threaded workers, so streamed responses do not block a whole worker
+        'worker_class': 'gthread',
+        'threads': cfg.WEB_THREADS,
+        'keepalive': cfg.WEB_KEEPALIVE,
+        'timeout': cfg.WEB_TIMEOUT,
+        'graceful_timeout': cfg.WEB_TIMEOUT,
+        # Workers are forked from this process; database connections opened
+        # before the fork must not be shared with them
+        'post_fork': lambda server, worker: message_service.engine.dispose()
+    }
+
+def _serve_gunicorn():
+    """Serve the app with gunicorn worker processes (blocking, main thread only)."""
+    from gunicorn.app.base import BaseApplication
+    
+    class Server(BaseApplication):
+        def load_config(self):
+            for key, value in gunicorn_options().items():
+                self.cfg.set(key, value)
+        
+        def load(self):
+            return app
+    
+    Server().run()
+
+def _serve_waitress():
+    """Serve the app with waitress's thread pool (blocking)."""
+    from waitress import serve
+    
+    # Waitress has no per-request timeout; WEB_TIMEOUT applies to gunicorn only
+    serve(
+        app,
+        host=cfg.WEB_HOST,
+        port=cfg.WEB_PORT,
+        threads=cfg.WEB_THREADS,
+        channel_timeout=cfg.WEB_KEEPALIVE,
+        ident=None
+    )
+
+def run_web_server(channel=None, in_thread=False):
+    """
+    Run the web server until the process exits (blocking).
+    
+    Args:
+        channel: LocalChannel of a supervised deployment, to report the
+            metrics and see the writes of the other processes
+        in_thread: Called off the main thread, where gunicorn cannot run
+    """
+    if channel:
+        app.config['PROCESS_CHANNEL'] = channel
+        # Writes by the other processes are counted in the channel
+        use_versions(channel)
+    
+    server = cfg.WEB_SERVER
+    if server == 'gunicorn' and in_thread:
+        logger.warning("gunicorn needs its own process (app.py --supervise or --role web); "
+                       "serving with waitress instead")
+        server = 'waitress'
+    
+    logger.info(f"Starting {server} web server at {cfg.WEB_HOST}:{cfg.WEB_PORT}")
+    if server == 'gunicorn':
+        _serve_gunicorn()
+    elif server == 'waitress':
+        _serve_waitress()
+    else:
         app.run(
             host=cfg.WEB_HOST,
             port=cfg.WEB_PORT,
             debug=cfg.DEBUG,
-            use_reloader=False  # Disable reloader when running in a thread
+            use_reloader=False  # The reloader would restart the whole application
         )
-    
+
+def start_web_server():
+    """Start the web server in a separate thread."""
     # Start server in a thread
-    server_thread = threading.Thread(target=run_server)
+    server_thread = threading.Thread(target=run_web_server, kwargs={'in_thread': True})
     server_thread.daemon = True
     server_thread.start()
     
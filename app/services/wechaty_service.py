@@ -5,98 +5,222 @@ This service handles message reception, sending, and WeChat login management.
 import os
 import logging
 import asyncio
-from typing import List, Optional
+import datetime
+from typing import Any, Dict, List, Optional
 from wechaty import Wechaty, Contact, Message, Room
 from wechaty.user import Image
-import schedule
+from wechaty_puppet import MessageType
 import time
-import threading
 
 # Import configuration and other services
 import config as cfg
-from app.services.message_service import MessageService
-from app.services.ai_service import AiService
+from app.services.message_service import MessageService, message_dedup_key, raw_message_metadata
+from app.services.analysis_service import MESSAGE_STORED, AnalysisService
+from app.services.duplicate_detector import DuplicateDetector
+from app.services.room_cache import RoomCache
+from app.services.account_manager import RoomAssignment
+from app.services.ingestion_queue import IngestionQueue
+from app.services.media_pipeline import MediaPipeline, MediaStore
+from app.services.outbound_dispatcher import OutboundDispatcher
+from app.services.command_service import CommandContext, CommandLane, CommandRegistry
+from app.utils.local_channel import LocalChannel
+from app.utils.metrics import register_metrics
 
 logger = logging.getLogger(__name__)
 
+# Message types whose attachment is archived by the media pipeline
+MEDIA_MESSAGE_TYPES = (
+    MessageType.MESSAGE_TYPE_IMAGE,
+    MessageType.MESSAGE_TYPE_ATTACHMENT,
+    MessageType.MESSAGE_TYPE_AUDIO,
+    MessageType.MESSAGE_TYPE_VIDEO,
+)
+
 class WechatyService:
     """Service class for Wechaty integration with WeChat."""
     
-    def __init__(self):
-        """Initialize the Wechaty service."""
+    def __init__(self, account: Optional[Dict[str, Any]] = None, primary: bool = True,
+                 rooms: Optional[RoomAssignment] = None,
+                 channel: Optional[LocalChannel] = None):
+        """
+        Initialize the Wechaty service.
+        
+        Args:
+            account: One of several accounts (see account_manager.load_accounts);
+                None for the single WECHATY_* account
+            primary: Whether this service runs analysis and the periodic jobs
+            rooms: Room ownership shared with the other accounts in this process
+            channel: Channel to a separate analysis process (supervisor mode);
+                stored messages are published to it instead of analyzed here
+        """
+        self.account = account
+        self.name = account['name'] if account else cfg.WECHATY_NAME
+        self.primary = primary
+        self.rooms = rooms
+        self.channel = channel
+        
         self.bot = Wechaty(
-            name=cfg.WECHATY_NAME,
-            puppet=cfg.WECHATY_PUPPET,
+            name=self.name,
+            puppet=account['puppet'] if account else cfg.WECHATY_PUPPET,
             puppet_options={
-                'token': cfg.WECHATY_TOKEN,
+                'token': account['token'] if account else cfg.WECHATY_TOKEN,
             }
         )
         
         # Initialize other services
         self.message_service = MessageService()
-        self.ai_service = AiService()
+        
+        # Analysis and periodic tasks (analysis, keyword refresh, vector indexing)
+        # run here unless an analysis process is listening on the channel
+        # (secondary accounts report to the primary account's analysis)
+        self.analysis = None
+        if primary and not channel:
+            self.analysis = AnalysisService(self.message_service)
+        
+        # Room topics by room_id, so known rooms need no puppet call per message,
+        # and the monitored groups resolved to room_ids
+        self.room_cache = RoomCache(
+            monitored_topics=account['groups'] if account else cfg.MONITORED_GROUPS
+        )
+        self.ingest_stats = {'accepted': 0, 'dropped': 0, 'other_account': 0}
+        
+        # Messages received by several accounts (in separate processes) are
+        # stored once by their dedup key; a single account keys nothing, so
+        # identical texts sent within one second are all kept
+        self.dedup_across_accounts = len(getattr(cfg, 'WECHATY_ACCOUNTS', None) or []) > 1
+        
+        # Near-duplicate and flood detection for incoming messages
+        self.duplicate_detector = None
+        if cfg.DEDUP_ENABLED:
+            self.duplicate_detector = DuplicateDetector(
+                window_size=cfg.DEDUP_WINDOW_SIZE,
+                window_seconds=cfg.DEDUP_WINDOW_SECONDS,
+                max_distance=cfg.DEDUP_MAX_DISTANCE,
+                flood_threshold=cfg.DEDUP_FLOOD_THRESHOLD,
+                min_length=cfg.DEDUP_MIN_LENGTH
+            )
+        
+        # Bounded queue between the message handler and database writes
+        spill_path = cfg.INGEST_SPILL_FILE
+        if account:
+            base, ext = os.path.splitext(spill_path)
+            spill_path = f"{base}.{self.name}{ext}"
+        self.ingest_queue = IngestionQueue(
+            store=self._store_item,
+            on_stored=self._on_item_stored,
+            maxsize=cfg.INGEST_QUEUE_SIZE,
+            workers=cfg.INGEST_WORKERS,
+            overflow=cfg.INGEST_OVERFLOW,
+            spill_path=spill_path
+        )
+        
+        # Attachments are downloaded by media workers before the message is queued
+        self.media_pipeline = None
+        if cfg.MEDIA_ENABLED:
+            self.media_pipeline = MediaPipeline(
+                store=MediaStore(cfg.MEDIA_DIR, max_bytes=cfg.MEDIA_MAX_BYTES),
+                fetch=self._fetch_media,
+                on_done=self.ingest_queue.put,
+                workers=cfg.MEDIA_WORKERS,
+                maxsize=cfg.MEDIA_QUEUE_SIZE
+            )
+        
+        # Rate-limited sending with cached room handles
+        self.outbound = OutboundDispatcher(
+            resolve_room=lambda room_id: self.bot.Room.find(room_id),
+            rate=cfg.SEND_RATE,
+            burst=cfg.SEND_BURST,
+            room_rate=cfg.SEND_ROOM_RATE,
+            room_burst=cfg.SEND_ROOM_BURST,
+            max_length=cfg.SEND_MAX_LENGTH,
+            coalesce_length=cfg.SEND_COALESCE_LENGTH,
+            max_retries=cfg.SEND_MAX_RETRIES,
+            retry_delay=cfg.SEND_RETRY_DELAY,
+            maxsize=cfg.SEND_QUEUE_SIZE
+        )
+        
+        # Commands and @-mentions of the bot skip the ingestion queue
+        self.self_id = None
+        self.self_name = None
+        self.commands = CommandRegistry(prefix=cfg.COMMAND_PREFIX)
+        self._register_commands()
+        self.command_lane = CommandLane(
+            self.commands,
+            reply=self._reply_command,
+            workers=cfg.COMMAND_WORKERS,
+            maxsize=cfg.COMMAND_QUEUE_SIZE
+        )
+        
+        register_metrics(self._metrics_name('ingestion'),
+                         lambda: {**self.ingest_stats, **self.ingest_queue.metrics()})
+        register_metrics(self._metrics_name('commands'), self.command_lane.metrics)
+        if self.media_pipeline:
+            register_metrics(self._metrics_name('media'), self.media_pipeline.metrics)
+        register_metrics(self._metrics_name('outbound'), self.outbound.metrics)
+        register_metrics(self._metrics_name('rooms'), lambda: {
+            'cached': len(self.room_cache),
+            'monitored': len(self.room_cache.monitored_ids),
+            'owned': self.rooms.owned_by(self.name) if self.rooms else len(self.room_cache),
+            **self.room_cache.stats
+        })
+        if self.duplicate_detector:
+            register_metrics(self._metrics_name('duplicates'),
+                             lambda: dict(self.duplicate_detector.stats))
         
         # Set up event handlers
         self.bot.on('scan', self._on_scan)
         self.bot.on('login', self._on_login)
         self.bot.on('logout', self._on_logout)
         self.bot.on('message', self._on_message)
+        self.bot.on('room-topic', self._on_room_topic)
+        self.bot.on('room-join', self._on_room_join)
+        self.bot.on('room-leave', self._on_room_leave)
         self.bot.on('error', self._on_error)
         
-        # Scheduler thread for periodic tasks
-        self.scheduler_thread = None
         self.is_running = False
     
+    def _metrics_name(self, section: str) -> str:
+        """Name a metrics section, per account when running several."""
+        return f"{section}[{self.name}]" if self.account else section
+    
     async def start(self):
         """Start the Wechaty service."""
-        logger.info("Starting Wechaty service...")
+        logger.info(f"Starting Wechaty service {self.name}...")
         
-        # Start the scheduler in a separate thread
         self.is_running = True
-        self.scheduler_thread = threading.Thread(target=self._run_scheduler)
-        self.scheduler_thread.daemon = True
-        self.scheduler_thread.start()
+        await self.ingest_queue.start()
+        if self.media_pipeline:
+            await self.media_pipeline.start()
+        await self.command_lane.start()
+        if self.primary and self.analysis:
+            # Analysis and periodic tasks run on this event loop
+            await self.analysis.start()
         
         # Start the Wechaty bot
         await self.bot.start()
     
     async def stop(self):
         """Stop the Wechaty service."""
-        logger.info("Stopping Wechaty service...")
+        logger.info(f"Stopping Wechaty service {self.name}...")
         self.is_running = False
+        if self.rooms:
+            self.rooms.release(self.name)
+        
+        if self.primary and self.analysis:
+            await self.analysis.stop()
         
+        logger.info(f"Messages accepted: {self.ingest_stats['accepted']}, "
+                    f"dropped from unmonitored rooms: {self.ingest_stats['dropped']}")
+        
+        await self.command_lane.stop()
+        await self.outbound.stop()
         if self.bot:
             await self.bot.stop()
-    
-    def _run_scheduler(self):
-        """Run the scheduler for periodic tasks."""
-        # Schedule periodic message analysis
-        schedule.every(cfg.ANALYSIS_INTERVAL).minutes.do(
-            lambda: asyncio.run(self._analyze_messages())
-        )
         
-        # Run the scheduler loop
-        while self.is_running:
-            schedule.run_pending()
-            time.sleep(1)
-    
-    async def _analyze_messages(self):
-        """Analyze messages periodically."""
-        logger.info("Running scheduled message analysis...")
-        try:
-            # Get recent messages from database
-            recent_messages = self.message_service.get_recent_messages(
-                limit=cfg.MAX_MESSAGES_PER_ANALYSIS
-            )
-            
-            if recent_messages:
-                # Process messages with AI service
-                await self.ai_service.analyze_messages(recent_messages)
-                logger.info(f"Analyzed {len(recent_messages)} messages")
-            else:
-                logger.info("No new messages to analyze")
-        except Exception as e:
-            logger.error(f"Error during message analysis: {e}", exc_info=True)
+        # Store what was received before the bot stopped
+        if self.media_pipeline:
+            await self.media_pipeline.stop()
+        await self.ingest_queue.stop()
     
     async def _on_scan(self, qr_code: str, status: int, data: Optional[str] = None):
         """Handle scan events for WeChat login."""
@@ -121,20 +245,44 @@ class WechatyService:
     async def _on_login(self, contact: Contact):
         """Handle login events."""
         logger.info(f"User {contact.name} logged in")
+        self.self_id = contact.contact_id
+        self.self_name = contact.name
+        
+        started = time.monotonic()
         
         # Get list of rooms (group chats)
         rooms = await self.bot.Room.find_all()
         logger.info(f"Found {len(rooms)} rooms")
         
-        # Log room information
+        # Fetch topics and member counts concurrently into the room cache
+        infos = await self.room_cache.warm(
+            rooms,
+            concurrency=cfg.LOGIN_WARMUP_CONCURRENCY,
+            members=cfg.LOGIN_WARMUP_MEMBERS
+        )
         for room in rooms:
-            room_id = room.room_id
-            topic = await room.topic()
-            logger.info(f"Room: {topic} (ID: {room_id})")
+            self.outbound.remember_room(room)
+        for info in infos:
+            logger.debug(f"Room: {info.topic} (ID: {info.room_id}, members: {info.member_count})")
+        
+        # Store all rooms in one transaction, off the event loop
+        await asyncio.get_running_loop().run_in_executor(
+            None, self.message_service.upsert_rooms,
+            [(info.room_id, info.topic, info.member_count) for info in infos]
+        )
+        
+        logger.info(f"Ready in {time.monotonic() - started:.1f}s: cached {len(infos)} of "
+                    f"{len(rooms)} rooms in {self.room_cache.stats['warm_seconds']:.1f}s")
+        if cfg.MONITORED_GROUPS:
+            logger.info(f"Monitoring {len(self.room_cache.monitored_ids)} of {len(rooms)} rooms")
     
     async def _on_logout(self, contact: Contact):
         """Handle logout events."""
         logger.info(f"User {contact.name} logged out")
+        
+        # Other accounts take over the rooms until this one is back
+        if self.rooms:
+            self.rooms.release(self.name)
     
     async def _on_message(self, msg: Message):
         """Handle incoming message events."""
@@ -144,13 +292,26 @@ class WechatyService:
             if not room:
                 return  # Skip non-group messages
             
-            # Get room topic
-            topic = await room.topic()
-            
-            # Check if we should monitor this group
-            if cfg.MONITORED_GROUPS and topic not in cfg.MONITORED_GROUPS:
+            # Drop unmonitored rooms before any other work; only a room seen
+            # for the first time needs its topic fetched to decide
+            monitored = self.room_cache.is_monitored(room.room_id)
+            if monitored is None:
+                await self.room_cache.refresh(room)
+                monitored = self.room_cache.is_monitored(room.room_id)
+            if not monitored:
+                self.ingest_stats['dropped'] += 1
                 return  # Skip groups not in the monitored list
             
+            # A room seen by several accounts is handled by its owner only
+            if self.rooms and not self.rooms.claim(room.room_id, self.name):
+                self.ingest_stats['other_account'] += 1
+                return
+            self.ingest_stats['accepted'] += 1
+            self.outbound.remember_room(room)
+            
+            # Get room topic (cached after the first message or login)
+            topic = await self.room_cache.topic(room)
+            
             # Get message information
             sender = msg.talker()
             text = msg.text()
@@ -158,34 +319,182 @@ class WechatyService:
             
             logger.debug(f"Received message in {topic} from {sender.name}: {text[:30]}...")
             
-            # Store message in database
-            await self.message_service.store_message(
-                room_id=room.room_id,
-                room_topic=topic,
-                sender_id=sender.contact_id,
-                sender_name=sender.name,
-                message_type=str(message_type),
-                content=text,
-                raw_message=msg
-            )
+            # Commands are answered on the fast lane; the message is still archived
+            command = self._parse_command(msg, text)
+            if command:
+                self.command_lane.submit(CommandContext(
+                    name=command[0],
+                    args=command[1],
+                    room_id=room.room_id,
+                    room_topic=topic,
+                    sender_id=sender.contact_id,
+                    sender_name=sender.name,
+                    text=text,
+                    received_at=asyncio.get_running_loop().time()
+                ))
+            
+            # Compare against recent messages in the room
+            duplicate = None
+            if self.duplicate_detector:
+                duplicate = self.duplicate_detector.check(room.room_id, text, msg.message_id)
+                if duplicate.collapse:
+                    logger.debug(f"Dropped flood copy #{duplicate.copies} of {duplicate.duplicate_of} in {topic}")
+                    return
+            
+            # Hand the message to the storage workers
+            metadata = raw_message_metadata(msg)
+            if duplicate:
+                metadata.update(duplicate.to_metadata())
+            item = {
+                'room_id': room.room_id,
+                'room_topic': topic,
+                'sender_id': sender.contact_id,
+                'sender_name': sender.name,
+                'message_type': str(message_type),
+                'content': text,
+                'is_duplicate': bool(duplicate and duplicate.is_duplicate),
+                'metadata': metadata,
+                'received_at': time.time(),
+                # Same for every account receiving the message
+                'dedup_key': message_dedup_key(
+                    room.room_id, sender.contact_id,
+                    getattr(msg.payload, 'timestamp', None), text
+                ) if self.dedup_across_accounts else None
+            }
+            
+            # Attachments are archived first; the media workers queue the message.
+            # Copies flagged as duplicates are usually forwards of the same file,
+            # which the content-addressed store keeps once anyway.
+            if self.media_pipeline and message_type in MEDIA_MESSAGE_TYPES:
+                if self.media_pipeline.submit(msg, item):
+                    return
+                logger.warning(f"Media queue full, storing message {msg.message_id} without its attachment")
+            await self.ingest_queue.put(item)
         except Exception as e:
             logger.error(f"Error processing message: {e}", exc_info=True)
     
+    def _store_item(self, item: dict) -> bool:
+        """Store a queued message (runs on an ingestion worker thread)."""
+        stored = self.message_service.save_message(
+            room_id=item['room_id'],
+            room_topic=item['room_topic'],
+            sender_id=item['sender_id'],
+            sender_name=item['sender_name'],
+            message_type=item['message_type'],
+            content=item['content'],
+            is_duplicate=item['is_duplicate'],
+            extra_metadata=item['metadata'],
+            created_at=datetime.datetime.fromtimestamp(item['received_at']),
+            dedup_key=item.get('dedup_key'),
+            media=item.get('media')
+        )
+        if stored and self.channel and not item['is_duplicate']:
+            # Tell the analysis process, from this thread rather than the event loop
+            self.channel.publish(MESSAGE_STORED, {
+                'room_id': item['room_id'],
+                'content': item['content']
+            })
+        return stored
+    
+    async def _fetch_media(self, msg: Message):
+        """Return the file box of a message's attachment (full size for images)."""
+        if msg.type() == MessageType.MESSAGE_TYPE_IMAGE:
+            return await msg.to_image().hd()
+        return await msg.to_file_box()
+    
+    def _on_item_stored(self, item: dict):
+        """Let the adaptive scheduler account for newly stored traffic."""
+        if self.analysis and not item['is_duplicate']:
+            self.analysis.record_message(item['room_id'], item['content'])
+    
+    def _parse_command(self, msg: Message, text: str):
+        """
+        Recognize a command or an @-mention of the bot.
+        
+        Returns:
+            (name, args), or None for ordinary messages; a bare mention of
+            the bot asks for the help text, other mentions are not answered
+        """
+        command = self.commands.parse(text)
+        if command:
+            return command
+        
+        if not self.self_id:
+            return None
+        mention_ids = getattr(msg.payload, 'mention_ids', None) or ()
+        mention = f"@{self.self_name}" if self.self_name else None
+        if self.self_id not in mention_ids and not (mention and mention in text):
+            return None
+        
+        # "@bot summary" runs the summary command
+        rest = text.replace(mention, '', 1).strip() if mention else text.strip()
+        if not rest:
+            return 'help', ''
+        command = self.commands.parse(self.commands.prefix + rest.lstrip(self.commands.prefix))
+        if command and command[0] in dict(self.commands.commands()):
+            return command
+        return None
+    
+    def _register_commands(self):
+        """Register the commands answered in monitored rooms."""
+        self.commands.register('help', "Show available commands", self._command_help)
+        self.commands.register('summary', "Show the latest summary of this room", self._command_summary)
+        self.commands.register('keywords', "Show the top keywords of this room", self._command_keywords)
+    
+    async def _command_help(self, context: CommandContext) -> str:
+        return self.commands.help_text()
+    
+    async def _command_summary(self, context: CommandContext) -> str:
+        # Database reads run off the event loop, away from the ingestion workers
+        loop = asyncio.get_running_loop()
+        summary = await loop.run_in_executor(
+            None, self.message_service.get_latest_summary, context.room_id
+        )
+        if not summary:
+            return f"No summary of {context.room_topic} yet."
+        return (f"Summary of {context.room_topic} "
+                f"({summary['start_time']:%m-%d %H:%M} - {summary['end_time']:%H:%M}):\n"
+                f"{summary['summary']}")
+    
+    async def _command_keywords(self, context: CommandContext) -> str:
+        loop = asyncio.get_running_loop()
+        keywords = await loop.run_in_executor(
+            None, lambda: self.message_service.get_keywords(room_id=context.room_id, limit=10)
+        )
+        if not keywords:
+            return f"No keywords for {context.room_topic} yet."
+        return f"Top keywords in {context.room_topic}: " + ", ".join(kw['keyword'] for kw in keywords)
+    
+    async def _reply_command(self, context: CommandContext, reply: str):
+        """Send a command reply to the room it came from."""
+        await self.send_message(context.room_id, reply)
+    
+    async def _on_room_topic(self, room: Room, new_topic: str, old_topic: str,
+                             changer: Contact, date=None):
+        """Handle room topic changes."""
+        logger.info(f"Room {room.room_id} renamed from {old_topic} to {new_topic}")
+        self.room_cache.put(room.room_id, new_topic)
+    
+    async def _on_room_join(self, room: Room, invitees: List[Contact],
+                            inviter: Contact, date=None):
+        """Handle members joining a room."""
+        # Also fires when the bot itself is added to a new room
+        self.room_cache.invalidate(room.room_id)
+    
+    async def _on_room_leave(self, room: Room, removees: List[Contact],
+                             remover: Contact, date=None):
+        """Handle members leaving a room."""
+        self.room_cache.invalidate(room.room_id)
+    
     async def _on_error(self, error):
         """Handle error events."""
         logger.error(f"Wechaty error: {error}", exc_info=True)
     
     async def send_message(self, room_id: str, message: str):
-        """Send a message to a room."""
-        try:
-            room = await self.bot.Room.find(room_id)
-            if room:
-                await room.say(message)
-                logger.info(f"Sent message to room {room_id}")
-                return True
-            else:
-                logger.warning(f"Room {room_id} not found")
-                return False
-        except Exception as e:
-            logger.error(f"Error sending message: {e}", exc_info=True)
-            return False 
\ No newline at end of file
+        """
+        Send a message to a room through the outbound dispatcher.
+        
+        Returns:
+            bool: True once the whole message was sent
+        """
+        return await self.outbound.send(room_id, message) 
\ No newline at end of file
@@ -0,0 +1,115 @@
+"""
+Streaming encoders for message history exports.
+
+Records are encoded into chunks of roughly ``chunk_size`` bytes as they are
+read, so an export of any size holds one chunk (and one database batch) in
+memory at a time. Chunks can be gzip-compressed on the fly.
+"""
+import csv
+import io
+import json
+import zlib
+from typing import Iterable, Iterator
+
+from app.models.records import MessageRecord
+
+# Export format to content type
+EXPORT_FORMATS = {
+    'jsonl': 'application/x-ndjson',
+    'csv': 'text/csv'
+}
+
+CSV_FIELDS = ('id', 'created_at', 'room_id', 'room_topic', 'user_id', 'user_name',
+              'message_type', 'content', 'metadata')
+
+
+def iter_jsonl(records: Iterable[MessageRecord], chunk_size: int = 65536) -> Iterator[bytes]:
+    """
+    Encode records as JSON lines, one message dictionary (as in /api/messages) per line.
+
+    Args:
+        records: Messages to encode
+        chunk_size: Approximate size of the yielded chunks in bytes
+
+    Yields:
+        bytes: UTF-8 chunks ending at line boundaries
+    """
+    lines = []
+    size = 0
+    for record in records:
+        line = json.dumps(record.to_dict(), ensure_ascii=False) + '\n'
+        lines.append(line)
+        size += len(line)
+        if size >= chunk_size:
+            yield ''.join(lines).encode('utf-8')
+            lines.clear()
+            size = 0
+    if lines:
+        yield ''.join(lines).encode('utf-8')
+
+
+def iter_csv(records: Iterable[MessageRecord], chunk_size: int = 65536) -> Iterator[bytes]:
+    """
+    Encode records as CSV with a header row; metadata is a JSON column.
+
+    Args:
+        records: Messages to encode
+        chunk_size: Approximate size of the yielded chunks in bytes
+
+    Yields:
+        bytes: UTF-8 chunks ending at row boundaries
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CSV_FIELDS)
+    for record in records:
+        writer.writerow((
+            record.id, record.created_at.isoformat(), record.room_id, record.room_topic,
+            record.user_id, record.user_name, record.message_type, record.content,
+            record.metadata_json
+        ))
+        if buffer.tell() >= chunk_size:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
+
+
+def gzip_chunks(chunks: Iterable[bytes], level: int = 6) -> Iterator[bytes]:
+    """
+    Compress a stream of chunks into one gzip stream.
+
+    Args:
+        chunks: Uncompressed chunks
+        level: zlib compression level (1 fastest - 9 smallest)
+
+    Yields:
+        bytes: Compressed chunks; together a valid gzip file
+    """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def export_chunks(records: Iterable[MessageRecord], fmt: str, compress: bool = False,
+                  chunk_size: int = 65536, level: int = 6) -> Iterator[bytes]:
+    """
+    Encode records in an export format, optionally gzip-compressed.
+
+    Args:
+        records: Messages to encode
+        fmt: 'jsonl' or 'csv'
+        compress: Whether to gzip the output
+        chunk_size: Approximate size of the uncompressed chunks in bytes
+        level: gzip compression level
+
+    Yields:
+        bytes: Output chunks
+    """
+    encode = iter_csv if fmt == 'csv' else iter_jsonl
+    chunks = encode(records, chunk_size)
+    return gzip_chunks(chunks, level) if compress else chunks
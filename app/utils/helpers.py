@@ -109,6 +109,9 @@ def chunk_text(text: str, max_length: int = 4000) -> List[str]:
     """
     Split a long text into chunks of approximately equal length.
     
+    Paragraphs are kept together where possible; a paragraph longer than
+    max_length is split at line breaks, and a line longer than that is cut.
+    
     Args:
         text: The text to split
         max_length: Maximum length of each chunk
@@ -125,6 +128,14 @@ def chunk_text(text: str, max_length: int = 4000) -> List[str]:
     current_chunk = ""
     
     for para in paragraphs:
+        # A paragraph that can never fit is split into its own chunks
+        if len(para) > max_length:
+            if current_chunk:
+                chunks.append(current_chunk)
+                current_chunk = ""
+            chunks.extend(_split_paragraph(para, max_length))
+            continue
+        
         # If adding this paragraph would exceed max_length, start a new chunk
         if len(current_chunk) + len(para) + 2 > max_length:
             if current_chunk:
@@ -140,4 +151,72 @@ def chunk_text(text: str, max_length: int = 4000) -> List[str]:
     if current_chunk:
         chunks.append(current_chunk)
     
-    return chunks 
\ No newline at end of file
+    return chunks
+
+def _split_paragraph(paragraph: str, max_length: int) -> List[str]:
+    """Split an oversized paragraph at line breaks, cutting overlong lines."""
+    chunks = []
+    current_chunk = ""
+    
+    for line in paragraph.split('\n'):
+        while len(line) > max_length:
+            if current_chunk:
+                chunks.append(current_chunk)
+                current_chunk = ""
+            chunks.append(line[:max_length])
+            line = line[max_length:]
+        
+        if current_chunk and len(current_chunk) + len(line) + 1 > max_length:
+            chunks.append(current_chunk)
+            current_chunk = line
+        elif current_chunk:
+            current_chunk += '\n' + line
+        else:
+            current_chunk = line
+    
+    if current_chunk:
+        chunks.append(current_chunk)
+    
+    return chunks
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """
+    Compute a percentile using linear interpolation between closest ranks.
+    
+    Args:
+        values: The sample values
+        pct: The percentile to compute, between 0 and 100
+        
+    Returns:
+        float: The percentile value, or 0.0 for an empty sample
+    """
+    if not values:
+        return 0.0
+    
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * pct / 100.0
+    lower = int(rank)
+    upper = min(lower + 1, len(ordered) - 1)
+    fraction = rank - lower
+    
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * fraction
+
+def estimate_tokens(text: str) -> int:
+    """
+    Roughly estimate the number of LLM tokens in a text.
+    
+    CJK characters are counted as one token each and the remaining text as
+    one token per four characters, which is close enough for budgeting.
+    
+    Args:
+        text: The text to estimate
+        
+    Returns:
+        int: Estimated token count
+    """
+    if not text:
+        return 0
+    
+    cjk = sum(1 for ch in text if '一' <= ch <= '鿿' or '぀' <= ch <= 'ヿ')
+    return cjk + (len(text) - cjk + 3) // 4
@@ -0,0 +1,196 @@
+"""
+In-process pub/sub of newly stored messages and summaries.
+
+The storage path publishes each write (``publish``) to the broker of its
+process; the stream server (see stream_server) subscribes one Subscriber per
+connected client, optionally limited to some rooms and kinds of events.
+
+Events are encoded once, in the publishing thread, and handed to the event
+loop in a single call; the loop appends the same bytes to the buffer of
+every matching subscriber. Buffers are bounded: a client that falls so far
+behind that its buffer fills up is evicted rather than slowing down the
+others or growing without limit, and can reconnect and re-read what it
+missed from /api/messages.
+
+Processes without a stream server (the analysis process of a supervised
+deployment) relay their events through the LocalChannel instead
+(``relay_to``), and the ingestion process publishes them to its broker.
+"""
+import asyncio
+import threading
+from collections import deque
+from typing import Any, Dict, Iterable, Optional, Set
+
+from app.utils.sse import format_sse
+
+# LocalChannel event kind of relayed stream events
+STREAM_EVENT = 'stream_event'
+
+
+class Subscriber:
+    """One client's filter and buffer of encoded events."""
+
+    __slots__ = ('rooms', 'kinds', 'buffer', 'max_buffered', 'wakeup', 'evicted')
+
+    def __init__(self, rooms: Optional[Set[str]], kinds: Optional[Set[str]],
+                 max_buffered: int):
+        self.rooms = rooms
+        self.kinds = kinds
+        self.buffer = deque()
+        self.max_buffered = max_buffered
+        self.wakeup = asyncio.Event()
+        # Why the subscriber was dropped, once it was
+        self.evicted: Optional[str] = None
+
+    def take(self) -> bytes:
+        """Return and clear the buffered events (on the event loop)."""
+        chunk = b''.join(self.buffer)
+        self.buffer.clear()
+        self.wakeup.clear()
+        return chunk
+
+
+class StreamBroker:
+    """Fans events out to subscribers on one event loop."""
+
+    def __init__(self, buffer_size: int = 256):
+        """
+        Initialize the broker.
+
+        Args:
+            buffer_size: Events buffered per subscriber before it is evicted
+        """
+        self.buffer_size = buffer_size
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread: Optional[int] = None
+        self._relay = None
+        # Subscribers by room; None holds those of all rooms
+        self._by_room: Dict[Optional[str], Set[Subscriber]] = {}
+        self._count = 0
+        self.stats = {'published': 0, 'delivered': 0, 'evicted': 0, 'relayed': 0}
+
+    def attach(self, loop: asyncio.AbstractEventLoop):
+        """Deliver events on a loop (the stream server's; call on that loop)."""
+        self._loop = loop
+        self._loop_thread = threading.get_ident()
+
+    def detach(self):
+        """Stop delivering events, evicting all subscribers."""
+        for subscribers in list(self._by_room.values()):
+            for subscriber in list(subscribers):
+                self._evict(subscriber, 'shutdown')
+        self._loop = None
+
+    def relay_to(self, channel):
+        """
+        Publish events to a LocalChannel instead, for another process's broker.
+
+        Args:
+            channel: LocalChannel whose STREAM_EVENT events the process
+                running the stream server consumes
+        """
+        self._relay = channel
+
+    def wants(self, room_id: str) -> bool:
+        """
+        Return whether an event of a room would reach anyone, so publishers
+        can skip building it (safe from any thread).
+        """
+        if self._relay is not None:
+            return True
+        return self._loop is not None and bool(self._by_room.get(None) or self._by_room.get(room_id))
+
+    def publish(self, kind: str, room_id: str, data: Dict[str, Any]):
+        """
+        Publish an event (safe from any thread).
+
+        Args:
+            kind: Event kind, e.g. 'message' or 'summary'
+            room_id: The room the event belongs to
+            data: JSON-serializable event payload
+        """
+        if self._relay is not None:
+            self._relay.publish(STREAM_EVENT, {'kind': kind, 'room_id': room_id, 'data': data})
+            self.stats['relayed'] += 1
+            return
+
+        loop = self._loop
+        if loop is None or not self.wants(room_id):
+            return
+        chunk = format_sse(data, kind).encode('utf-8')
+        self.stats['published'] += 1
+        if threading.get_ident() == self._loop_thread:
+            self._dispatch(kind, room_id, chunk)
+        else:
+            try:
+                loop.call_soon_threadsafe(self._dispatch, kind, room_id, chunk)
+            except RuntimeError:
+                pass  # The loop closed while publishing
+
+    def publish_relayed(self, event: Dict[str, Any]):
+        """Publish an event relayed by another process (LocalChannel consumer)."""
+        self.publish(event['kind'], event['room_id'], event['data'])
+
+    def subscribe(self, rooms: Optional[Iterable[str]] = None,
+                  kinds: Optional[Iterable[str]] = None) -> Subscriber:
+        """
+        Add a subscriber (on the event loop).
+
+        Args:
+            rooms: Rooms to receive events of, or None for all rooms
+            kinds: Event kinds to receive, or None for all kinds
+
+        Returns:
+            Subscriber: Its buffer is filled as events arrive, and its
+            wakeup event is set when there is something to send
+        """
+        subscriber = Subscriber(set(rooms) if rooms else None, set(kinds) if kinds else None,
+                                self.buffer_size)
+        for room_id in subscriber.rooms or (None,):
+            self._by_room.setdefault(room_id, set()).add(subscriber)
+        self._count += 1
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        """Remove a subscriber (on the event loop); removing twice is harmless."""
+        removed = False
+        for room_id in subscriber.rooms or (None,):
+            subscribers = self._by_room.get(room_id)
+            if subscribers and subscriber in subscribers:
+                subscribers.discard(subscriber)
+                removed = True
+                if not subscribers:
+                    del self._by_room[room_id]
+        if removed:
+            self._count -= 1
+
+    def _dispatch(self, kind: str, room_id: str, chunk: bytes):
+        """Append an encoded event to the buffers of matching subscribers."""
+        for key in (room_id, None):
+            subscribers = self._by_room.get(key)
+            if not subscribers:
+                continue
+            for subscriber in list(subscribers):
+                if subscriber.kinds is not None and kind not in subscriber.kinds:
+                    continue
+                if len(subscriber.buffer) >= subscriber.max_buffered:
+                    self._evict(subscriber, 'slow consumer')
+                    self.stats['evicted'] += 1
+                    continue
+                subscriber.buffer.append(chunk)
+                subscriber.wakeup.set()
+                self.stats['delivered'] += 1
+
+    def _evict(self, subscriber: Subscriber, reason: str):
+        """Drop a subscriber; its connection is closed by the stream server."""
+        self.unsubscribe(subscriber)
+        subscriber.evicted = reason
+        subscriber.wakeup.set()
+
+    def metrics(self) -> Dict[str, int]:
+        """Return subscriber count and event statistics."""
+        return {'subscribers': self._count, **self.stats}
+
+
+# Broker of this process
+broker = StreamBroker()
@@ -0,0 +1,240 @@
+"""
+SQLite-backed channel between the processes of one deployment.
+
+In supervisor mode, ingestion, the web server and analysis run as separate
+processes. They share the main database for data, and this small SQLite file
+for what the database does not carry:
+
+- events: a durable FIFO of notifications (e.g. "message stored in room X")
+  written by one process and consumed by another; consumed events are
+  deleted, and unconsumed ones survive a restart of either side
+- metrics: the latest metrics snapshot of each process, so /api/metrics in
+  the web process can show every part of the deployment
+- versions: change counters of the cached API data (see response_cache),
+  bumped by the writing processes and checked by the web process
+
+The file uses WAL journaling so producers and the consumer rarely wait on
+each other. Each event kind is meant to have a single consumer process.
+"""
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Tuple
+
+from app.utils.metrics import collect_metrics
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_events_kind ON events (kind, id);
+CREATE TABLE IF NOT EXISTS metrics (
+    process TEXT PRIMARY KEY,
+    data TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS versions (
+    key TEXT PRIMARY KEY,
+    version INTEGER NOT NULL
+);
+"""
+
+
+class LocalChannel:
+    """Event queue, metrics board and change counters shared by local processes."""
+
+    def __init__(self, path: str, timeout: float = 30.0):
+        """
+        Open (and create if needed) the channel file.
+
+        Args:
+            path: Path of the SQLite file
+            timeout: Seconds to wait for a lock held by another process
+        """
+        self.path = path
+        self.timeout = timeout
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._connection = None
+        self._pid = None
+        with self._lock:
+            self._conn.executescript(SCHEMA)
+
+        self.stats = {'published': 0, 'consumed': 0}
+
+    @property
+    def _conn(self) -> sqlite3.Connection:
+        """
+        The connection of this process, shared by its threads (call with the
+        lock held); a process forked after opening the channel (e.g. a
+        gunicorn worker) opens its own.
+        """
+        if self._pid != os.getpid():
+            self._connection = sqlite3.connect(self.path, timeout=self.timeout,
+                                               check_same_thread=False, isolation_level=None)
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("PRAGMA synchronous=NORMAL")
+            self._pid = os.getpid()
+        return self._connection
+
+    def close(self):
+        """Close the channel file."""
+        with self._lock:
+            if self._connection and self._pid == os.getpid():
+                self._connection.close()
+            self._connection = None
+            self._pid = None
+
+    def publish(self, kind: str, payload: Dict[str, Any]):
+        """
+        Append an event.
+
+        Args:
+            kind: Event kind, e.g. 'message_stored'
+            payload: JSON-serializable event data
+        """
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO events (kind, payload, created_at) VALUES (?, ?, ?)",
+                (kind, json.dumps(payload, ensure_ascii=False), time.time())
+            )
+        self.stats['published'] += 1
+
+    def fetch(self, kind: str, limit: int = 500) -> List[Tuple[int, Dict[str, Any]]]:
+        """
+        Return the oldest unconsumed events of a kind without removing them.
+
+        Args:
+            kind: Event kind
+            limit: Maximum number of events
+
+        Returns:
+            list: (event_id, payload) tuples, oldest first
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, payload FROM events WHERE kind = ? ORDER BY id LIMIT ?",
+                (kind, limit)
+            ).fetchall()
+        return [(event_id, json.loads(payload)) for event_id, payload in rows]
+
+    def ack(self, kind: str, last_id: int):
+        """
+        Remove consumed events.
+
+        Args:
+            kind: Event kind
+            last_id: ID of the last consumed event; it and older events are removed
+        """
+        with self._lock:
+            cursor = self._conn.execute(
+                "DELETE FROM events WHERE kind = ? AND id <= ?", (kind, last_id)
+            )
+        self.stats['consumed'] += cursor.rowcount
+
+    def depth(self, kind: str) -> int:
+        """Return the number of unconsumed events of a kind."""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM events WHERE kind = ?", (kind,)
+            ).fetchone()[0]
+
+    async def consume(self, kind: str, handler, poll_interval: float = 1.0,
+                      batch_size: int = 500):
+        """
+        Pass events of a kind to a handler until cancelled.
+
+        Events are acknowledged after the handler returns, so an event is
+        handled at least once even if this process is killed midway.
+
+        Args:
+            kind: Event kind
+            handler: Function called with each payload, on the event loop
+            poll_interval: Seconds between polls when the channel is empty
+            batch_size: Maximum number of events read per poll
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            events = await loop.run_in_executor(None, self.fetch, kind, batch_size)
+            for _, payload in events:
+                try:
+                    handler(payload)
+                except Exception as e:
+                    logger.error(f"Error handling {kind} event: {e}", exc_info=True)
+            if events:
+                await loop.run_in_executor(None, self.ack, kind, events[-1][0])
+            if len(events) < batch_size:
+                await asyncio.sleep(poll_interval)
+
+    def publish_metrics(self, process: str, data: Dict[str, Any]):
+        """
+        Replace the metrics snapshot of a process.
+
+        Args:
+            process: Process name, e.g. 'ingest'
+            data: JSON-serializable metrics
+        """
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO metrics (process, data, updated_at) VALUES (?, ?, ?)",
+                (process, json.dumps(data, ensure_ascii=False, default=str), time.time())
+            )
+
+    async def publish_metrics_forever(self, process: str, interval: float = 10.0):
+        """Publish this process's registered metrics every interval until cancelled."""
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                await loop.run_in_executor(None, self.publish_metrics, process, collect_metrics())
+            except Exception as e:
+                logger.warning(f"Could not publish metrics: {e}")
+            await asyncio.sleep(interval)
+
+    def read_metrics(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Return the latest metrics snapshot of every process.
+
+        Returns:
+            dict: Process name to {'updated_at': ..., 'age_seconds': ..., 'metrics': {...}}
+        """
+        with self._lock:
+            rows = self._conn.execute("SELECT process, data, updated_at FROM metrics").fetchall()
+        now = time.time()
+        return {
+            process: {
+                'updated_at': updated_at,
+                'age_seconds': round(now - updated_at, 1),
+                'metrics': json.loads(data)
+            }
+            for process, data, updated_at in rows
+        }
+
+    def bump_versions(self, keys: List[str]):
+        """Increment the change counters of some keys, in one transaction."""
+        with self._lock:
+            self._conn.executemany(
+                "INSERT INTO versions (key, version) VALUES (?, 1) "
+                "ON CONFLICT (key) DO UPDATE SET version = version + 1",
+                [(key,) for key in keys]
+            )
+
+    def get_versions(self, keys: List[str]) -> Tuple[int, ...]:
+        """Return the change counters of some keys (0 if never bumped)."""
+        with self._lock:
+            rows = dict(self._conn.execute(
+                f"SELECT key, version FROM versions WHERE key IN ({','.join('?' * len(keys))})",
+                list(keys)
+            ).fetchall())
+        return tuple(rows.get(key, 0) for key in keys)
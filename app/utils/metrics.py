@@ -0,0 +1,48 @@
+"""
+Process-wide registry of runtime metrics.
+
+Components register a callable returning a dictionary of their current
+metrics; the web service collects them all for the metrics endpoint. Providers
+are called from the web server thread, so they should only read counters.
+"""
+import logging
+from typing import Any, Callable, Dict
+
+logger = logging.getLogger(__name__)
+
+MetricsProvider = Callable[[], Dict[str, Any]]
+
+_providers: Dict[str, MetricsProvider] = {}
+
+
+def register_metrics(name: str, provider: MetricsProvider):
+    """
+    Register (or replace) a metrics provider.
+
+    Args:
+        name: Section name in the collected metrics
+        provider: Callable returning the section's metrics
+    """
+    _providers[name] = provider
+
+
+def unregister_metrics(name: str):
+    """Remove a metrics provider if it is registered."""
+    _providers.pop(name, None)
+
+
+def collect_metrics() -> Dict[str, Dict[str, Any]]:
+    """
+    Collect the metrics of every registered provider.
+
+    Returns:
+        dict: Section name to metrics; a failing provider reports its error
+    """
+    collected = {}
+    for name, provider in list(_providers.items()):
+        try:
+            collected[name] = provider()
+        except Exception as e:
+            logger.warning(f"Error collecting {name} metrics: {e}")
+            collected[name] = {'error': str(e)}
+    return collected
@@ -0,0 +1,78 @@
+"""
+Token-bucket rate limiters for LLM calls and outbound traffic.
+
+Both limiters implement the bucket as a "next free slot" timestamp (GCRA),
+which needs a single number of state: a caller reserves the next slot and
+sleeps until it arrives, and up to ``burst`` calls may run back to back.
+"""
+import asyncio
+import multiprocessing
+import time
+
+
+class TokenBucket:
+    """In-process token bucket for coroutines on one event loop."""
+
+    def __init__(self, rate: float, burst: int = 1):
+        """
+        Initialize the bucket.
+
+        Args:
+            rate: Sustained number of acquisitions per second
+            burst: Number of acquisitions allowed back to back
+        """
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._next_free = 0.0
+
+    def reserve(self) -> float:
+        """
+        Reserve the next slot without waiting.
+
+        Returns:
+            float: Seconds the caller has to wait before using the slot
+        """
+        now = time.monotonic()
+        interval = 1.0 / self.rate
+        slot = max(self._next_free, now - (self.burst - 1) * interval)
+        self._next_free = slot + interval
+        return max(0.0, slot - now)
+
+    def available(self) -> bool:
+        """Return True if a slot could be used immediately."""
+        interval = 1.0 / self.rate
+        return self._next_free - (self.burst - 1) * interval <= time.monotonic()
+
+    async def acquire(self):
+        """Wait until the caller may proceed."""
+        delay = self.reserve()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+class SharedTokenBucket(TokenBucket):
+    """
+    Token bucket shared by several processes.
+
+    State lives in shared memory, so the bucket must be created in the parent
+    process and handed to workers (e.g. through a pool initializer).
+    """
+
+    def __init__(self, rate: float, burst: int = 1):
+        super().__init__(rate, burst)
+        self._shared_next_free = multiprocessing.Value('d', 0.0, lock=False)
+        self._lock = multiprocessing.Lock()
+
+    def reserve(self) -> float:
+        # time.time() rather than monotonic so all processes share one clock
+        with self._lock:
+            now = time.time()
+            interval = 1.0 / self.rate
+            slot = max(self._shared_next_free.value, now - (self.burst - 1) * interval)
+            self._shared_next_free.value = slot + interval
+        return max(0.0, slot - now)
+
+    def available(self) -> bool:
+        interval = 1.0 / self.rate
+        with self._lock:
+            return self._shared_next_free.value - (self.burst - 1) * interval <= time.time()
@@ -0,0 +1,173 @@
+"""
+Server-side caching of API responses, invalidated by data versions.
+
+Writers bump change counters per kind of data and room (``bump_version``);
+a cached response remembers the counters it was built under and is reused
+until one of them changes, so polling an unchanged room costs no database
+work. ETags are hashes of the response body, so they stay valid across
+restarts and rebuilds that produce the same data.
+
+Counters live in memory, which covers the single-process deployment where
+the bots and the web server share a process. In supervisor mode every
+process switches to the counters of the LocalChannel (``use_versions``), so
+writes by the ingestion and analysis processes reach the web process.
+Writers that report to neither (e.g. backfill.py) are picked up when an
+entry reaches its TTL.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+class VersionCounters:
+    """In-process change counters."""
+
+    def __init__(self):
+        self._versions: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def bump_versions(self, keys: List[str]):
+        """Increment the change counters of some keys."""
+        with self._lock:
+            for key in keys:
+                self._versions[key] = self._versions.get(key, 0) + 1
+
+    def get_versions(self, keys: List[str]) -> Tuple[int, ...]:
+        """Return the change counters of some keys (0 if never bumped)."""
+        return tuple(self._versions.get(key, 0) for key in keys)
+
+
+# Counters of this process; replaced by a LocalChannel in supervisor mode
+_versions = VersionCounters()
+
+
+def use_versions(store):
+    """
+    Keep the change counters somewhere else, e.g. in a LocalChannel shared
+    with the other processes of a supervised deployment.
+
+    Args:
+        store: Object with bump_versions(keys) and get_versions(keys)
+    """
+    global _versions
+    _versions = store
+
+
+def version_keys(kind: str, room_id: Optional[str] = None) -> List[str]:
+    """
+    Return the counter keys of a kind of data, for one room or all rooms.
+
+    Args:
+        kind: 'messages', 'summaries' or 'rooms'
+        room_id: The room, or None for data across all rooms
+    """
+    return [f"{kind}:{room_id}"] if room_id else [kind]
+
+
+def bump_version(kind: str, room_id: Optional[str] = None):
+    """
+    Record a change, invalidating cached responses that include it.
+
+    Args:
+        kind: The kind of data written
+        room_id: The room the data belongs to; views of all rooms are
+            invalidated too
+    """
+    keys = [kind] + ([f"{kind}:{room_id}"] if room_id else [])
+    _versions.bump_versions(keys)
+
+
+def get_versions(keys: Iterable[str]) -> Tuple[int, ...]:
+    """Return the current change counters of some keys."""
+    return _versions.get_versions(list(keys))
+
+
+class CachedResponse:
+    """A response body with its validators."""
+
+    __slots__ = ('body', 'mimetype', 'etag', 'last_modified', 'versions', 'created_at')
+
+    def __init__(self, body: bytes, mimetype: str, etag: str, last_modified: float,
+                 versions: Tuple[int, ...]):
+        self.body = body
+        self.mimetype = mimetype
+        self.etag = etag
+        self.last_modified = last_modified
+        self.versions = versions
+        self.created_at = time.monotonic()
+
+
+class ResponseCache:
+    """LRU cache of responses keyed by endpoint and parameters."""
+
+    def __init__(self, max_entries: int = 500, ttl: float = 60.0):
+        """
+        Initialize the cache.
+
+        Args:
+            max_entries: Maximum number of cached responses
+            ttl: Seconds after which a response is rebuilt even if no change
+                was reported
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, CachedResponse]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'not_modified': 0, 'evictions': 0}
+
+    def get(self, key: str, versions: Tuple[int, ...],
+            min_age: float = 0) -> Optional[CachedResponse]:
+        """
+        Return a cached response still valid for the current versions.
+
+        Args:
+            key: Endpoint and parameters
+            versions: Current counters of the data the response covers
+            min_age: Seconds during which a response is reused even if its
+                data changed, for responses too costly to rebuild per write
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            age = time.monotonic() - entry.created_at if entry is not None else 0
+            if (entry is None or age > self.ttl
+                    or (entry.versions != versions and age >= min_age)):
+                self.stats['misses'] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats['hits'] += 1
+            return entry
+
+    def put(self, key: str, versions: Tuple[int, ...], body: bytes,
+            mimetype: str) -> CachedResponse:
+        """
+        Cache a freshly built response.
+
+        Args:
+            key: Endpoint and parameters
+            versions: Counters read before the response was built
+            body: Response body
+            mimetype: Response content type
+
+        Returns:
+            CachedResponse: The entry, with its ETag and Last-Modified time;
+            a rebuild with an unchanged body keeps the earlier Last-Modified
+        """
+        etag = hashlib.sha1(body).hexdigest()
+        last_modified = time.time()
+        with self._lock:
+            previous = self._entries.get(key)
+            if previous is not None and previous.etag == etag:
+                last_modified = previous.last_modified
+            entry = CachedResponse(body, mimetype, etag, last_modified, versions)
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.stats['evictions'] += 1
+        return entry
+
+    def metrics(self) -> Dict[str, int]:
+        """Return entry count and hit statistics."""
+        return {'entries': len(self._entries), **self.stats}
@@ -0,0 +1,172 @@
+"""
+Conversation segmentation for group chat transcripts.
+
+Splits a room's message stream into threads before summarization, using
+time gaps between messages, @mentions and quote/reply metadata, and batches
+small threads together so each LLM prompt covers related messages only.
+"""
+import re
+from typing import List, Optional, Set, Tuple
+
+from app.models.records import MessageRecord
+
+# WeChat terminates an @mention with a four-per-em space (or a plain space)
+MENTION_PATTERN = re.compile(r'@([^\s @]+)[  ]')
+
+# Quote messages as rendered by the puppet:
+# 「Name：quoted text」
+# - - - - - - - - - - - - - - -
+# reply text
+QUOTE_PATTERN = re.compile(r'^「(?P<name>[^：:」]+)[：:](?P<quoted>.*?)」\s*\n-(?: -)+\s*\n?(?P<reply>.*)$', re.S)
+
+
+def parse_quote(text: str) -> Optional[Tuple[str, str, str]]:
+    """
+    Parse a quote/reply message.
+
+    Args:
+        text: The message text
+
+    Returns:
+        tuple: (quoted sender name, quoted text, reply text) or None if the
+        message is not a quote
+    """
+    if not text or not text.startswith('「'):
+        return None
+
+    match = QUOTE_PATTERN.match(text)
+    if not match:
+        return None
+
+    return match.group('name').strip(), match.group('quoted').strip(), match.group('reply').strip()
+
+
+def extract_mentions(text: str) -> List[str]:
+    """
+    Extract the names @mentioned in a message text.
+
+    Args:
+        text: The message text
+
+    Returns:
+        list: Mentioned names in order of appearance
+    """
+    if not text or '@' not in text:
+        return []
+    return MENTION_PATTERN.findall(text + ' ')
+
+
+def _message_references(message: MessageRecord) -> Set[str]:
+    """Collect the user IDs and names a message replies to or mentions."""
+    content = message.content or ''
+    metadata = message.metadata
+
+    refs = set(extract_mentions(content))
+    refs.update(metadata.get('mention_ids') or [])
+
+    quote_name = metadata.get('quote_name')
+    if not quote_name:
+        quote = parse_quote(content)
+        quote_name = quote[0] if quote else None
+    if quote_name:
+        refs.add(quote_name)
+
+    return refs
+
+
+def segment_messages(messages: List[MessageRecord],
+                     gap_seconds: float = 900,
+                     reply_window_seconds: float = 21600) -> List[List[MessageRecord]]:
+    """
+    Split a room's messages into conversation segments.
+
+    A message that mentions or quotes a participant of a recent segment joins
+    that segment, even across a time gap of up to reply_window_seconds.
+    Otherwise it continues the latest segment unless more than gap_seconds
+    have passed, in which case a new segment starts.
+
+    Args:
+        messages: Message records sorted by creation time
+        gap_seconds: Silence after which a new segment starts
+        reply_window_seconds: How far back replies and mentions may reach
+
+    Returns:
+        list: Segments, each a list of messages in chronological order,
+        ordered by the time of their first message
+    """
+    segments = []
+    # Per segment: last message epoch time and participant IDs and names
+    last_times = []
+    participants = []
+
+    for msg in messages:
+        created_ts = msg.created_ts
+        refs = _message_references(msg)
+        target = None
+
+        # Explicit replies and mentions link to the newest matching segment
+        if refs:
+            for i in range(len(segments) - 1, -1, -1):
+                if created_ts - last_times[i] > reply_window_seconds:
+                    break
+                if refs & participants[i]:
+                    target = i
+                    break
+
+        # Otherwise continue the latest conversation if it is still active
+        if target is None and segments:
+            if created_ts - last_times[-1] <= gap_seconds:
+                target = len(segments) - 1
+
+        if target is None:
+            segments.append([])
+            last_times.append(created_ts)
+            participants.append(set())
+            target = len(segments) - 1
+
+        segments[target].append(msg)
+        last_times[target] = created_ts
+        participants[target].update(p for p in (msg.user_id, msg.user_name) if p)
+
+    return segments
+
+
+def batch_segments(segments: List[List[MessageRecord]],
+                   min_messages: int = 8,
+                   max_messages: int = 80) -> List[List[List[MessageRecord]]]:
+    """
+    Group small consecutive segments so each summary prompt is worthwhile.
+
+    Segments with at least min_messages messages get a batch of their own.
+    Smaller segments are packed together until a batch would exceed
+    max_messages.
+
+    Args:
+        segments: Segments as returned by segment_messages
+        min_messages: Segments smaller than this are batched together
+        max_messages: Maximum number of messages in a batch of small segments
+
+    Returns:
+        list: Batches, each a list of segments
+    """
+    batches = []
+    current = []
+    current_size = 0
+
+    for segment in segments:
+        if len(segment) >= min_messages:
+            batches.append([segment])
+            continue
+
+        if current and current_size + len(segment) > max_messages:
+            batches.append(current)
+            current = []
+            current_size = 0
+
+        current.append(segment)
+        current_size += len(segment)
+
+    if current:
+        batches.append(current)
+
+    return batches
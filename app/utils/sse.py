@@ -0,0 +1,53 @@
+"""
+Server-Sent Events helpers for streaming responses from the web service.
+"""
+import asyncio
+import json
+from typing import Any, AsyncIterator, Iterator, Optional
+
+
+def format_sse(data: Any, event: Optional[str] = None) -> str:
+    """
+    Format one Server-Sent Event.
+
+    Args:
+        data: Event payload; anything but a string is JSON-encoded
+        event: Optional event name
+
+    Returns:
+        str: The event in wire format, terminated by a blank line
+    """
+    if not isinstance(data, str):
+        data = json.dumps(data, ensure_ascii=False)
+
+    lines = [f"event: {event}"] if event else []
+    # Multi-line payloads need one data field per line
+    lines.extend(f"data: {line}" for line in data.split('\n'))
+    return "\n".join(lines) + "\n\n"
+
+
+def iterate_async(agen: AsyncIterator[Any]) -> Iterator[Any]:
+    """
+    Iterate an async generator from synchronous code such as a Flask view.
+
+    The generator runs on a private event loop in the calling thread. If the
+    consumer stops early (e.g. the client disconnected), the generator is
+    closed so it can clean up.
+
+    Args:
+        agen: The async generator to drain
+
+    Yields:
+        The items produced by the generator
+    """
+    loop = asyncio.new_event_loop()
+    try:
+        while True:
+            try:
+                item = loop.run_until_complete(agen.__anext__())
+            except StopAsyncIteration:
+                break
+            yield item
+    finally:
+        loop.run_until_complete(agen.aclose())
+        loop.close()
@@ -0,0 +1,50 @@
+"""
+Tokenization of chat messages for the local text analytics.
+
+CJK runs become overlapping character bigrams (WeChat text is mostly
+unsegmented Chinese) and Latin words are lowercased, with stop words and
+URLs dropped. Shared by the topic engine and the vector index.
+"""
+import re
+from typing import List
+
+# CJK ideograph runs and Latin/digit words
+TOKEN_PATTERN = re.compile(r'[一-鿿]+|[a-zA-Z][a-zA-Z0-9_\-\.]+|\d{3,}')
+URL_PATTERN = re.compile(r'https?://\S+')
+
+# Function characters that do not make a topic on their own
+CJK_STOP_CHARS = set('的了是我你他她它们在有和就不也都吗啊吧呢哈嗯哦这那个一上下来去说要会到对没很还把被给让')
+LATIN_STOP_WORDS = {
+    'the', 'and', 'for', 'you', 'are', 'but', 'not', 'with', 'this', 'that',
+    'have', 'was', 'its', 'can', 'will', 'just', 'from', 'they', 'what', 'ok',
+    'is', 'it', 'to', 'of', 'in', 'on', 'at', 'be', 'my', 'me', 'we', 'do', 'so',
+    'an', 'or', 'if', 'no', 'yes', 'our', 'your', 'all', 'get', 'got'
+}
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Split message text into tokens.
+
+    Args:
+        text: The message text
+
+    Returns:
+        list: Tokens in order of appearance
+    """
+    if not text:
+        return []
+
+    tokens = []
+    for run in TOKEN_PATTERN.findall(URL_PATTERN.sub(' ', text)):
+        if '一' <= run[0] <= '鿿':
+            for i in range(len(run) - 1):
+                bigram = run[i:i + 2]
+                if bigram[0] in CJK_STOP_CHARS and bigram[1] in CJK_STOP_CHARS:
+                    continue
+                tokens.append(bigram)
+        else:
+            word = run.lower().strip('.-')
+            if len(word) > 1 and word not in LATIN_STOP_WORDS:
+                tokens.append(word)
+    return tokens
@@ -0,0 +1,288 @@
+"""
+Local semantic similarity search over message history.
+
+Messages are embedded with signed feature hashing of their tokens into
+fixed-size, L2-normalized float32 vectors, so no embedding model or external
+API is needed and vectors are stable across processes. Vectors are stored in
+one shard per room and month:
+
+    <base_dir>/<room>/<YYYY-MM>.f32   row-major float32 matrix (rows x dim)
+    <base_dir>/<room>/<YYYY-MM>.ids   int64 message IDs, one per row
+
+Shards are append-only and searched by memory-mapping them and scoring every
+row with a matrix-vector product (cosine similarity), which keeps memory use
+flat and needs no training or rebuilds as history grows.
+"""
+import functools
+import heapq
+import json
+import math
+import os
+import re
+import threading
+import zlib
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from app.utils.tokenizer import tokenize
+
+# Rows scored per matrix product, bounding temporary memory during search
+SEARCH_CHUNK_ROWS = 262144
+
+# Recently hashed tokens kept memoized per embedder
+FEATURE_CACHE_SIZE = 65536
+
+SAFE_NAME_PATTERN = re.compile(r'[^\w@.\-]')
+MONTH_PATTERN = re.compile(r'^\d{4}-\d{2}$')
+
+
+class HashedEmbedder:
+    """Embed texts as signed hashed bags of tokens."""
+
+    def __init__(self, dim: int = 256):
+        """
+        Initialize the embedder.
+
+        Args:
+            dim: Vector dimension
+        """
+        self.dim = dim
+        self._feature = functools.lru_cache(maxsize=FEATURE_CACHE_SIZE)(self._hash)
+
+    def _hash(self, token: str) -> Tuple[int, float]:
+        h = zlib.crc32(token.encode('utf-8'))
+        # The top bit picks the sign so collisions cancel out on average
+        return h % self.dim, 1.0 if h & 0x80000000 else -1.0
+
+    def embed(self, text: str) -> np.ndarray:
+        """
+        Embed a single text.
+
+        Args:
+            text: The text to embed
+
+        Returns:
+            ndarray: L2-normalized float32 vector (all zeros if the text has
+            no tokens)
+        """
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for token, count in Counter(tokenize(text)).items():
+            index, sign = self._feature(token)
+            vector[index] += sign * (1.0 + math.log(count))
+
+        norm = float(np.linalg.norm(vector))
+        if norm > 0:
+            vector /= norm
+        return vector
+
+    def embed_many(self, texts: Iterable[str]) -> np.ndarray:
+        """
+        Embed several texts.
+
+        Args:
+            texts: The texts to embed
+
+        Returns:
+            ndarray: Matrix with one row per text
+        """
+        rows = [self.embed(text) for text in texts]
+        if not rows:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        return np.vstack(rows)
+
+
+class VectorIndex:
+    """Append-only, memory-mapped vector shards per room and month."""
+
+    def __init__(self, base_dir: str, dim: int = 256):
+        """
+        Initialize the index.
+
+        Args:
+            base_dir: Directory holding the shards
+            dim: Vector dimension
+        """
+        self.base_dir = base_dir
+        self.dim = dim
+        self.row_bytes = dim * 4
+        self._lock = threading.Lock()
+        # Shard path to ((vector file size, ID file size), vectors memmap, ids
+        # array, mask of rows repeating an earlier row's ID or None)
+        self._maps: Dict[str, Tuple[Tuple[int, int], np.ndarray, np.ndarray, Optional[np.ndarray]]] = {}
+
+    def _room_dir(self, room_id: str) -> str:
+        return os.path.join(self.base_dir, SAFE_NAME_PATTERN.sub('_', room_id))
+
+    def add(self, room_id: str, month: str, ids: np.ndarray, vectors: np.ndarray):
+        """
+        Append vectors to a room-month shard.
+
+        Args:
+            room_id: The ID of the room the vectors belong to
+            month: Month of the messages as YYYY-MM
+            ids: Message IDs, one per row
+            vectors: Matrix of vectors with dim columns
+        """
+        if len(ids) != len(vectors):
+            raise ValueError("Need exactly one message ID per vector")
+        if len(ids) == 0:
+            return
+
+        room_dir = self._room_dir(room_id)
+        os.makedirs(room_dir, exist_ok=True)
+        path = os.path.join(room_dir, month)
+
+        with self._lock:
+            # Drop rows a crash left without their vector or ID, so the new
+            # rows line up in both files
+            rows = self._complete_rows(path)
+            for ext, row_bytes in (('.f32', self.row_bytes), ('.ids', 8)):
+                if os.path.exists(path + ext) and os.path.getsize(path + ext) > rows * row_bytes:
+                    os.truncate(path + ext, rows * row_bytes)
+
+            # Vectors first: readers only trust rows that also have an ID
+            with open(path + '.f32', 'ab') as f:
+                f.write(np.ascontiguousarray(vectors, dtype=np.float32).tobytes())
+            with open(path + '.ids', 'ab') as f:
+                f.write(np.ascontiguousarray(ids, dtype=np.int64).tobytes())
+
+    def _complete_rows(self, path: str) -> int:
+        """Return the number of rows of a shard that have both a vector and an ID."""
+        size = os.path.getsize(path + '.f32') if os.path.exists(path + '.f32') else 0
+        id_size = os.path.getsize(path + '.ids') if os.path.exists(path + '.ids') else 0
+        return min(size // self.row_bytes, id_size // 8)
+
+    def shards(self, room_id: Optional[str] = None,
+               months: Optional[Iterable[str]] = None) -> List[str]:
+        """
+        List shard paths (without extension), optionally filtered.
+
+        Args:
+            room_id: Optional room to restrict to
+            months: Optional months (YYYY-MM) to restrict to
+
+        Returns:
+            list: Shard paths
+        """
+        if not os.path.isdir(self.base_dir):
+            return []
+
+        if room_id:
+            room_dirs = [self._room_dir(room_id)]
+        else:
+            room_dirs = [entry.path for entry in os.scandir(self.base_dir) if entry.is_dir()]
+
+        wanted = set(months) if months else None
+        paths = []
+        for room_dir in room_dirs:
+            if not os.path.isdir(room_dir):
+                continue
+            for name in sorted(os.listdir(room_dir)):
+                month, ext = os.path.splitext(name)
+                if ext == '.f32' and MONTH_PATTERN.match(month) and (wanted is None or month in wanted):
+                    paths.append(os.path.join(room_dir, month))
+        return paths
+
+    def _load(self, path: str) -> Tuple[np.ndarray, np.ndarray, Optional[np.ndarray]]:
+        """
+        Memory-map a shard, reopening it only if it has grown.
+
+        Returns:
+            tuple: Vectors, message IDs, and a mask of the rows repeating an
+            earlier row's ID (messages indexed again after a crash), or None
+        """
+        size = os.path.getsize(path + '.f32')
+        id_size = os.path.getsize(path + '.ids') if os.path.exists(path + '.ids') else 0
+        cached = self._maps.get(path)
+        if cached and cached[0] == (size, id_size):
+            return cached[1], cached[2], cached[3]
+
+        rows = min(size // self.row_bytes, id_size // 8)
+        ids = np.fromfile(path + '.ids', dtype=np.int64, count=rows) if rows else np.zeros(0, np.int64)
+        if rows == 0:
+            vectors = np.zeros((0, self.dim), dtype=np.float32)
+        else:
+            vectors = np.memmap(path + '.f32', dtype=np.float32, mode='r', shape=(rows, self.dim))
+
+        # IDs are appended in ascending order, so only a step back can be a repeat
+        repeated = None
+        if rows > 1 and (np.diff(ids) <= 0).any():
+            _, first = np.unique(ids, return_index=True)
+            repeated = np.ones(rows, dtype=bool)
+            repeated[first] = False
+
+        self._maps[path] = ((size, id_size), vectors, ids, repeated)
+        return vectors, ids, repeated
+
+    def count(self, room_id: Optional[str] = None) -> int:
+        """Return the number of indexed messages."""
+        total = 0
+        for path in self.shards(room_id):
+            _, ids, repeated = self._load(path)
+            total += len(ids) - (int(repeated.sum()) if repeated is not None else 0)
+        return total
+
+    def search(self, query: np.ndarray, top_k: int = 10,
+               room_id: Optional[str] = None,
+               months: Optional[Iterable[str]] = None,
+               exclude_ids: Iterable[int] = ()) -> List[Tuple[int, float]]:
+        """
+        Find the vectors most similar to a query vector.
+
+        Args:
+            query: L2-normalized query vector
+            top_k: Number of results to return
+            room_id: Optional room to restrict the search to
+            months: Optional months (YYYY-MM) to restrict the search to
+            exclude_ids: Message IDs to leave out of the results
+
+        Returns:
+            list: (message ID, cosine similarity) tuples, best first
+        """
+        query = np.asarray(query, dtype=np.float32)
+        exclude = set(exclude_ids)
+        k = top_k + len(exclude)
+
+        # Min-heap of the best (score, id) pairs seen so far
+        best: List[Tuple[float, int]] = []
+        for path in self.shards(room_id, months):
+            vectors, ids, repeated = self._load(path)
+            for start in range(0, len(ids), SEARCH_CHUNK_ROWS):
+                scores = vectors[start:start + SEARCH_CHUNK_ROWS] @ query
+                if repeated is not None:
+                    # Score each message once
+                    scores[repeated[start:start + SEARCH_CHUNK_ROWS]] = -np.inf
+                if len(scores) > k:
+                    top = np.argpartition(-scores, k - 1)[:k]
+                else:
+                    top = np.arange(len(scores))
+                for index in top:
+                    if scores[index] == -np.inf:
+                        continue
+                    item = (float(scores[index]), int(ids[start + index]))
+                    if len(best) < k:
+                        heapq.heappush(best, item)
+                    elif item > best[0]:
+                        heapq.heapreplace(best, item)
+
+        results = [(message_id, score) for score, message_id in sorted(best, reverse=True)
+                   if message_id not in exclude]
+        return results[:top_k]
+
+    def load_state(self) -> Dict[str, int]:
+        """Return the persisted indexing state (e.g. the last indexed message ID)."""
+        try:
+            with open(os.path.join(self.base_dir, 'state.json'), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def save_state(self, state: Dict[str, int]):
+        """Persist the indexing state atomically."""
+        os.makedirs(self.base_dir, exist_ok=True)
+        path = os.path.join(self.base_dir, 'state.json')
+        with open(path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(state, f)
+        os.replace(path + '.tmp', path)
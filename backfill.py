@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Backfill daily summaries for historical messages.
+
+Splits history into per-room, per-day jobs and summarizes them across a
+process pool under a global LLM rate limit. Completed jobs are checkpointed,
+so re-running the command resumes an interrupted backfill.
+
+Usage:
+    python backfill.py --start 2024-01-01 --end 2024-03-31 --workers 8 --rate 5
+"""
+import os
+import argparse
+import asyncio
+import datetime
+import logging
+from dotenv import load_dotenv
+
+# Load environment variables from .env file if it exists
+load_dotenv()
+
+# Import configuration
+try:
+    import config as cfg
+except ImportError:
+    print("Configuration file not found. Please create config.py or config.local.py.")
+    exit(1)
+
+# Configure logging
+log_dir = os.path.dirname(cfg.LOG_FILE)
+if not os.path.exists(log_dir):
+    os.makedirs(log_dir)
+
+logging.basicConfig(
+    level=getattr(logging, cfg.LOG_LEVEL),
+    format='%(asctime)s - %(name)s - %(processName)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.FileHandler(cfg.LOG_FILE),
+        logging.StreamHandler()
+    ]
+)
+logger = logging.getLogger(__name__)
+
+# Import services after logging is configured
+from app.services.backfill_service import BackfillService
+
+def parse_args():
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description="Backfill daily summaries for historical messages.")
+    parser.add_argument('--room', action='append', dest='rooms',
+                        help="Room ID to backfill (repeatable, default: all rooms)")
+    parser.add_argument('--start', type=datetime.date.fromisoformat,
+                        help="First day to backfill (YYYY-MM-DD)")
+    parser.add_argument('--end', type=datetime.date.fromisoformat,
+                        help="Last day to backfill (YYYY-MM-DD, default: yesterday)")
+    parser.add_argument('--workers', type=int, default=cfg.BACKFILL_WORKERS,
+                        help="Number of worker processes")
+    parser.add_argument('--rate', type=float, default=cfg.LLM_RATE_LIMIT,
+                        help="Global LLM calls per second across all workers")
+    parser.add_argument('--burst', type=int, default=cfg.LLM_RATE_BURST,
+                        help="LLM calls allowed back to back")
+    parser.add_argument('--backend', help="LLM backend overriding LLM_BACKEND")
+    parser.add_argument('--checkpoint', default=cfg.BACKFILL_CHECKPOINT,
+                        help="Checkpoint file of completed jobs")
+    parser.add_argument('--no-resume', action='store_true',
+                        help="Ignore the checkpoint and redo every job")
+    parser.add_argument('--no-rollup', action='store_true',
+                        help="Skip rolling daily summaries up into weekly digests")
+    return parser.parse_args()
+
+def main():
+    """Plan and run the backfill."""
+    args = parse_args()
+    service = BackfillService(checkpoint_path=args.checkpoint)
+    
+    jobs = service.plan_jobs(
+        room_ids=args.rooms,
+        start_date=args.start,
+        end_date=args.end,
+        resume=not args.no_resume
+    )
+    if not jobs:
+        logger.info("Nothing to backfill")
+        return
+    
+    stats = service.run(
+        jobs,
+        workers=args.workers,
+        rate_limit=args.rate,
+        burst=args.burst,
+        backend_name=args.backend
+    )
+    logger.info(
+        f"Backfill finished: {stats['completed']}/{stats['jobs']} jobs, "
+        f"{stats['failed']} failed, {stats['messages']} messages in {stats['elapsed']:.1f}s"
+    )
+    
+    if not args.no_rollup:
+        room_ids = sorted({job['room_id'] for job in jobs})
+        created = asyncio.run(service.roll_up(room_ids, rate_limit=args.rate, backend_name=args.backend))
+        logger.info(f"Created {created} roll-up summaries")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,5 @@
+"""
+Offline benchmarks for the WeChat Group Chat Assistant.
+
+Run from the repository root, e.g. ``python -m benchmarks.bench_analysis``.
+"""
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Benchmark analysis throughput and tail latency against the fake LLM backend.
+
+Generates synthetic room traffic in memory, runs it through
+``AiService.analyze_messages`` one room at a time (optionally with several
+rooms in flight) and reports messages per second plus per-room latency
+percentiles. Summaries are written to an in-memory SQLite database so the
+run never touches the network or the configured database.
+
+Usage:
+    python -m benchmarks.bench_analysis --rooms 50 --messages 200 --latency 0.2
+"""
+import argparse
+import asyncio
+import datetime
+import logging
+import random
+import time
+from typing import Dict, List
+
+from app.models.records import MessageRecord
+from app.services.ai_service import AiService
+from app.services.llm_backend import FakeLlmBackend
+from app.services.message_service import MessageService
+from app.utils.helpers import percentile
+
+WORDS = [
+    "release", "deploy", "meeting", "bug", "review", "lunch", "python",
+    "database", "weekend", "deadline", "design", "client", "invoice",
+    "会议", "项目", "上线", "周末", "需求", "测试", "文档"
+]
+
+
+def generate_messages(rooms: int, per_room: int, seed: int = 0) -> Dict[str, List[MessageRecord]]:
+    """Generate synthetic message records grouped by room."""
+    rng = random.Random(seed)
+    start = datetime.datetime(2024, 1, 1, 9, 0, 0)
+    traffic = {}
+    msg_id = 0
+    for r in range(rooms):
+        room_id = f"room-{r}"
+        messages = []
+        for i in range(per_room):
+            msg_id += 1
+            created_at = start + datetime.timedelta(seconds=i * 30 + rng.randint(0, 29))
+            messages.append(MessageRecord(
+                id=msg_id,
+                room_id=room_id,
+                room_topic=f"Bench Group {r}",
+                user_id=f"user-{rng.randint(0, 30)}",
+                user_name=f"User {rng.randint(0, 30)}",
+                message_type='Text',
+                content=" ".join(rng.choice(WORDS) for _ in range(rng.randint(3, 15))),
+                created_ts=created_at.timestamp(),
+                metadata={}
+            ))
+        traffic[room_id] = messages
+    return traffic
+
+
+async def run_benchmark(args: argparse.Namespace) -> None:
+    """Run the analysis benchmark and print a report."""
+    backend = FakeLlmBackend(
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        seed=args.seed
+    )
+    ai_service = AiService(
+        backend=backend,
+        message_service=MessageService(db_url="sqlite://")
+    )
+    traffic = generate_messages(args.rooms, args.messages, args.seed)
+
+    semaphore = asyncio.Semaphore(args.concurrency)
+    latencies = []
+    failures = 0
+
+    async def analyze_room(messages: List[MessageRecord]) -> None:
+        nonlocal failures
+        async with semaphore:
+            started = time.perf_counter()
+            result = await ai_service.analyze_messages(messages)
+            latencies.append(time.perf_counter() - started)
+            if not result or not all(r.get('summary') for r in result.values()):
+                failures += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(analyze_room(msgs) for msgs in traffic.values()))
+    elapsed = time.perf_counter() - started
+
+    total_messages = args.rooms * args.messages
+    print(f"Rooms analyzed:      {args.rooms} ({failures} with failed summaries)")
+    print(f"Messages analyzed:   {total_messages}")
+    print(f"Backend calls:       {backend.call_count} ({backend.error_count} injected errors)")
+    print(f"Elapsed:             {elapsed:.3f}s")
+    print(f"Throughput:          {total_messages / elapsed:.1f} msg/s, {args.rooms / elapsed:.2f} rooms/s")
+    print(f"Room latency p50:    {percentile(latencies, 50) * 1000:.1f} ms")
+    print(f"Room latency p95:    {percentile(latencies, 95) * 1000:.1f} ms")
+    print(f"Room latency p99:    {percentile(latencies, 99) * 1000:.1f} ms")
+    print(f"Room latency max:    {max(latencies) * 1000:.1f} ms")
+
+
+def main():
+    """Parse arguments and run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--rooms', type=int, default=20, help="Number of rooms")
+    parser.add_argument('--messages', type=int, default=200, help="Messages per room")
+    parser.add_argument('--latency', type=float, default=0.05, help="Fake backend latency in seconds")
+    parser.add_argument('--jitter', type=float, default=0.05, help="Fake backend latency jitter in seconds")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Fake backend error probability")
+    parser.add_argument('--concurrency', type=int, default=1, help="Rooms analyzed concurrently")
+    parser.add_argument('--seed', type=int, default=0, help="Random seed")
+    parser.add_argument('--verbose', action='store_true', help="Log analysis errors")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.ERROR if args.verbose else logging.CRITICAL)
+    asyncio.run(run_benchmark(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+Load test of the web API under each serving mode.
+
+Seeds a temporary SQLite database, starts the web server in a separate
+process (``--server development|waitress|gunicorn``, as WEB_SERVER), then
+runs concurrent keep-alive clients against the endpoints for a fixed time
+and reports requests per second and latency percentiles per endpoint.
+
+The clients are threads of this process, so at very high rates the client
+itself becomes the limit; compare modes at the same --clients.
+
+Usage:
+    python -m benchmarks.bench_api --server waitress --threads 8 --clients 32
+    python -m benchmarks.bench_api --server gunicorn --workers 4 --threads 4
+    python -m benchmarks.bench_api --endpoints /api/messages?limit=500 --duration 30
+"""
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, List
+
+import requests
+
+from app.utils.helpers import percentile
+
+DEFAULT_ENDPOINTS = "/api/messages,/api/messages?room_id=room-0,/api/status"
+
+
+def serve(args: argparse.Namespace):
+    """Run the web server on the benchmark database (child process)."""
+    import config as cfg
+    cfg.DB_TYPE = "sqlite"
+    cfg.DB_PATH = args.db
+    cfg.VECTOR_INDEX_DIR = os.path.join(os.path.dirname(args.db), "vectors")
+    cfg.LLM_BACKEND = "fake"
+    cfg.WEB_HOST = "127.0.0.1"
+    cfg.WEB_PORT = args.port
+    cfg.WEB_SERVER = args.server
+    cfg.WEB_WORKERS = args.workers
+    cfg.WEB_THREADS = args.threads
+    cfg.DEBUG = False
+
+    import logging
+    logging.basicConfig(level=logging.WARNING)
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)  # No per-request log lines
+    from app.services.web_service import run_web_server
+    run_web_server()
+
+
+def wait_until_up(base_url: str, process: subprocess.Popen, timeout: float = 60.0):
+    """Wait for the server to answer, failing if it exits."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Server exited with code {process.returncode}")
+        try:
+            requests.get(base_url + "/api/status", timeout=1)
+            return
+        except requests.RequestException:
+            time.sleep(0.2)
+    raise RuntimeError("Server did not start in time")
+
+
+def client(base_url: str, endpoints: List[str], deadline: float, offset: int,
+           latencies: Dict[str, List[float]], errors: Dict[str, int], lock: threading.Lock):
+    """Request the endpoints in turn on one keep-alive connection until the deadline."""
+    session = requests.Session()
+    mine = defaultdict(list)
+    failed = defaultdict(int)
+    i = offset
+    while time.monotonic() < deadline:
+        endpoint = endpoints[i % len(endpoints)]
+        i += 1
+        started = time.perf_counter()
+        try:
+            response = session.get(base_url + endpoint, timeout=30)
+            response.content
+            ok = response.status_code == 200
+        except requests.RequestException:
+            ok = False
+        if ok:
+            mine[endpoint].append(time.perf_counter() - started)
+        else:
+            failed[endpoint] += 1
+    session.close()
+
+    with lock:
+        for endpoint, values in mine.items():
+            latencies[endpoint].extend(values)
+        for endpoint, count in failed.items():
+            errors[endpoint] += count
+
+
+def main():
+    """Parse arguments and run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--server', choices=('development', 'waitress', 'gunicorn'),
+                        default='waitress', help="Serving mode (WEB_SERVER)")
+    parser.add_argument('--workers', type=int, default=2, help="WEB_WORKERS (gunicorn)")
+    parser.add_argument('--threads', type=int, default=8, help="WEB_THREADS")
+    parser.add_argument('--clients', type=int, default=16, help="Concurrent client connections")
+    parser.add_argument('--duration', type=float, default=10.0, help="Seconds of load")
+    parser.add_argument('--warmup', type=float, default=1.0, help="Seconds of load before measuring")
+    parser.add_argument('--endpoints', default=DEFAULT_ENDPOINTS,
+                        help="Comma-separated paths requested in turn")
+    parser.add_argument('--messages', type=int, default=50000, help="Seeded messages")
+    parser.add_argument('--rooms', type=int, default=20, help="Seeded rooms")
+    parser.add_argument('--port', type=int, default=5099, help="Server port")
+    parser.add_argument('--serve', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--db', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args)
+        return
+
+    workdir = tempfile.mkdtemp(prefix="bench_api_")
+    args.db = os.path.join(workdir, "bench.db")
+    server = None
+    try:
+        from app.services.message_service import MessageService
+        from benchmarks.bench_records import seed
+        started = time.perf_counter()
+        seed(MessageService(db_url=f"sqlite:///{args.db}"), args.messages, args.rooms,
+             users=max(1, args.messages // 100), seed=0)
+        print(f"Seeded {args.messages} messages in {args.rooms} rooms in "
+              f"{time.perf_counter() - started:.1f}s")
+
+        command = [sys.executable, "-m", "benchmarks.bench_api", "--serve", "--db", args.db,
+                   "--server", args.server, "--port", str(args.port),
+                   "--workers", str(args.workers), "--threads", str(args.threads)]
+        server = subprocess.Popen(command)
+        base_url = f"http://127.0.0.1:{args.port}"
+        wait_until_up(base_url, server)
+
+        endpoints = [endpoint.strip() for endpoint in args.endpoints.split(',') if endpoint.strip()]
+        lock = threading.Lock()
+        # Warm up, then measure; the results of the last run are reported
+        for duration in (args.warmup, args.duration):
+            latencies, errors = defaultdict(list), defaultdict(int)
+            deadline = time.monotonic() + duration
+            threads = [threading.Thread(target=client, args=(base_url, endpoints, deadline, i,
+                                                             latencies, errors, lock))
+                       for i in range(args.clients)]
+            started = time.perf_counter()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            elapsed = time.perf_counter() - started
+    finally:
+        if server and server.poll() is None:
+            server.terminate()
+            try:
+                server.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                server.kill()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    mode = args.server + (f", {args.workers} workers" if args.server == 'gunicorn' else "")
+    if args.server != 'development':
+        mode += f", {args.threads} threads"
+    total = sum(len(values) for values in latencies.values())
+    print(f"Server:              {mode}")
+    print(f"Clients:             {args.clients} keep-alive connections for {elapsed:.1f}s")
+    print(f"Throughput:          {total / elapsed:.1f} req/s ({sum(errors.values())} errors)")
+    for endpoint in endpoints:
+        values = latencies.get(endpoint, [])
+        if not values:
+            print(f"{endpoint:<32} no successful requests ({errors.get(endpoint, 0)} errors)")
+            continue
+        print(f"{endpoint:<32} {len(values) / elapsed:8.1f} req/s  "
+              f"p50 {percentile(values, 50) * 1000:7.2f} ms  p95 {percentile(values, 95) * 1000:7.2f} ms  "
+              f"p99 {percentile(values, 99) * 1000:7.2f} ms  errors {errors.get(endpoint, 0)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Benchmark streaming room exports against one giant /api/messages response.
+
+Seeds a temporary SQLite database with one room's history, then downloads it
+through the Flask app (test client, reading the streamed body chunk by chunk)
+as JSONL and CSV, plain and gzip-compressed, and once as /api/messages with
+a limit covering the whole room. Each download is timed, then repeated under
+tracemalloc to record the peak Python heap it needed; run with two message
+counts to see that the export peak stays flat while the list grows.
+
+Usage:
+    python -m benchmarks.bench_export --messages 200000
+    python -m benchmarks.bench_export --messages 1000000 --skip-messages-api
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+import tracemalloc
+
+import config as cfg
+
+ROOM_ID = "room-0"
+
+
+def download(client, url: str):
+    """Fetch a URL, consuming the body as it is streamed; return (bytes, chunks)."""
+    response = client.get(url, buffered=False)
+    if response.status_code != 200:
+        raise RuntimeError(f"{url} returned {response.status_code}")
+    size = chunks = 0
+    for chunk in response.response:
+        size += len(chunk)
+        chunks += 1
+    response.close()
+    return size, chunks
+
+
+def measure(client, url: str):
+    """Time a download, then repeat it under tracemalloc; return (seconds, bytes, chunks, peak)."""
+    started = time.perf_counter()
+    size, chunks = download(client, url)
+    elapsed = time.perf_counter() - started
+
+    tracemalloc.start()
+    download(client, url)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, size, chunks, peak
+
+
+def main():
+    """Parse arguments and run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--messages', type=int, default=200000, help="Messages in the exported room")
+    parser.add_argument('--batch-size', type=int, default=2000, help="EXPORT_BATCH_SIZE")
+    parser.add_argument('--chunk-size', type=int, default=65536, help="EXPORT_CHUNK_SIZE")
+    parser.add_argument('--gzip-level', type=int, default=6, help="EXPORT_GZIP_LEVEL")
+    parser.add_argument('--skip-messages-api', action='store_true',
+                        help="Do not time the /api/messages baseline (slow for large rooms)")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench_export_")
+    cfg.DB_TYPE = "sqlite"
+    cfg.DB_PATH = os.path.join(workdir, "bench.db")
+    cfg.VECTOR_INDEX_DIR = os.path.join(workdir, "vectors")
+    cfg.LLM_BACKEND = "fake"
+    cfg.HTTP_CACHE_ENABLED = False  # Time the real /api/messages work
+    cfg.EXPORT_BATCH_SIZE = args.batch_size
+    cfg.EXPORT_CHUNK_SIZE = args.chunk_size
+    cfg.EXPORT_GZIP_LEVEL = args.gzip_level
+
+    try:
+        from app.services.web_service import app, message_service
+        from benchmarks.bench_records import seed
+        started = time.perf_counter()
+        seed(message_service, args.messages, rooms=1, users=max(1, args.messages // 100), seed=0)
+        print(f"Seeded {args.messages} messages in {time.perf_counter() - started:.1f}s")
+
+        client = app.test_client()
+        runs = [
+            ("export jsonl", f"/api/rooms/{ROOM_ID}/export?format=jsonl"),
+            ("export jsonl gzip", f"/api/rooms/{ROOM_ID}/export?format=jsonl&gzip=1"),
+            ("export csv", f"/api/rooms/{ROOM_ID}/export?format=csv"),
+            ("export csv gzip", f"/api/rooms/{ROOM_ID}/export?format=csv&gzip=1"),
+        ]
+        if not args.skip_messages_api:
+            runs.append(("/api/messages", f"/api/messages?room_id={ROOM_ID}&limit={args.messages}"))
+
+        print(f"{'':<20} {'rows/s':>10} {'MB/s out':>9} {'size MB':>8} {'chunks':>7} {'peak heap MB':>13}")
+        for name, url in runs:
+            elapsed, size, chunks, peak = measure(client, url)
+            print(f"{name:<20} {args.messages / elapsed:10.0f} {size / 2 ** 20 / elapsed:9.1f} "
+                  f"{size / 2 ** 20:8.1f} {chunks:7d} {peak / 2 ** 20:13.1f}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
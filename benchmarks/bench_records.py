@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Benchmark the typed-record analysis input path against message dictionaries.
+
+Seeds an in-memory SQLite database, then times one pass over the messages
+for each path:
+
+* DB read: ``get_message_records`` vs ``get_recent_messages`` (dicts built
+  from the records) and, optionally, the original ORM read with per-row room
+  and user lookups
+* Preparation: grouping by room, sorting by time and taking each room's time
+  range, on ISO-string dictionaries vs MessageRecord objects
+
+Usage:
+    python -m benchmarks.bench_records --messages 100000 --rooms 50
+"""
+import argparse
+import datetime
+import json
+import random
+import time
+from typing import Any, Callable, Dict, List
+
+from sqlalchemy import desc
+
+from app.models.database import Message, Room, User
+from app.models.records import group_by_room
+from app.services.message_service import MessageService
+
+
+def seed(service: MessageService, messages: int, rooms: int, users: int, seed: int) -> None:
+    """Insert synthetic rooms, users and messages."""
+    rng = random.Random(seed)
+    start = datetime.datetime(2024, 1, 1)
+    session = service.Session()
+    session.bulk_save_objects([Room(room_id=f"room-{r}", topic=f"Group {r}") for r in range(rooms)])
+    session.bulk_save_objects([User(user_id=f"user-{u}", name=f"User {u}") for u in range(users)])
+    session.bulk_insert_mappings(Message, [{
+        'room_id': f"room-{rng.randrange(rooms)}",
+        'user_id': f"user-{rng.randrange(users)}",
+        'message_type': 'Text',
+        'content': f"message {i} " + "x" * rng.randint(5, 60),
+        'message_metadata': json.dumps({'msg_id': str(i)}),
+        'created_at': start + datetime.timedelta(seconds=rng.randrange(30 * 86400))
+    } for i in range(messages)])
+    session.commit()
+    session.close()
+
+
+def legacy_read(service: MessageService, limit: int) -> List[Dict[str, Any]]:
+    """The original read path: ORM objects plus two lookups per message."""
+    session = service.Session()
+    try:
+        messages = []
+        for msg in session.query(Message).order_by(desc(Message.created_at)).limit(limit).all():
+            room = session.query(Room).filter_by(room_id=msg.room_id).first()
+            user = session.query(User).filter_by(user_id=msg.user_id).first()
+            messages.append({
+                'id': msg.id,
+                'room_id': msg.room_id,
+                'room_topic': room.topic if room else "Unknown",
+                'user_id': msg.user_id,
+                'user_name': user.name if user else "Unknown",
+                'message_type': msg.message_type,
+                'content': msg.content,
+                'metadata': json.loads(msg.message_metadata) if msg.message_metadata else {},
+                'created_at': msg.created_at.isoformat()
+            })
+        return messages
+    finally:
+        session.close()
+
+
+def prepare_dicts(messages: List[Dict[str, Any]]) -> int:
+    """Group, sort and take time ranges the way the dict pipeline did."""
+    room_messages = {}
+    for msg in messages:
+        room_id = msg.get('room_id')
+        if room_id not in room_messages:
+            room_messages[room_id] = []
+        room_messages[room_id].append(msg)
+
+    spans = 0
+    for msgs in room_messages.values():
+        ordered = sorted(msgs, key=lambda x: datetime.datetime.fromisoformat(x.get('created_at', '')))
+        start_time = datetime.datetime.fromisoformat(ordered[0].get('created_at', ''))
+        end_time = datetime.datetime.fromisoformat(ordered[-1].get('created_at', ''))
+        spans += (end_time - start_time).total_seconds() > 0
+    return spans
+
+
+def prepare_records(records) -> int:
+    """Group, sort and take time ranges on typed records."""
+    spans = 0
+    for ordered in group_by_room(records).values():
+        spans += ordered[-1].created_ts - ordered[0].created_ts > 0
+    return spans
+
+
+def timed(label: str, fn: Callable[[], Any], count: int) -> Any:
+    """Run fn once and print its duration and rate."""
+    started = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - started
+    print(f"{label:<34} {elapsed * 1000:9.1f} ms  {count / elapsed:12.0f} msg/s")
+    return result
+
+
+def main():
+    """Parse arguments and run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--messages', type=int, default=100000, help="Messages per pass")
+    parser.add_argument('--rooms', type=int, default=50, help="Number of rooms")
+    parser.add_argument('--users', type=int, default=500, help="Number of users")
+    parser.add_argument('--seed', type=int, default=0, help="Random seed")
+    parser.add_argument('--legacy-read', action='store_true',
+                        help="Also time the original per-row lookup read (slow)")
+    args = parser.parse_args()
+
+    service = MessageService(db_url="sqlite://")
+    seed(service, args.messages, args.rooms, args.users, args.seed)
+    n = args.messages
+
+    print(f"{n} messages in {args.rooms} rooms")
+    if args.legacy_read:
+        timed("DB read: ORM + per-row lookups", lambda: legacy_read(service, n), n)
+    dicts = timed("DB read: dicts", lambda: service.get_recent_messages(limit=n), n)
+    records = timed("DB read: records", lambda: service.get_message_records(limit=n), n)
+    timed("Prepare: dicts (fromisoformat)", lambda: prepare_dicts(dicts), n)
+    timed("Prepare: records (epoch ts)", lambda: prepare_records(records), n)
+
+
+if __name__ == "__main__":
+    main()
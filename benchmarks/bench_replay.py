@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+"""
+End-to-end ingestion benchmark driving the message handlers with a fake puppet.
+
+Replays a recorded ``messages.json`` or synthetic traffic (see
+``benchmarks.fake_puppet``) through ``WechatyService._on_message`` or
+``TerminalBot._on_message`` without a WeChat connection, then reports ingest
+throughput, per-stage latency percentiles and memory. The app target stores
+into a temporary SQLite database through the real ingestion queue; the bot is
+never started, so no puppet or LLM is contacted.
+
+Stages (app target):
+    handler   the message event handler (filter, dedup, enqueue)
+    queue     wait in the ingestion queue (last 1000 messages)
+    store     database write on an ingestion worker
+    end2end   receipt in the handler to stored
+    command   command receipt to reply sent (includes outbound pacing)
+
+Usage:
+    python -m benchmarks.bench_replay --messages 20000 --rate 2000 --shape bursty
+    python -m benchmarks.bench_replay --replay data/messages.json --speed 0
+    python -m benchmarks.bench_replay --target terminal --messages 20000
+"""
+import argparse
+import asyncio
+import logging
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List
+
+from app.utils.helpers import percentile
+from benchmarks.fake_puppet import (
+    BURST_SHAPES, load_recorded, replay, rooms_of, synthetic_traffic
+)
+
+BOT_ID = "bench-bot"
+BOT_NAME = "Bench Bot"
+
+
+def timed_async(fn: Callable, samples: List[float]) -> Callable:
+    """Wrap a coroutine function, recording each call's duration."""
+    async def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return await fn(*args, **kwargs)
+        finally:
+            samples.append(time.perf_counter() - started)
+    return wrapper
+
+
+def timed_sync(fn: Callable, samples: List[float]) -> Callable:
+    """Wrap a function, recording each call's duration (thread-safe append)."""
+    def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            samples.append(time.perf_counter() - started)
+    return wrapper
+
+
+async def run_app(args: argparse.Namespace, events, workdir: str) -> Dict[str, Any]:
+    """Drive WechatyService with the events and return the results."""
+    import config as cfg
+    # Keep everything local and offline
+    cfg.DB_TYPE = "sqlite"
+    cfg.DB_PATH = os.path.join(workdir, "bench.db")
+    cfg.VECTOR_INDEX_DIR = os.path.join(workdir, "vectors")
+    cfg.INGEST_SPILL_FILE = os.path.join(workdir, "spill.jsonl")
+    cfg.LLM_BACKEND = "fake"
+    cfg.ANALYSIS_MODE = "interval"
+    cfg.MONITORED_GROUPS = []
+    cfg.WECHATY_ACCOUNTS = []
+    cfg.DEDUP_ENABLED = not args.no_dedup
+    cfg.INGEST_QUEUE_SIZE = args.queue_size
+    cfg.INGEST_WORKERS = args.workers
+    cfg.INGEST_OVERFLOW = args.overflow
+
+    from app.services.wechaty_service import WechatyService
+
+    service = WechatyService()
+    service.self_id = BOT_ID
+    service.self_name = BOT_NAME
+
+    # What login would do, without the puppet
+    rooms = rooms_of(events)
+    await service.room_cache.warm(rooms, members=False)
+    for room in rooms:
+        service.outbound.remember_room(room)
+
+    samples = {'handler': [], 'store': [], 'end2end': []}
+    queue = service.ingest_queue
+    queue.store = timed_sync(queue.store, samples['store'])
+    on_stored = queue.on_stored
+
+    def stored(item):
+        samples['end2end'].append(time.time() - item['received_at'])
+        on_stored(item)
+    queue.on_stored = stored
+
+    await queue.start()
+    await service.command_lane.start()
+
+    started = time.perf_counter()
+    emitted = await replay(events, timed_async(service._on_message, samples['handler']), args.speed)
+    await queue.stop(timeout=3600)
+    elapsed = time.perf_counter() - started
+    await service.command_lane.stop()
+    await service.outbound.stop(timeout=5)
+
+    metrics = queue.metrics()
+    commands = service.command_lane.metrics()
+    return {
+        'samples': samples,
+        'elapsed': elapsed,
+        'emitted': emitted,
+        'stored': metrics['stored'],
+        'lines': [
+            f"Ingest queue:        max depth {metrics['max_depth']}, "
+            f"{metrics['dropped']} dropped, {metrics['spilled']} spilled, {metrics['failed']} failed",
+            f"Queue wait:          p50 {metrics['wait_ms_p50']:.2f} ms  p95 {metrics['wait_ms_p95']:.2f} ms  "
+            f"max {metrics['wait_ms_max']:.2f} ms",
+            f"Duplicates:          {service.duplicate_detector.stats if service.duplicate_detector else 'off'}",
+            f"Commands:            {commands['completed']} answered, p50 {commands['latency_ms_p50']:.1f} ms  "
+            f"p95 {commands['latency_ms_p95']:.1f} ms",
+            f"Filtered rooms:      {service.ingest_stats['dropped']}",
+        ]
+    }
+
+
+async def run_terminal(args: argparse.Namespace, events, workdir: str) -> Dict[str, Any]:
+    """Drive TerminalBot with the events and return the results."""
+    # The terminal bot reads its own config module from its directory
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "terminal_bot"))
+    sys.modules.pop('config', None)
+    import config as tcfg
+    tcfg.DATA_DIR = workdir
+    tcfg.MESSAGE_FILE = os.path.join(workdir, "messages.json")
+    tcfg.BACKUP_DIR = os.path.join(workdir, "backups")
+    tcfg.LOG_FILE = None
+    import wechat_bot
+
+    bot = wechat_bot.TerminalBot()
+    bot.self_name = BOT_NAME
+    for room in rooms_of(events):
+        bot.room_topics[room.room_id] = await room.topic()
+
+    samples = {'handler': [], 'command': []}
+    bot._handle_command = timed_async(bot._handle_command, samples['command'])
+    bot.command_tasks = [asyncio.ensure_future(bot._command_worker())
+                         for _ in range(tcfg.COMMAND_WORKERS)]
+
+    started = time.perf_counter()
+    emitted = await replay(events, timed_async(bot._on_message, samples['handler']), args.speed)
+    await bot.command_queue.join()
+    elapsed = time.perf_counter() - started
+    for task in bot.command_tasks:
+        task.cancel()
+
+    return {
+        'samples': samples,
+        'elapsed': elapsed,
+        'emitted': emitted,
+        'stored': len(bot.messages),
+        'lines': [f"Messages in memory:  {len(bot.messages)} (max {tcfg.MAX_MESSAGES_IN_MEMORY} kept on load)"]
+    }
+
+
+def print_stage(name: str, values: List[float]):
+    """Print latency percentiles of one stage."""
+    if not values:
+        return
+    print(f"{name:<9} n={len(values):<8} p50 {percentile(values, 50) * 1000:8.2f} ms  "
+          f"p95 {percentile(values, 95) * 1000:8.2f} ms  p99 {percentile(values, 99) * 1000:8.2f} ms  "
+          f"max {max(values) * 1000:8.2f} ms")
+
+
+def main():
+    """Parse arguments and run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--target', choices=('app', 'terminal'), default='app',
+                        help="Handler to drive")
+    parser.add_argument('--replay', help="Recorded messages.json to replay instead of synthetic traffic")
+    parser.add_argument('--speed', type=float, default=1.0,
+                        help="Replay speed multiplier (0 = as fast as possible)")
+    parser.add_argument('--rooms', type=int, default=20, help="Synthetic rooms")
+    parser.add_argument('--senders', type=int, default=200, help="Synthetic senders")
+    parser.add_argument('--messages', type=int, default=10000, help="Synthetic messages")
+    parser.add_argument('--rate', type=float, default=1000.0, help="Average synthetic messages per second")
+    parser.add_argument('--shape', choices=BURST_SHAPES, default='steady', help="Arrival pattern")
+    parser.add_argument('--burst-factor', type=float, default=10.0, help="Rate multiplier inside bursts")
+    parser.add_argument('--burst-period', type=float, default=5.0, help="Seconds between burst starts")
+    parser.add_argument('--burst-duty', type=float, default=0.1, help="Fraction of each period in a burst")
+    parser.add_argument('--commands', type=float, default=0.001, help="Fraction of command messages")
+    parser.add_argument('--duplicates', type=float, default=0.02, help="Fraction of repeated messages")
+    parser.add_argument('--room-latency', type=float, default=0.0, help="Simulated puppet latency (s)")
+    parser.add_argument('--queue-size', type=int, default=10000, help="INGEST_QUEUE_SIZE (app)")
+    parser.add_argument('--workers', type=int, default=4, help="INGEST_WORKERS (app)")
+    parser.add_argument('--overflow', default='block', help="INGEST_OVERFLOW (app)")
+    parser.add_argument('--no-dedup', action='store_true', help="Disable duplicate detection (app)")
+    parser.add_argument('--seed', type=int, default=0, help="Random seed")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.CRITICAL)
+
+    if args.replay:
+        events = load_recorded(args.replay, args.room_latency)
+    else:
+        events = synthetic_traffic(
+            rooms=args.rooms, senders=args.senders, messages=args.messages, rate=args.rate,
+            shape=args.shape, burst_factor=args.burst_factor, burst_period=args.burst_period,
+            burst_duty=args.burst_duty, command_ratio=args.commands,
+            duplicate_ratio=args.duplicates, bot_id=BOT_ID,
+            room_latency=args.room_latency, seed=args.seed
+        )
+    if not events:
+        print("No group messages to replay")
+        return
+
+    workdir = tempfile.mkdtemp(prefix="bench_replay_")
+    tracemalloc.start()
+    try:
+        run = run_app if args.target == 'app' else run_terminal
+        result = asyncio.run(run(args, events, workdir))
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    maxrss_mb = maxrss / (1024 * 1024) if sys.platform == 'darwin' else maxrss / 1024
+
+    n = len(events)
+    source = args.replay or f"synthetic {args.shape}, {args.rooms} rooms, {args.rate:g} msg/s offered"
+    print(f"Target:              {args.target}")
+    print(f"Traffic:             {n} messages ({source})")
+    print(f"Emitted in:          {result['emitted']:.3f}s")
+    print(f"Ingested in:         {result['elapsed']:.3f}s ({result['stored']} stored)")
+    print(f"Throughput:          {result['stored'] / result['elapsed']:.1f} msg/s")
+    for line in result['lines']:
+        print(line)
+    print(f"Python heap:         {current / 2 ** 20:.1f} MB now, {peak / 2 ** 20:.1f} MB peak (tracemalloc)")
+    print(f"Max RSS:             {maxrss_mb:.1f} MB")
+    for name, values in result['samples'].items():
+        print_stage(name, values)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Benchmark similarity search query latency over millions of vectors.
+
+Fills a temporary vector index with random unit vectors spread over room and
+month shards (writing directly, since embedding millions of messages is not
+what is being measured), then times queries embedded from real text across
+all shards, within one room, and within one month.
+
+Usage:
+    python -m benchmarks.bench_vectors --vectors 2000000 --rooms 50 --months 12
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+from app.utils.helpers import percentile
+from app.utils.vector_index import HashedEmbedder, VectorIndex
+
+QUERIES = [
+    "明天下午开会讨论需求", "测试环境又挂了", "有人知道怎么报销吗",
+    "please review my pull request", "周末一起去爬山", "deploy the release tonight",
+]
+
+
+def build(index: VectorIndex, vectors: int, rooms: int, months: int, seed: int):
+    """Write random unit vectors into rooms x months shards."""
+    rng = np.random.default_rng(seed)
+    shards = [(f"room-{r}", f"2024-{m + 1:02d}") for r in range(rooms) for m in range(months)]
+    per_shard = vectors // len(shards)
+    next_id = 1
+    for room_id, month in shards:
+        block = rng.standard_normal((per_shard, index.dim), dtype=np.float32)
+        block /= np.linalg.norm(block, axis=1, keepdims=True)
+        ids = np.arange(next_id, next_id + per_shard, dtype=np.int64)
+        index.add(room_id, month, ids, block)
+        next_id += per_shard
+    return next_id - 1
+
+
+def timed_queries(label: str, search, embedder: HashedEmbedder, repeat: int):
+    """Run every query repeat times and print latency percentiles."""
+    latencies = []
+    for _ in range(repeat):
+        for text in QUERIES:
+            query = embedder.embed(text)
+            started = time.perf_counter()
+            search(query)
+            latencies.append(time.perf_counter() - started)
+
+    print(f"{label:<22} p50={percentile(latencies, 50) * 1000:8.1f} ms  "
+          f"p95={percentile(latencies, 95) * 1000:8.1f} ms  "
+          f"max={max(latencies) * 1000:8.1f} ms")
+
+
+def main():
+    """Parse arguments and run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--vectors', type=int, default=2000000, help="Total vectors indexed")
+    parser.add_argument('--rooms', type=int, default=50, help="Number of rooms")
+    parser.add_argument('--months', type=int, default=12, help="Months per room")
+    parser.add_argument('--dim', type=int, default=256, help="Vector dimension")
+    parser.add_argument('--top-k', type=int, default=10, help="Results per query")
+    parser.add_argument('--repeat', type=int, default=5, help="Passes over the query set")
+    parser.add_argument('--seed', type=int, default=0, help="Random seed")
+    parser.add_argument('--dir', help="Index directory (default: a temporary directory)")
+    args = parser.parse_args()
+
+    base_dir = args.dir or tempfile.mkdtemp(prefix="bench_vectors_")
+    try:
+        index = VectorIndex(base_dir, args.dim)
+        embedder = HashedEmbedder(args.dim)
+
+        started = time.perf_counter()
+        total = build(index, args.vectors, args.rooms, args.months, args.seed)
+        elapsed = time.perf_counter() - started
+        size = sum(os.path.getsize(os.path.join(root, name))
+                   for root, _, names in os.walk(base_dir) for name in names)
+        print(f"Indexed {total} vectors (dim {args.dim}) in {elapsed:.1f}s, "
+              f"{size / 2 ** 20:.0f} MiB on disk, {args.rooms * args.months} shards")
+
+        # The first query maps every shard and pulls it into the page cache
+        started = time.perf_counter()
+        index.search(embedder.embed(QUERIES[0]), top_k=args.top_k)
+        print(f"{'cold, all shards':<22} {(time.perf_counter() - started) * 1000:8.1f} ms")
+
+        timed_queries("all shards", lambda q: index.search(q, top_k=args.top_k),
+                      embedder, args.repeat)
+        timed_queries("one room", lambda q: index.search(q, top_k=args.top_k, room_id="room-0"),
+                      embedder, args.repeat)
+        timed_queries("one month", lambda q: index.search(q, top_k=args.top_k, months=["2024-01"]),
+                      embedder, args.repeat)
+    finally:
+        if not args.dir:
+            shutil.rmtree(base_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
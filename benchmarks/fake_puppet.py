@@ -0,0 +1,270 @@
+"""
+Fake puppet objects and traffic sources for offline end-to-end benchmarks.
+
+The fake Contact, Room and Message classes implement the parts of the
+python-wechaty API the message handlers use, so ``WechatyService`` and
+``TerminalBot`` handlers can be driven without a WeChat connection. Traffic
+comes from a recorded ``messages.json`` (as written by the terminal bot) or
+from a synthetic generator with configurable rooms, senders, rate and burst
+shape. This module imports nothing from the application, so it works with
+either bot's configuration on the path.
+"""
+import asyncio
+import datetime
+import json
+import random
+import time
+from typing import Awaitable, Callable, List, Optional, Tuple
+
+WORDS = [
+    "release", "deploy", "meeting", "bug", "review", "lunch", "python",
+    "database", "weekend", "deadline", "design", "client", "invoice",
+    "会议", "项目", "上线", "周末", "需求", "测试", "文档"
+]
+
+BURST_SHAPES = ('steady', 'poisson', 'bursty')
+
+
+class FakeContact:
+    """A WeChat contact."""
+
+    def __init__(self, contact_id: str, name: str):
+        self.contact_id = contact_id
+        self.name = name
+        self.said: List[Tuple[float, str]] = []
+
+    async def say(self, text: str):
+        self.said.append((time.perf_counter(), text))
+
+
+class FakeRoom:
+    """A WeChat group; replies are recorded with the time they were sent."""
+
+    def __init__(self, room_id: str, topic: str, members: int = 50, latency: float = 0.0):
+        self.room_id = room_id
+        self._topic = topic
+        self._members = [FakeContact(f"{room_id}-member-{i}", f"Member {i}") for i in range(members)]
+        # Simulated puppet round trip for topic and member lookups
+        self.latency = latency
+        self.said: List[Tuple[float, str]] = []
+
+    async def topic(self) -> str:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return self._topic
+
+    async def member_list(self) -> List[FakeContact]:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return self._members
+
+    async def say(self, text: str):
+        self.said.append((time.perf_counter(), text))
+
+
+class FakePayload:
+    """The raw message payload fields read by the handlers."""
+
+    __slots__ = ('timestamp', 'mention_ids')
+
+    def __init__(self, timestamp: float, mention_ids: Optional[List[str]] = None):
+        self.timestamp = timestamp
+        self.mention_ids = mention_ids or []
+
+
+class FakeMessage:
+    """A received message."""
+
+    __slots__ = ('message_id', '_text', '_talker', '_room', 'payload', 'sent_at')
+
+    def __init__(self, message_id: str, text: str, talker: FakeContact,
+                 room: Optional[FakeRoom], timestamp: float,
+                 mention_ids: Optional[List[str]] = None):
+        self.message_id = message_id
+        self._text = text
+        self._talker = talker
+        self._room = room
+        self.payload = FakePayload(timestamp, mention_ids)
+        # perf_counter time the event was emitted, set by the replayer
+        self.sent_at = 0.0
+
+    def text(self) -> str:
+        return self._text
+
+    def talker(self) -> FakeContact:
+        return self._talker
+
+    def room(self) -> Optional[FakeRoom]:
+        return self._room
+
+    def type(self) -> str:
+        return "MessageType.MESSAGE_TYPE_TEXT"
+
+
+# An event is (seconds after the start of the replay, message)
+Event = Tuple[float, FakeMessage]
+
+
+def load_recorded(path: str, room_latency: float = 0.0) -> List[Event]:
+    """
+    Load a recorded messages.json (the terminal bot's format) as events.
+
+    Args:
+        path: Path of the JSON file
+        room_latency: Simulated puppet latency of the rooms
+
+    Returns:
+        list: Events in recorded order, offsets taken from the timestamps
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        records = json.load(f)
+
+    rooms, contacts, events = {}, {}, []
+    start = None
+    for i, record in enumerate(records):
+        room_id = record.get('room_id')
+        if not room_id:
+            continue  # Private chats are not ingested
+        room = rooms.get(room_id)
+        if room is None:
+            room = rooms[room_id] = FakeRoom(room_id, record.get('room') or room_id, latency=room_latency)
+        sender_id = record.get('sender_id') or record.get('sender') or 'unknown'
+        contact = contacts.get(sender_id)
+        if contact is None:
+            contact = contacts[sender_id] = FakeContact(sender_id, record.get('sender') or sender_id)
+
+        try:
+            ts = datetime.datetime.strptime(record['timestamp'], "%Y-%m-%d %H:%M:%S").timestamp()
+        except (KeyError, ValueError):
+            ts = (start or 0.0) + i
+        if start is None:
+            start = ts
+        events.append((max(0.0, ts - start),
+                       FakeMessage(f"rec-{i}", record.get('content') or '', contact, room, ts)))
+
+    events.sort(key=lambda event: event[0])
+    return events
+
+
+def synthetic_traffic(rooms: int = 20, senders: int = 200, messages: int = 10000,
+                      rate: float = 500.0, shape: str = 'steady',
+                      burst_factor: float = 10.0, burst_period: float = 5.0,
+                      burst_duty: float = 0.1, command_ratio: float = 0.0,
+                      duplicate_ratio: float = 0.0, bot_id: Optional[str] = None,
+                      room_latency: float = 0.0, seed: int = 0) -> List[Event]:
+    """
+    Generate synthetic group traffic.
+
+    Args:
+        rooms: Number of rooms
+        senders: Number of distinct senders spread over the rooms
+        messages: Number of messages
+        rate: Average messages per second
+        shape: 'steady' (even spacing), 'poisson' (random arrivals) or
+            'bursty' (burst_factor times the base rate for burst_duty of
+            every burst_period seconds, quieter in between)
+        burst_factor: Rate multiplier inside a burst
+        burst_period: Seconds between burst starts
+        burst_duty: Fraction of each period spent bursting
+        command_ratio: Fraction of messages that are bot commands or mentions
+        duplicate_ratio: Fraction of messages repeating a recent message
+        bot_id: Contact ID of the bot, used for @-mentions
+        room_latency: Simulated puppet latency of the rooms
+        seed: Random seed
+
+    Returns:
+        list: Events ordered by offset
+    """
+    if shape not in BURST_SHAPES:
+        raise ValueError(f"Unknown burst shape: {shape}")
+
+    rng = random.Random(seed)
+    room_list = [FakeRoom(f"room-{r}", f"Bench Group {r}", latency=room_latency) for r in range(rooms)]
+    contacts = [FakeContact(f"user-{s}", f"User {s}") for s in range(senders)]
+    # Low rate during quiet phases so the average stays at `rate`
+    quiet = max(0.0, (1 - burst_factor * burst_duty) / (1 - burst_duty)) if shape == 'bursty' else 1.0
+
+    events = []
+    recent: List[str] = []
+    offset = 0.0
+    now = time.time()
+    for i in range(messages):
+        if shape == 'steady':
+            offset = i / rate
+        elif shape == 'poisson':
+            offset += rng.expovariate(rate)
+        else:
+            bursting = (offset % burst_period) < burst_period * burst_duty
+            current = rate * (burst_factor if bursting else max(quiet, 0.05))
+            offset += 1.0 / current
+
+        room = room_list[rng.randrange(rooms)]
+        sender = contacts[rng.randrange(senders)]
+        mention_ids = None
+        roll = rng.random()
+        if roll < command_ratio:
+            if bot_id and rng.random() < 0.5:
+                text = "@Bench Bot summary"
+                mention_ids = [bot_id]
+            else:
+                text = rng.choice(["/help", "/summary", "/keywords"])
+        elif roll < command_ratio + duplicate_ratio and recent:
+            text = rng.choice(recent)
+        else:
+            text = " ".join(rng.choice(WORDS) for _ in range(rng.randint(3, 15)))
+            recent.append(text)
+            if len(recent) > 50:
+                recent.pop(0)
+
+        events.append((offset, FakeMessage(f"syn-{i}", text, sender, room, now + offset, mention_ids)))
+    return events
+
+
+def rooms_of(events: List[Event]) -> List[FakeRoom]:
+    """Return the distinct rooms of some events."""
+    seen = {}
+    for _, message in events:
+        room = message.room()
+        if room is not None and room.room_id not in seen:
+            seen[room.room_id] = room
+    return list(seen.values())
+
+
+async def replay(events: List[Event], handler: Callable[[FakeMessage], Awaitable[None]],
+                 speed: float = 1.0) -> float:
+    """
+    Emit events to a message handler, as the puppet's event emitter would.
+
+    Each event is handled in its own task, like the Wechaty event emitter
+    does, so a slow handler does not delay later events.
+
+    Args:
+        events: Events to emit
+        handler: Async message handler
+        speed: Replay speed multiplier; 0 emits as fast as possible
+
+    Returns:
+        float: Seconds spent emitting (before the handlers finished)
+    """
+    loop = asyncio.get_running_loop()
+    tasks = set()
+    started = time.perf_counter()
+
+    for i, (offset, message) in enumerate(events):
+        if speed > 0:
+            delay = offset / speed - (time.perf_counter() - started)
+            if delay > 0:
+                await asyncio.sleep(delay)
+        elif i % 256 == 0:
+            await asyncio.sleep(0)  # Let handlers run between batches
+
+        message.sent_at = time.perf_counter()
+        task = loop.create_task(handler(message))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+
+    emitted = time.perf_counter() - started
+    if tasks:
+        await asyncio.gather(*tasks)
+    return emitted
+
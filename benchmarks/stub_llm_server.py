@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Local OpenAI-compatible stub server backed by the fake LLM backend.
+
+Serves ``POST /v1/chat/completions`` with deterministic replies so the
+``openai_compatible`` backend can be exercised end to end, including the
+HTTP client and streamed responses, without network access. Point the app
+at it with::
+
+    LLM_BACKEND = "openai_compatible"
+    LLM_API_BASE = "http://127.0.0.1:8001/v1"
+
+Usage:
+    python -m benchmarks.stub_llm_server --port 8001 --latency 0.2
+"""
+import argparse
+import json
+import logging
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from app.services.llm_backend import render_fake_completion, split_stream_pieces
+
+logger = logging.getLogger(__name__)
+
+
+class StubLlmHandler(BaseHTTPRequestHandler):
+    """Request handler answering chat completion requests."""
+
+    # Set by make_server
+    latency = 0.0
+    jitter = 0.0
+    error_rate = 0.0
+    rng = random.Random(0)
+    rng_lock = threading.Lock()
+
+    def do_POST(self):
+        """Handle a chat completion request."""
+        if not self.path.rstrip('/').endswith('/chat/completions'):
+            self._send_json(404, {'error': {'message': f"Unknown path {self.path}"}})
+            return
+
+        length = int(self.headers.get('Content-Length', 0))
+        try:
+            body = json.loads(self.rfile.read(length) or b'{}')
+        except ValueError:
+            self._send_json(400, {'error': {'message': "Invalid JSON body"}})
+            return
+
+        prompt = "\n".join(m.get('content', '') for m in body.get('messages', []))
+        max_tokens = body.get('max_tokens', 500)
+
+        with self.rng_lock:
+            delay = self.latency + (self.rng.uniform(0, self.jitter) if self.jitter else 0.0)
+            fail = self.error_rate > 0 and self.rng.random() < self.error_rate
+
+        if body.get('stream') and not fail:
+            self._send_stream(body, render_fake_completion(prompt, max_tokens), delay)
+            return
+
+        time.sleep(delay)
+        if fail:
+            self._send_json(500, {'error': {'message': "Injected stub server error"}})
+            return
+
+        content = render_fake_completion(prompt, max_tokens)
+        self._send_json(200, {
+            'id': 'chatcmpl-stub',
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': body.get('model', 'stub'),
+            'choices': [{
+                'index': 0,
+                'message': {'role': 'assistant', 'content': content},
+                'finish_reason': 'stop'
+            }],
+            'usage': {'prompt_tokens': len(prompt.split()), 'completion_tokens': len(content.split()),
+                      'total_tokens': len(prompt.split()) + len(content.split())}
+        })
+
+    def _send_stream(self, body: dict, content: str, delay: float):
+        """Send a completion as server-sent chunks spread over the delay."""
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.end_headers()
+
+        pieces = split_stream_pieces(content)
+        for i, piece in enumerate(pieces):
+            time.sleep(delay / len(pieces))
+            chunk = {
+                'id': 'chatcmpl-stub',
+                'object': 'chat.completion.chunk',
+                'created': int(time.time()),
+                'model': body.get('model', 'stub'),
+                'choices': [{
+                    'index': 0,
+                    'delta': {'role': 'assistant', 'content': piece} if i == 0 else {'content': piece},
+                    'finish_reason': 'stop' if i == len(pieces) - 1 else None
+                }]
+            }
+            self.wfile.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode('utf-8'))
+            self.wfile.flush()
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+        # Without a Content-Length the client reads until the connection closes
+        self.close_connection = True
+
+    def _send_json(self, status: int, payload: dict):
+        data = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+
+def make_server(host: str, port: int, latency: float = 0.0, jitter: float = 0.0,
+                error_rate: float = 0.0, seed: int = 0) -> ThreadingHTTPServer:
+    """Create a stub server bound to host and port."""
+    StubLlmHandler.latency = latency
+    StubLlmHandler.jitter = jitter
+    StubLlmHandler.error_rate = error_rate
+    StubLlmHandler.rng = random.Random(seed)
+    return ThreadingHTTPServer((host, port), StubLlmHandler)
+
+
+def main():
+    """Parse arguments and serve until interrupted."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8001)
+    parser.add_argument('--latency', type=float, default=0.0, help="Response latency in seconds")
+    parser.add_argument('--jitter', type=float, default=0.0, help="Latency jitter in seconds")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Probability of a 500 response")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    server = make_server(args.host, args.port, args.latency, args.jitter, args.error_rate, args.seed)
+    logger.info(f"Stub LLM server listening on http://{args.host}:{args.port}/v1")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -12,11 +12,32 @@ BASE_DIR = Path(__file__).resolve().parent
 WECHATY_TOKEN = "your_wechaty_token_here"  # Replace with your Wechaty PadLocal token
 WECHATY_PUPPET = "wechaty-puppet-padlocal"
 WECHATY_NAME = "wechat-group-assistant"
+# Several bot accounts, for more groups than one account can join. Each entry
+# is a dict with "name" and optionally "token", "puppet" (default: the
+# settings above) and "groups" (default: MONITORED_GROUPS), e.g.
+#   {"name": "bot-a", "token": "...", "groups": ["Group A", "Group B"]}
+# All accounts run in one process, or one process each with
+# "python app.py --account NAME". The first account runs analysis and the web
+# server. Empty means the single account above.
+WECHATY_ACCOUNTS = []
 
 # OpenAI Configuration
 OPENAI_API_KEY = "your_openai_api_key_here"  # Replace with your OpenAI API key
 OPENAI_MODEL = "gpt-3.5-turbo"  # Or another model of your choice
 
+# LLM Backend Configuration
+# "openai" (OpenAI chat API), "openai_compatible" (local OpenAI-style server)
+# or "fake" (deterministic in-process backend for offline testing)
+LLM_BACKEND = "openai"
+LLM_API_BASE = None  # e.g. "http://127.0.0.1:8001/v1" for "openai_compatible"
+LLM_REQUEST_TIMEOUT = 60  # Seconds
+# Fake backend settings
+FAKE_LLM_LATENCY = 0.2  # Seconds per call
+FAKE_LLM_ERROR_RATE = 0.0  # Probability of an injected error per call
+# Global LLM rate limit for scheduled analysis and backfills
+LLM_RATE_LIMIT = 1.0  # Calls per second across all workers
+LLM_RATE_BURST = 5  # Calls allowed back to back
+
 # Database Configuration
 DB_TYPE = "sqlite"  # "sqlite" or "postgresql"
 DB_PATH = os.path.join(BASE_DIR, "data", "wechat_assistant.db")
@@ -30,8 +51,48 @@ DB_PATH = os.path.join(BASE_DIR, "data", "wechat_assistant.db")
 # Web Server Configuration
 WEB_HOST = "127.0.0.1"
 WEB_PORT = 5000
+# "waitress" (thread pool, any platform), "gunicorn" (worker processes;
+# Linux/macOS, and only as its own process: app.py --supervise or --role web)
+# or "development" (Flask's built-in server, honoring DEBUG)
+WEB_SERVER = "waitress"
+# gunicorn worker processes
+WEB_WORKERS = 2
+# Request threads (per gunicorn worker)
+WEB_THREADS = 8
+# Seconds an idle keep-alive connection stays open
+WEB_KEEPALIVE = 5
+# Seconds before a hung gunicorn worker is restarted, and given to finish
+# requests on shutdown
+WEB_TIMEOUT = 60
 DEBUG = True
 
+# HTTP Cache Settings
+# Reuse /api/rooms, /api/messages, /api/summaries and /api/topics responses
+# until the rooms they cover change; polls with If-None-Match/If-Modified-Since
+# get a 304
+HTTP_CACHE_ENABLED = True
+# Maximum number of cached responses
+HTTP_CACHE_SIZE = 500
+# Seconds after which a cached response is rebuilt anyway, for writers that do
+# not report changes (e.g. backfill.py)
+HTTP_CACHE_TTL = 60
+
+# Live Stream Settings
+# Server-Sent Events of newly stored messages and summaries at
+# http://STREAM_HOST:STREAM_PORT/api/stream (/api/stream on the web server
+# redirects there), served by the ingestion process
+STREAM_ENABLED = True
+STREAM_HOST = "127.0.0.1"
+STREAM_PORT = 5001
+# Maximum number of concurrent streams (each holds a file descriptor)
+STREAM_MAX_CLIENTS = 5000
+# Events buffered per client; a client that falls further behind is disconnected
+STREAM_BUFFER_SIZE = 256
+# Seconds between keep-alive comments on an idle stream
+STREAM_HEARTBEAT = 15
+# Seconds a client may take to accept sent data before it is disconnected
+STREAM_WRITE_TIMEOUT = 30
+
 # Logging Configuration
 LOG_LEVEL = "INFO"
 LOG_FILE = os.path.join(BASE_DIR, "logs", "app.log")
@@ -39,13 +100,156 @@ LOG_FILE = os.path.join(BASE_DIR, "logs", "app.log")
 # Group Chat Settings
 # List of group names to monitor (empty list means all groups)
 MONITORED_GROUPS = []
+# Rooms fetched at once when warming the room cache after login
+LOGIN_WARMUP_CONCURRENCY = 10
+# Also fetch member counts at login (one member list call per room)
+LOGIN_WARMUP_MEMBERS = True
+
+# Ingestion Settings
+# Maximum number of received messages waiting to be stored
+INGEST_QUEUE_SIZE = 10000
+# Number of storage workers draining the queue
+INGEST_WORKERS = 4
+# What to do when the queue is full: "block" (slow down the handler),
+# "spill" (append to INGEST_SPILL_FILE and replay later) or "drop_oldest"
+INGEST_OVERFLOW = "block"
+INGEST_SPILL_FILE = os.path.join(BASE_DIR, "data", "ingest_spill.jsonl")
+
+# Bot Command Settings
+# Messages starting with this prefix (or @-mentioning the bot) are commands
+COMMAND_PREFIX = "/"
+# Workers answering commands, separate from the ingestion workers
+COMMAND_WORKERS = 2
+# Maximum number of commands waiting for a worker; more are ignored
+COMMAND_QUEUE_SIZE = 100
+
+# Outbound Message Settings
+# Messages per second sent across all rooms, and how many may go back to back
+SEND_RATE = 1.0
+SEND_BURST = 3
+# Messages per second sent to any one room, and how many may go back to back
+SEND_ROOM_RATE = 0.5
+SEND_ROOM_BURST = 2
+# Longer messages are split into several (in characters)
+SEND_MAX_LENGTH = 2000
+# Queued messages up to this length for the same room are merged into one
+SEND_COALESCE_LENGTH = 200
+# Retries of a failed send, the first after SEND_RETRY_DELAY seconds, then doubling
+SEND_MAX_RETRIES = 3
+SEND_RETRY_DELAY = 2.0
+# Maximum number of messages waiting to be sent
+SEND_QUEUE_SIZE = 500
+
+# Periodic Job Settings
+# Fraction of each job's interval by which runs are randomly moved earlier or later
+JOB_JITTER = 0.1
+
+# Process Settings
+# "python app.py --supervise" runs ingestion, the web server and analysis as
+# separate processes; besides the database they share this SQLite file for
+# stored-message events and each process's metrics
+PROCESS_CHANNEL_FILE = os.path.join(BASE_DIR, "data", "process_channel.db")
+# Seconds between polls for new events by the analysis process
+PROCESS_POLL_INTERVAL = 1.0
+# Seconds between metrics snapshots published by each process
+PROCESS_METRICS_INTERVAL = 10
+
+# Media Settings
+# Archive image, file, voice and video attachments (stored once per content)
+MEDIA_ENABLED = True
+MEDIA_DIR = os.path.join(BASE_DIR, "data", "media")
+# Concurrent attachment downloads
+MEDIA_WORKERS = 4
+# Maximum number of attachments waiting for download; more are not archived
+MEDIA_QUEUE_SIZE = 1000
+# Larger attachments are not archived (in bytes)
+MEDIA_MAX_BYTES = 100 * 1024 * 1024
 
 # Message Analysis Settings
-# How often to run message analysis (in minutes)
+# "adaptive" analyzes each room when its traffic crosses a threshold,
+# "interval" analyzes all rooms every ANALYSIS_INTERVAL minutes
+ANALYSIS_MODE = "adaptive"
+# How often to run message analysis in "interval" mode (in minutes)
 ANALYSIS_INTERVAL = 60
+# Adaptive mode: analyze a room after this many new messages...
+ANALYSIS_MESSAGE_THRESHOLD = 200
+# ...or this many estimated tokens of new content...
+ANALYSIS_TOKEN_THRESHOLD = 8000
+# ...or when its oldest unanalyzed message is this old (in seconds)
+ANALYSIS_MAX_STALENESS = 3600
+# Seconds to wait after a trigger so bursts are coalesced into one run
+ANALYSIS_DEBOUNCE = 30
 # Maximum number of messages to analyze at once
 MAX_MESSAGES_PER_ANALYSIS = 1000
 
+# On-demand Summary Settings (/api/rooms/<id>/summarize)
+# Maximum number of messages read for one on-demand summary
+SUMMARIZE_MAX_MESSAGES = 5000
+# New messages up to this many estimated tokens go into the prompt verbatim;
+# above it they are summarized first
+SUMMARIZE_INLINE_TOKENS = 3000
+
+# Export Settings (/api/rooms/<id>/export)
+# Rows fetched from the database at a time
+EXPORT_BATCH_SIZE = 2000
+# Bytes of encoded rows sent at a time
+EXPORT_CHUNK_SIZE = 65536
+# gzip level of compressed exports (1 fastest - 9 smallest)
+EXPORT_GZIP_LEVEL = 6
+
+# Backfill Settings
+# Worker processes used by backfill.py
+BACKFILL_WORKERS = 4
+# Maximum number of messages summarized per room and day
+BACKFILL_MAX_MESSAGES_PER_DAY = 5000
+# File recording completed backfill jobs so interrupted runs can resume
+BACKFILL_CHECKPOINT = os.path.join(BASE_DIR, "data", "backfill_checkpoint.jsonl")
+
+# Topic Engine Settings (local TF-IDF, no LLM calls)
+# How often to refresh stored keywords (in minutes, 0 disables)
+TOPIC_REFRESH_INTERVAL = 30
+# How much history to consider (in hours)
+TOPIC_LOOKBACK_HOURS = 24
+# Length of the time windows trends are compared across (in seconds)
+TOPIC_WINDOW_SECONDS = 3600
+# Maximum number of messages read per topic computation
+TOPIC_MAX_MESSAGES = 500000
+# Seconds a /api/topics response is reused while new messages arrive (the
+# longest history it covers is TOPIC_LOOKBACK_HOURS)
+TOPIC_CACHE_SECONDS = 60
+
+# Conversation Segmentation Settings
+# Silence (in seconds) after which a new conversation thread starts
+SEGMENT_GAP_SECONDS = 900
+# How far back (in seconds) a reply or @mention can attach to a thread
+SEGMENT_REPLY_WINDOW = 21600
+# Threads smaller than this are batched together into one summary prompt
+SEGMENT_MIN_MESSAGES = 8
+# Maximum number of messages in a batch of small threads
+SEGMENT_MAX_BATCH_MESSAGES = 80
+
+# Duplicate Detection Settings
+# Tag near-duplicate messages at ingestion so analysis skips them
+DEDUP_ENABLED = True
+# Recent messages per room that new messages are compared against
+DEDUP_WINDOW_SIZE = 500
+# Maximum age (in seconds) of the messages compared against
+DEDUP_WINDOW_SECONDS = 3600
+# Maximum differing SimHash bits (of 64) for two messages to count as near-duplicates (0-7)
+DEDUP_MAX_DISTANCE = 6
+# Copies of one message after which further copies are dropped instead of stored
+DEDUP_FLOOD_THRESHOLD = 5
+# Messages shorter than this (in characters) are never treated as duplicates
+DEDUP_MIN_LENGTH = 10
+
+# Similarity Search Settings (local hashed embeddings, no API calls)
+# Directory holding the memory-mapped vector shards (one per room and month)
+VECTOR_INDEX_DIR = os.path.join(BASE_DIR, "data", "vectors")
+# Embedding dimension; changing it requires deleting VECTOR_INDEX_DIR
+VECTOR_DIM = 256
+# How often to index new messages (in minutes, 0 disables)
+VECTOR_INDEX_INTERVAL = 10
+
 # Load local settings if they exist
 try:
     from config.local import *  # noqa
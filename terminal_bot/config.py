@@ -14,6 +14,7 @@ BACKUP_DIR = f"{DATA_DIR}/backups"
 # Message settings
 MAX_MESSAGES_IN_MEMORY = 1000  # Number of messages to keep in memory
 SAVE_INTERVAL = 300  # Save messages to file every 300 seconds (5 minutes)
+LOGIN_WARMUP_CONCURRENCY = 10  # Rooms loaded at once after login
 
 # Logging settings
 LOG_LEVEL = "INFO"  # Options: DEBUG, INFO, WARNING, ERROR, CRITICAL
@@ -27,6 +28,9 @@ AVAILABLE_COMMANDS = {
     "summary": "Show message statistics",
     "version": "Show bot version"
 }
+# Workers answering commands (and @-mentions of the bot) ahead of storage
+COMMAND_WORKERS = 2
+COMMAND_QUEUE_SIZE = 100  # Further commands are ignored while this many wait
 
 # Wechaty settings
 # You can use different puppet providers:
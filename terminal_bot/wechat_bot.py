@@ -7,7 +7,7 @@ import os
 import sys
 import asyncio
 import logging
-from typing import Optional
+from typing import Dict, List, Optional
 from datetime import datetime
 import json
 import time
@@ -69,8 +69,20 @@ class TerminalBot:
         self.bot.on('login', self._on_login)
         self.bot.on('logout', self._on_logout)
         self.bot.on('message', self._on_message)
+        self.bot.on('room-topic', self._on_room_topic)
+        self.bot.on('room-join', self._on_room_join)
+        self.bot.on('room-leave', self._on_room_leave)
         self.bot.on('error', self._on_error)
         
+        # Room topics by room_id, so known rooms need no puppet call per message
+        self.room_topics: Dict[str, str] = {}
+        
+        # Commands and @-mentions of the bot are answered by their own workers,
+        # so they never wait behind message storage
+        self.self_name = None
+        self.command_queue: asyncio.Queue = asyncio.Queue(maxsize=COMMAND_QUEUE_SIZE)
+        self.command_tasks = []
+        
         # Message storage (in-memory for MVP)
         self.messages = []
         self.last_save_time = time.time()
@@ -106,12 +118,16 @@ class TerminalBot:
     async def start(self):
         """Start the bot."""
         logger.info(f"Starting {BOT_NAME} v{VERSION}...")
+        self.command_tasks = [asyncio.ensure_future(self._command_worker())
+                              for _ in range(COMMAND_WORKERS)]
         await self.bot.start()
     
     async def stop(self):
         """Stop the bot."""
         logger.info(f"Stopping {BOT_NAME}...")
         self._save_messages()  # Save messages before stopping
+        for task in self.command_tasks:
+            task.cancel()
         await self.bot.stop()
     
     async def _on_scan(self, qr_code: str, status: int, data: Optional[str] = None):
@@ -136,15 +152,60 @@ class TerminalBot:
     async def _on_login(self, contact: Contact):
         """Handle login events."""
         logger.info(f"User {contact.name} logged in")
+        self.self_name = contact.name
+        
+        started = time.monotonic()
         
         # Get list of rooms (group chats)
         rooms = await self.bot.Room.find_all()
         logger.info(f"Found {len(rooms)} rooms")
         
+        # Fetch topics and member counts concurrently, a few rooms at a time
+        semaphore = asyncio.Semaphore(LOGIN_WARMUP_CONCURRENCY)
+        
+        async def fetch(room: Room):
+            async with semaphore:
+                try:
+                    topic = await room.topic()
+                    members = await room.member_list()
+                except Exception as e:
+                    logger.warning(f"Could not load room {room.room_id}: {e}")
+                    return None
+            self.room_topics[room.room_id] = topic
+            return topic, len(members)
+        
+        results = await asyncio.gather(*(fetch(room) for room in rooms))
+        
         # Log room information
-        for i, room in enumerate(rooms):
+        for i, (room, result) in enumerate(zip(rooms, results)):
+            if result:
+                logger.info(f"{i+1}. Room: {result[0]} (ID: {room.room_id}, members: {result[1]})")
+        
+        loaded = sum(1 for result in results if result)
+        logger.info(f"Ready in {time.monotonic() - started:.1f}s ({loaded} of {len(rooms)} rooms loaded)")
+    
+    async def _room_topic(self, room: Room) -> str:
+        """Return a room's topic, asking the puppet only for unknown rooms."""
+        topic = self.room_topics.get(room.room_id)
+        if topic is None:
             topic = await room.topic()
-            logger.info(f"{i+1}. Room: {topic} (ID: {room.room_id})")
+            self.room_topics[room.room_id] = topic
+        return topic
+    
+    async def _on_room_topic(self, room: Room, new_topic: str, old_topic: str,
+                             changer: Contact, date=None):
+        """Handle room topic changes."""
+        self.room_topics[room.room_id] = new_topic
+    
+    async def _on_room_join(self, room: Room, invitees: List[Contact],
+                            inviter: Contact, date=None):
+        """Handle members joining a room (including the bot itself)."""
+        self.room_topics.pop(room.room_id, None)
+    
+    async def _on_room_leave(self, room: Room, removees: List[Contact],
+                             remover: Contact, date=None):
+        """Handle members leaving a room."""
+        self.room_topics.pop(room.room_id, None)
     
     async def _on_logout(self, contact: Contact):
         """Handle logout events."""
@@ -163,7 +224,15 @@ class TerminalBot:
             room_topic = "Private Chat"
             
             if room:
-                room_topic = await room.topic()
+                room_topic = await self._room_topic(room)
+            
+            # Queue commands first so they are answered ahead of storage
+            command_text = self._command_text(text, room)
+            if command_text:
+                try:
+                    self.command_queue.put_nowait((time.monotonic(), command_text, sender, room))
+                except asyncio.QueueFull:
+                    logger.warning(f"Command queue full, ignoring command from {sender.name}")
             
             # Print message to terminal
             timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
@@ -182,19 +251,47 @@ class TerminalBot:
             }
             self.messages.append(message_data)
             
-            # Check if it's time to save messages
+            # Check if it's time to save messages (written off the event loop)
             current_time = time.time()
             if current_time - self.last_save_time > SAVE_INTERVAL:
-                self._save_messages()
                 self.last_save_time = current_time
-            
-            # Command handling
-            if text.startswith(COMMAND_PREFIX):
-                await self._handle_command(text, sender, room)
+                await asyncio.get_running_loop().run_in_executor(
+                    None, self._save_messages, list(self.messages)
+                )
                     
         except Exception as e:
             logger.error(f"Error processing message: {e}", exc_info=True)
     
+    def _command_text(self, text: str, room: Optional[Room]) -> Optional[str]:
+        """Return the command in a message, treating "@bot cmd" as "/cmd"."""
+        if text.startswith(COMMAND_PREFIX):
+            return text
+        
+        mention = f"@{self.self_name}" if self.self_name else None
+        if room and mention and mention in text:
+            rest = text.replace(mention, '', 1).strip()
+            if rest.startswith(COMMAND_PREFIX):
+                return rest
+            # "@bot summary" runs /summary and a bare "@bot" /help; other
+            # mentions are ordinary conversation
+            if not rest:
+                return COMMAND_PREFIX + "help"
+            if rest.split(maxsplit=1)[0].lower() in AVAILABLE_COMMANDS:
+                return COMMAND_PREFIX + rest
+        return None
+    
+    async def _command_worker(self):
+        """Answer queued commands."""
+        while True:
+            received_at, text, sender, room = await self.command_queue.get()
+            try:
+                await self._handle_command(text, sender, room)
+                logger.debug(f"Answered {text} in {(time.monotonic() - received_at) * 1000:.0f}ms")
+            except Exception as e:
+                logger.error(f"Error handling command {text}: {e}", exc_info=True)
+            finally:
+                self.command_queue.task_done()
+    
     async def _handle_command(self, text: str, sender: Contact, room: Optional[Room] = None):
         """Handle bot commands."""
         # Extract command without the prefix
@@ -222,7 +319,8 @@ class TerminalBot:
             total_messages = len(room_messages)
             unique_senders = len(set(m.get("sender_id") for m in room_messages))
             
-            summary_text = f"Message summary for {room.topic() if room else 'private chat'}:\n"
+            room_topic = await self._room_topic(room) if room else 'private chat'
+            summary_text = f"Message summary for {room_topic}:\n"
             summary_text += f"Total messages: {total_messages}\n"
             summary_text += f"Unique senders: {unique_senders}\n"
             summary_text += f"Messages in memory: {len(self.messages)} (max: {MAX_MESSAGES_IN_MEMORY})"
@@ -259,12 +357,14 @@ class TerminalBot:
         """Handle error events."""
         logger.error(f"Wechaty error: {error}", exc_info=True)
     
-    def _save_messages(self):
-        """Save messages to a JSON file."""
+    def _save_messages(self, messages: Optional[List[dict]] = None):
+        """Save messages (by default all messages in memory) to a JSON file."""
+        if messages is None:
+            messages = self.messages
         try:
             with open(MESSAGE_FILE, 'w', encoding='utf-8') as f:
-                json.dump(self.messages, f, ensure_ascii=False, indent=2)
-            logger.info(f"Saved {len(self.messages)} messages to {MESSAGE_FILE}")
+                json.dump(messages, f, ensure_ascii=False, indent=2)
+            logger.info(f"Saved {len(messages)} messages to {MESSAGE_FILE}")
         except Exception as e:
             logger.error(f"Error saving messages: {e}", exc_info=True)
 
@@ -0,0 +1,6 @@
+"""
+WSGI entry point for serving the web interface with an external server, e.g.
+    gunicorn --workers 4 --worker-class gthread --threads 8 wsgi:app
+``python app.py --role web`` serves it as configured by WEB_SERVER instead.
+"""
+from app.services.web_service import app